@@ -0,0 +1,91 @@
+import math
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE = EARTH_RADIUS_METERS * math.pi / 180
+
+
+def haversine_meters(longitude_a: float, latitude_a: float, longitude_b: float, latitude_b: float) -> float:
+    """Great-circle distance between two (longitude, latitude) points in meters."""
+    phi_a = math.radians(latitude_a)
+    phi_b = math.radians(latitude_b)
+    delta_phi = phi_b - phi_a
+    delta_lambda = math.radians(longitude_b - longitude_a)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi_a) * math.cos(phi_b) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def meters_to_degrees(meters: float, latitude: float) -> tuple[float, float]:
+    """
+    Longitude and latitude spans covering at least ``meters`` around ``latitude``,
+    padded by 1% for the flattening of the earth.
+    """
+    latitude_span = meters * 1.01 / METERS_PER_DEGREE
+    return latitude_span / max(math.cos(math.radians(min(abs(latitude), 89.9))), 1e-6), latitude_span
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(longitude: float, latitude: float, precision: int = 7) -> str:
+    """Encode a (longitude, latitude) point as a geohash cell of ``precision`` characters."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    cell = []
+    bits = 0
+    bit_count = 0
+    use_longitude = True
+
+    while len(cell) < precision:
+        value, value_range = (longitude, longitude_range) if use_longitude else (latitude, latitude_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            value_range[0] = middle
+        else:
+            bits = bits << 1
+            value_range[1] = middle
+        use_longitude = not use_longitude
+        bit_count += 1
+        if bit_count == 5:
+            cell.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(cell)
+
+
+def line_length_meters(coordinates) -> float:
+    """Geodesic length of a sequence of (longitude, latitude) points in meters."""
+    return sum(
+        haversine_meters(start[0], start[1], end[0], end[1])
+        for start, end in zip(coordinates, coordinates[1:])
+    )
+
+
+def geohash_cell_dimensions(precision: int) -> tuple[float, float]:
+    """Width and height, in degrees, of a geohash cell of ``precision`` characters."""
+    bits = 5 * precision
+    longitude_bits = (bits + 1) // 2
+    latitude_bits = bits // 2
+    return 360.0 / 2 ** longitude_bits, 180.0 / 2 ** latitude_bits
+
+
+def geohash_cell_size_meters(precision: int) -> float:
+    """Upper bound, in meters, of the diagonal of a geohash cell of ``precision`` characters."""
+    width, height = geohash_cell_dimensions(precision)
+    return haversine_meters(0.0, 0.0, width, height)
+
+
+def geohash_cells_in_box(
+        min_longitude: float, min_latitude: float, max_longitude: float, max_latitude: float, precision: int
+) -> set[str]:
+    """Geohash cells of ``precision`` characters intersecting a (longitude, latitude) box."""
+    width, height = geohash_cell_dimensions(precision)
+    min_column = math.floor((max(min_longitude, -180.0) + 180.0) / width)
+    max_column = math.floor((min(max_longitude, 180.0 - width / 2) + 180.0) / width)
+    min_row = math.floor((max(min_latitude, -90.0) + 90.0) / height)
+    max_row = math.floor((min(max_latitude, 90.0 - height / 2) + 90.0) / height)
+    return {
+        geohash_encode(-180.0 + (column + 0.5) * width, -90.0 + (row + 0.5) * height, precision)
+        for column in range(min_column, max_column + 1)
+        for row in range(min_row, max_row + 1)
+    }
@@ -1,5 +1,7 @@
+import asyncio
 import json
 import logging
+from typing import Optional
 
 from aiokafka import AIOKafkaProducer
 from django.conf import settings
@@ -8,30 +10,108 @@ logger = logging.getLogger(__name__)
 
 
 class KafkaProducerService:
+    """
+    Topic publisher backed by a single process-wide ``AIOKafkaProducer``.
+
+    The producer is created lazily on the running event loop and kept open for the
+    lifetime of the worker, so every publisher shares one broker connection and one
+    batching accumulator. ``startup``/``shutdown`` are wired to the ASGI lifespan.
+    """
+    _producer: Optional[AIOKafkaProducer] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _lock: Optional[asyncio.Lock] = None
+
     def __init__(self, topic: str):
         self.topic = topic
-        self.producer = AIOKafkaProducer(
-            bootstrap_servers=settings.KAFKA_BROKER_URL
+
+    @staticmethod
+    def build_producer() -> AIOKafkaProducer:
+        return AIOKafkaProducer(
+            bootstrap_servers=settings.KAFKA_BROKER_URL,
+            linger_ms=settings.KAFKA_PRODUCER_LINGER_MS,
+            max_batch_size=settings.KAFKA_PRODUCER_MAX_BATCH_SIZE,
+            compression_type=settings.KAFKA_PRODUCER_COMPRESSION_TYPE,
         )
-        self.started = False
+
+    @classmethod
+    async def get_producer(cls) -> AIOKafkaProducer:
+        loop = asyncio.get_running_loop()
+        if cls._producer is not None and cls._loop is loop:
+            return cls._producer
+
+        if cls._lock is None or cls._loop is not loop:
+            cls._lock = asyncio.Lock()
+            cls._loop = loop
+            cls._producer = None
+
+        async with cls._lock:
+            if cls._producer is None:
+                producer = cls.build_producer()
+                try:
+                    await producer.start()
+                except Exception:
+                    await producer.stop()
+                    raise
+                cls._producer = producer
+                logger.info("Kafka producer started")
+        return cls._producer
+
+    @classmethod
+    async def startup(cls):
+        try:
+            await cls.get_producer()
+        except Exception as e:
+            # The producer is retried lazily on the first send.
+            logger.exception(f"Unable to start Kafka producer: {e}")
+
+    @classmethod
+    async def shutdown(cls):
+        producer, cls._producer = cls._producer, None
+        if producer is not None:
+            await producer.stop()
+            logger.info("Kafka producer stopped")
 
     async def start(self):
-        if not self.started:
-            await self.producer.start()
-            self.started = True
+        await self.get_producer()
 
     async def stop(self):
-        if self.started:
-            await self.producer.stop()
-            self.started = False
+        await self.shutdown()
+
+    @staticmethod
+    def serialize(message: dict) -> bytes:
+        return json.dumps(message).encode("utf-8")
+
+    @staticmethod
+    def serialize_key(key: Optional[str]) -> Optional[bytes]:
+        return str(key).encode("utf-8") if key is not None else None
 
-    async def send(self, message: dict):
-        await self.start()
+    async def send(self, message: dict, key: Optional[str] = None):
+        """
+        Publish a message and wait for the broker acknowledgement. Messages
+        sharing a ``key`` land on the same partition and keep their order.
+        """
         try:
-            await self.producer.send_and_wait(
-                self.topic,
-                json.dumps(message).encode("utf-8")
-            )
+            producer = await self.get_producer()
+            await producer.send_and_wait(self.topic, self.serialize(message), key=self.serialize_key(key))
             logger.info(f"Message sent to Kafka topic {self.topic}")
         except Exception as e:
             logger.exception(f"Failed to send message to Kafka: {e}")
+
+    async def send_nowait(self, message: dict, key: Optional[str] = None):
+        """
+        Queue a message on the producer batch without waiting for the broker
+        acknowledgement. Delivery failures are logged from the delivery future.
+        """
+        try:
+            producer = await self.get_producer()
+            future = await producer.send(self.topic, self.serialize(message), key=self.serialize_key(key))
+            future.add_done_callback(self._log_delivery_failure)
+        except Exception as e:
+            logger.exception(f"Failed to queue message for Kafka: {e}")
+
+    def _log_delivery_failure(self, future: asyncio.Future):
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            logger.error(f"Failed to deliver message to Kafka topic {self.topic}: {exception}")
@@ -1,7 +1,40 @@
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Count, QuerySet, Window
 from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 DEFAULT_PAGE = 1
+WINDOW_COUNT = "window_total_count"
+
+
+class WindowCountPaginator(Paginator):
+    """
+    Paginator reading the total from a ``COUNT(*) OVER ()`` column of the page
+    rows, so an expensive queryset is evaluated once per page instead of once
+    for the page and again for ``count``. Lists are paginated as usual.
+    """
+
+    def page(self, number):
+        if not isinstance(self.object_list, QuerySet):
+            return super().page(number)
+
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().page(number)
+        if number < 1:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list.annotate(**{WINDOW_COUNT: Window(Count("*"))})[bottom:bottom + self.per_page])
+        if rows:
+            self.__dict__["count"] = getattr(rows[0], WINDOW_COUNT)
+        elif number == 1:
+            self.__dict__["count"] = 0
+        else:
+            # Past the last page; the window has no row to report the total on.
+            raise EmptyPage(self.error_messages["no_results"])
+        return self._get_page(rows, number, self)
 
 
 class CustomPagination(PageNumberPagination):
@@ -24,6 +57,10 @@ class CustomPagination(PageNumberPagination):
         )
 
 
+class WindowCountPagination(CustomPagination):
+    django_paginator_class = WindowCountPaginator
+
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = "page_size"
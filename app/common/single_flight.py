@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Deletes the lock only while it is still held by the caller's token.
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one call of ``compute``.
+
+    Within a process, followers wait on the leader's future. Across processes,
+    the leader holds a Redis lock for up to ``lock_ttl`` seconds while followers
+    poll ``lookup`` for the result the leader shared, e.g. through a cache.
+    Followers give up after ``wait_timeout`` seconds, or as soon as the lock is
+    released without a result, and compute the value themselves.
+
+    Without a ``lookup`` there is no way to hand a result to other processes,
+    so only the in-process coalescing applies.
+    """
+
+    def __init__(self, prefix: str, lock_ttl: float, wait_timeout: float, poll_interval: float = 0.05):
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.calls: dict[str, Future] = {}
+        self.async_calls: dict[tuple, asyncio.Future] = {}
+        self.leaders = 0
+        self.local_followers = 0
+        self.remote_followers = 0
+        self.timeouts = 0
+
+    def lock_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def acquire(self, key: str) -> Optional[str]:
+        """Token of the cross-process lock of ``key``, None while another process holds it."""
+        token = uuid.uuid4().hex
+        try:
+            if get_redis_connection("default").set(self.lock_key(key), token, nx=True, px=int(self.lock_ttl * 1000)):
+                return token
+            return None
+        except Exception:
+            logger.exception("Single-flight lock failed")
+            return token
+
+    def release(self, key: str, token: str):
+        try:
+            get_redis_connection("default").eval(RELEASE_SCRIPT, 1, self.lock_key(key), token)
+        except Exception:
+            logger.exception("Single-flight unlock failed")
+
+    def is_locked(self, key: str) -> bool:
+        try:
+            return bool(get_redis_connection("default").exists(self.lock_key(key)))
+        except Exception:
+            logger.exception("Single-flight lock check failed")
+            return False
+
+    def poll(self, key: str, lookup: Callable):
+        """Result shared by the process holding the lock; None when it timed out or failed."""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            result = lookup()
+            if result is not None:
+                return result
+            if not self.is_locked(key):
+                return None
+        self.timeouts += 1
+        return None
+
+    async def apoll(self, key: str, lookup: Callable):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await sync_to_async(lookup)()
+            if result is not None:
+                return result
+            if not await sync_to_async(self.is_locked)(key):
+                return None
+        self.timeouts += 1
+        return None
+
+    def do(self, key: str, compute: Callable, lookup: Optional[Callable] = None):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+
+        if not leader:
+            self.local_followers += 1
+            try:
+                return call.result(timeout=self.wait_timeout)
+            except FutureTimeoutError:
+                self.timeouts += 1
+                return compute()
+
+        try:
+            result = self.share(key, compute, lookup)
+            call.set_result(result)
+            return result
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+    def share(self, key: str, compute: Callable, lookup: Optional[Callable]):
+        if lookup is None:
+            self.leaders += 1
+            return compute()
+
+        token = self.acquire(key)
+        if token is None:
+            self.remote_followers += 1
+            result = self.poll(key, lookup)
+            if result is not None:
+                return result
+            return compute()
+
+        self.leaders += 1
+        try:
+            return compute()
+        finally:
+            self.release(key, token)
+
+    async def ado(self, key: str, compute: Callable[[], Awaitable], lookup: Optional[Callable] = None):
+        """Async version of ``do``; in-process followers are coalesced per event loop."""
+        loop = asyncio.get_running_loop()
+        call = self.async_calls.get((loop, key))
+        if call is not None:
+            self.local_followers += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(call), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return await compute()
+
+        call = self.async_calls[(loop, key)] = loop.create_future()
+        try:
+            result = await self.ashare(key, compute, lookup)
+            call.set_result(result)
+            return result
+        except Exception as e:
+            call.set_exception(e)
+            # Mark the exception retrieved when no follower was waiting.
+            call.exception()
+            raise
+        finally:
+            self.async_calls.pop((loop, key), None)
+
+    async def ashare(self, key: str, compute: Callable[[], Awaitable], lookup: Optional[Callable]):
+        if lookup is None:
+            self.leaders += 1
+            return await compute()
+
+        token = await sync_to_async(self.acquire)(key)
+        if token is None:
+            self.remote_followers += 1
+            result = await self.apoll(key, lookup)
+            if result is not None:
+                return result
+            return await compute()
+
+        self.leaders += 1
+        try:
+            return await compute()
+        finally:
+            await sync_to_async(self.release)(key, token)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.calls) + len(self.async_calls),
+            "leaders": self.leaders,
+            "local_followers": self.local_followers,
+            "remote_followers": self.remote_followers,
+            "timeouts": self.timeouts,
+        }
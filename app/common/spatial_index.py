@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+
+
+class PackedRTree:
+    """
+    Static R-tree over axis-aligned boxes packed with Sort-Tile-Recursive.
+
+    Boxes are ``(xmin, ymin, xmax, ymax)`` rows. They are sorted into vertical
+    slices by x, then by y within a slice, and cut into leaves of
+    ``node_capacity`` boxes, so neighbouring boxes share a leaf. Queries test the
+    leaf envelopes and then the boxes of the matching leaves, both as vectorised
+    NumPy comparisons. The tree cannot be modified; build a new one instead.
+    """
+
+    def __init__(self, boxes, node_capacity: int = 64):
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        count = len(boxes)
+        order = np.arange(count)
+
+        if count:
+            leaf_count = math.ceil(count / node_capacity)
+            slice_size = math.ceil(math.sqrt(leaf_count)) * node_capacity
+            center_x = (boxes[:, 0] + boxes[:, 2]) / 2
+            center_y = (boxes[:, 1] + boxes[:, 3]) / 2
+            order = np.argsort(center_x, kind="stable")
+            for start in range(0, count, slice_size):
+                tile = order[start:start + slice_size]
+                order[start:start + slice_size] = tile[np.argsort(center_y[tile], kind="stable")]
+
+        self.order = order
+        self.boxes = boxes[order]
+        self.leaf_offsets = np.append(np.arange(0, count, node_capacity), count)
+        starts = self.leaf_offsets[:-1]
+        if count:
+            self.leaf_boxes = np.column_stack([
+                np.minimum.reduceat(self.boxes[:, 0], starts),
+                np.minimum.reduceat(self.boxes[:, 1], starts),
+                np.maximum.reduceat(self.boxes[:, 2], starts),
+                np.maximum.reduceat(self.boxes[:, 3], starts),
+            ])
+        else:
+            self.leaf_boxes = np.empty((0, 4))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @staticmethod
+    def intersecting(boxes: np.ndarray, xmin: float, ymin: float, xmax: float, ymax: float) -> np.ndarray:
+        return (boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)
+
+    def query(self, xmin: float, ymin: float, xmax: float, ymax: float) -> np.ndarray:
+        """Positions, in the original ``boxes``, of the boxes intersecting the query box."""
+        leaves = np.flatnonzero(self.intersecting(self.leaf_boxes, xmin, ymin, xmax, ymax))
+        if not leaves.size:
+            return np.empty(0, dtype=int)
+
+        positions = np.concatenate([
+            np.arange(self.leaf_offsets[leaf], self.leaf_offsets[leaf + 1]) for leaf in leaves
+        ])
+        matches = self.intersecting(self.boxes[positions], xmin, ymin, xmax, ymax)
+        return self.order[positions[matches]]
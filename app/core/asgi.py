@@ -13,7 +13,11 @@ from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 
+from common.kafka_producer import KafkaProducerService
+from core.lifespan import LifespanApp
+from integrations.base import BaseClient
 from location.routing import websocket_patterns
+from trip.memory_match import memory_routes
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
@@ -25,4 +29,9 @@ application = ProtocolTypeRouter({
             websocket_patterns
         )
     ),
+
+    "lifespan": LifespanApp(
+        on_startup=[KafkaProducerService.startup, memory_routes.startup],
+        on_shutdown=[KafkaProducerService.shutdown, BaseClient.close_clients],
+    ),
 })
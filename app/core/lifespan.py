@@ -0,0 +1,39 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LifespanApp:
+    """
+    ASGI lifespan handler running process startup and shutdown hooks.
+
+    Servers without lifespan support (e.g. Daphne) never call this application;
+    resources opened by the hooks are then created lazily on first use.
+    """
+
+    def __init__(self, on_startup=None, on_shutdown=None):
+        self.on_startup = list(on_startup or [])
+        self.on_shutdown = list(on_shutdown or [])
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                try:
+                    for hook in self.on_startup:
+                        await hook()
+                except Exception as e:
+                    logger.exception("Lifespan startup failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+
+            elif message["type"] == "lifespan.shutdown":
+                for hook in self.on_shutdown:
+                    try:
+                        await hook()
+                    except Exception:
+                        logger.exception("Lifespan shutdown hook failed")
+                await send({"type": "lifespan.shutdown.complete"})
+                return
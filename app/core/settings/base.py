@@ -149,4 +149,33 @@ ENVIRONMENT_INSTANCE = os.environ.get("ENVIRONMENT_INSTANCE", "dev")
 GDAL_LIBRARY_PATH = os.environ.get('GDAL_LIBRARY_PATH', '/usr/lib/libgdal.so')
 GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
 GOOGLE_MAPS_ROUTE_URL = os.environ.get("GOOGLE_MAPS_ROUTE_URL", "https://routes.googleapis.com/directions/v2")
+GOOGLE_MAPS_MAX_CONNECTIONS = int(os.environ.get("GOOGLE_MAPS_MAX_CONNECTIONS", 20))
+GOOGLE_MAPS_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GOOGLE_MAPS_MAX_KEEPALIVE_CONNECTIONS", 10))
+TRIP_ROUTING_PROVIDER = os.environ.get("TRIP_ROUTING_PROVIDER", "google")  # google, graph
+TRIP_ROUTING_FALLBACK_PROVIDER = os.environ.get("TRIP_ROUTING_FALLBACK_PROVIDER", "")  # google, graph or empty
+ROAD_GRAPH_PATH = os.environ.get("ROAD_GRAPH_PATH")  # .npz file written by the build_road_graph command
+ROAD_GRAPH_SPEED_MPS = float(os.environ.get("ROAD_GRAPH_SPEED_MPS", 8.33))
+ROAD_GRAPH_MAX_SNAP_METERS = float(os.environ.get("ROAD_GRAPH_MAX_SNAP_METERS", 500))
+TRIP_ROUTE_SIMPLIFY_TOLERANCE = float(os.environ.get("TRIP_ROUTE_SIMPLIFY_TOLERANCE", 0.0001))  # degrees
+TRIP_MATCH_MAX_RADIUS_METERS = int(os.environ.get("TRIP_MATCH_MAX_RADIUS_METERS", 1000))
+TRIP_ROUTE_CELL_GEOHASH_PRECISION = int(os.environ.get("TRIP_ROUTE_CELL_GEOHASH_PRECISION", 6))
+TRIP_BATCH_MATCH_MAX_REQUESTS = int(os.environ.get("TRIP_BATCH_MATCH_MAX_REQUESTS", 500))
+TRIP_MATCH_ENGINE = os.environ.get("TRIP_MATCH_ENGINE", "postgis")  # postgis, memory
+TRIP_MATCH_MEMORY_REBUILD_THRESHOLD = int(os.environ.get("TRIP_MATCH_MEMORY_REBUILD_THRESHOLD", 256))
+TRIP_MATCH_MEMORY_SYNC_SECONDS = int(os.environ.get("TRIP_MATCH_MEMORY_SYNC_SECONDS", 5))
+TRIP_ROUTE_COMPUTATION = os.environ.get("TRIP_ROUTE_COMPUTATION", "sync")  # sync, async
+TRIP_ROUTE_TASK_MAX_RETRIES = int(os.environ.get("TRIP_ROUTE_TASK_MAX_RETRIES", 3))
 KAFKA_BROKER_URL = os.environ.get("KAFKA_BROKER_URL", "localhost:9092")
+KAFKA_PRODUCER_LINGER_MS = int(os.environ.get("KAFKA_PRODUCER_LINGER_MS", 5))
+KAFKA_PRODUCER_MAX_BATCH_SIZE = int(os.environ.get("KAFKA_PRODUCER_MAX_BATCH_SIZE", 64 * 1024))
+KAFKA_PRODUCER_COMPRESSION_TYPE = os.environ.get("KAFKA_PRODUCER_COMPRESSION_TYPE") or None  # gzip, snappy, lz4, zstd
+KAFKA_TRIP_LOCATION_TOPIC = os.environ.get("KAFKA_TRIP_LOCATION_TOPIC", "trip_location_updates")
+LOCATION_BROADCAST_STRATEGY = os.environ.get("LOCATION_BROADCAST_STRATEGY", "kafka")  # kafka, direct
+LOCATION_BROADCAST_BATCH_SIZE = int(os.environ.get("LOCATION_BROADCAST_BATCH_SIZE", 500))
+LOCATION_BROADCAST_COALESCE = bool(int(os.environ.get("LOCATION_BROADCAST_COALESCE", 0)))
+LOCATION_MAX_BATCH_POINTS = int(os.environ.get("LOCATION_MAX_BATCH_POINTS", 100))
+LOCATION_HISTORY_BATCH_SIZE = int(os.environ.get("LOCATION_HISTORY_BATCH_SIZE", 500))
+LOCATION_HISTORY_FLUSH_INTERVAL_MS = int(os.environ.get("LOCATION_HISTORY_FLUSH_INTERVAL_MS", 1000))
+LOCATION_HISTORY_PREMAKE_DAYS = int(os.environ.get("LOCATION_HISTORY_PREMAKE_DAYS", 7))
+LOCATION_HISTORY_RETENTION_DAYS = int(os.environ.get("LOCATION_HISTORY_RETENTION_DAYS", 30))
+LOCATION_HISTORY_DROP_EXPIRED_PARTITIONS = int(os.environ.get("LOCATION_HISTORY_DROP_EXPIRED_PARTITIONS", 1))
@@ -39,6 +39,25 @@ SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
 
 CACHE_TTL = 60 * 1
+# Per-process cache of trip ids seen on the location stream
+ACTIVE_TRIP_CACHE_SIZE = int(os.getenv("ACTIVE_TRIP_CACHE_SIZE", 10000))
+ACTIVE_TRIP_CACHE_TTL = int(os.getenv("ACTIVE_TRIP_CACHE_TTL", 60))
+# Per-process cache of routes followed for trip progress
+TRIP_PROGRESS_ROUTE_CACHE_SIZE = int(os.getenv("TRIP_PROGRESS_ROUTE_CACHE_SIZE", 10000))
+TRIP_PROGRESS_ROUTE_CACHE_TTL = int(os.getenv("TRIP_PROGRESS_ROUTE_CACHE_TTL", 60))
+# Shared cache of /matches candidates keyed by geohash cells, 0 disables it
+TRIP_MATCH_CACHE_TTL = int(os.getenv("TRIP_MATCH_CACHE_TTL", 15))
+TRIP_MATCH_CACHE_GEOHASH_PRECISION = int(os.getenv("TRIP_MATCH_CACHE_GEOHASH_PRECISION", 7))
+# Routing API results keyed by origin/destination geohash cells, 0 disables it
+TRIP_ROUTE_CACHE_TTL = int(os.getenv("TRIP_ROUTE_CACHE_TTL", 7 * 24 * 60 * 60))
+# Routes served by TRIP_ROUTING_FALLBACK_PROVIDER, 0 leaves them uncached
+TRIP_ROUTE_FALLBACK_CACHE_TTL = int(os.getenv("TRIP_ROUTE_FALLBACK_CACHE_TTL", 300))
+TRIP_ROUTE_CACHE_LOCAL_TTL = int(os.getenv("TRIP_ROUTE_CACHE_LOCAL_TTL", 300))
+TRIP_ROUTE_CACHE_SIZE = int(os.getenv("TRIP_ROUTE_CACHE_SIZE", 5000))
+TRIP_ROUTE_CACHE_GEOHASH_PRECISION = int(os.getenv("TRIP_ROUTE_CACHE_GEOHASH_PRECISION", 8))
+# Concurrent identical route computations wait on one upstream call for up to the timeout
+TRIP_ROUTE_SINGLE_FLIGHT_LOCK_TTL = int(os.getenv("TRIP_ROUTE_SINGLE_FLIGHT_LOCK_TTL", 35))
+TRIP_ROUTE_SINGLE_FLIGHT_WAIT_TIMEOUT = int(os.getenv("TRIP_ROUTE_SINGLE_FLIGHT_WAIT_TIMEOUT", 10))
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -49,9 +68,21 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Latest trip positions are held in Redis and flushed to the database in batches
+TRIP_CURRENT_LOCATION_TTL = int(os.getenv("TRIP_CURRENT_LOCATION_TTL", 60 * 60))
+TRIP_CURRENT_LOCATION_FLUSH_SECONDS = int(os.getenv("TRIP_CURRENT_LOCATION_FLUSH_SECONDS", 5))
+
 CELERY_BEAT_SCHEDULE = {
     "run_terminal_auto_debit": {
         "task": "wallet.tasks.run_auto_debit_process",
         "schedule": crontab(minute="0", hour="0", day_of_month="*"),
-    }
+    },
+    "flush_trip_current_locations": {
+        "task": "location.tasks.flush_trip_current_locations",
+        "schedule": TRIP_CURRENT_LOCATION_FLUSH_SECONDS,
+    },
+    "maintain_location_history_partitions": {
+        "task": "trip.tasks.maintain_location_history_partitions",
+        "schedule": crontab(minute="30", hour="0"),
+    },
 }
@@ -1,30 +1,97 @@
+import asyncio
 import logging
+import os
+import threading
 import time
+import weakref
 
-import requests
-from requests.adapters import HTTPAdapter, Retry
+import httpx
 
 logger = logging.getLogger(__name__)
 
 
 class BaseClient:
+    """
+    Base of the HTTP integrations.
+
+    Every instance of an integration sends its requests through one connection
+    pool shared by the whole process, so keep-alive connections (HTTP/2 where
+    the server offers it) are reused instead of paying a TLS handshake per call.
+    ``max_connections`` and ``max_keepalive_connections`` bound the pool of each
+    integration. ``_amake_request`` is the asyncio counterpart of
+    ``_make_request``; async pools are kept per event loop, as httpx async
+    connections cannot be shared between loops.
+    """
     headers = {}
     timeout = 0
     ClientName = None
     status_code = None
+    http2 = True
+    max_connections = 20
+    max_keepalive_connections = 10
+    keepalive_expiry = 30
+
+    _clients: dict[type, httpx.Client] = {}
+    _async_clients = weakref.WeakKeyDictionary()
+    _clients_lock = threading.Lock()
 
     def __init__(self):
-        self.session = requests.Session()
-        retries = Retry(total=0, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-        self.session.mount("https://", HTTPAdapter(max_retries=retries))
         self.response = {}
 
+    @classmethod
+    def client_options(cls) -> dict:
+        return {
+            "http2": cls.http2,
+            "limits": httpx.Limits(
+                max_connections=cls.max_connections,
+                max_keepalive_connections=cls.max_keepalive_connections,
+                keepalive_expiry=cls.keepalive_expiry,
+            ),
+        }
+
+    @classmethod
+    def client(cls) -> httpx.Client:
+        client = BaseClient._clients.get(cls)
+        if client is None:
+            with BaseClient._clients_lock:
+                client = BaseClient._clients.get(cls)
+                if client is None:
+                    client = BaseClient._clients[cls] = httpx.Client(**cls.client_options())
+        return client
+
+    @classmethod
+    def async_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with BaseClient._clients_lock:
+            clients = BaseClient._async_clients.setdefault(loop, {})
+            if cls not in clients:
+                clients[cls] = httpx.AsyncClient(**cls.client_options())
+            return clients[cls]
+
+    @staticmethod
+    async def close_clients():
+        """Close the pools of the process, e.g. on ASGI lifespan shutdown."""
+        with BaseClient._clients_lock:
+            clients = list(BaseClient._clients.values())
+            BaseClient._clients.clear()
+            async_clients = list(BaseClient._async_clients.pop(asyncio.get_running_loop(), {}).values())
+        for client in clients:
+            client.close()
+        for async_client in async_clients:
+            await async_client.aclose()
+
+    @staticmethod
+    def reset_clients():
+        # A forked worker must not reuse the sockets of its parent.
+        BaseClient._clients = {}
+        BaseClient._async_clients = weakref.WeakKeyDictionary()
+        BaseClient._clients_lock = threading.Lock()
+
     def _make_request(self, method: str, url: str, data=None, params=None):
         self.start_time = time.time()
-        response = None
         try:
             logger.info(f"Making {method} request to {url} with data: {data}")
-            response = self.session.request(
+            response = self.client().request(
                 method,
                 url,
                 json=data,
@@ -32,34 +99,45 @@ class BaseClient:
                 timeout=self.timeout,
                 params=params
             )
+            return self._handle_response(response)
+        except Exception as err:
+            return self._handle_error(url, err)
 
-            self.response = response.json()
-            self.status_code = response.status_code
-            return self.response, self.status_code
+    async def _amake_request(self, method: str, url: str, data=None, params=None):
+        self.start_time = time.time()
+        try:
+            logger.info(f"Making {method} request to {url} with data: {data}")
+            response = await self.async_client().request(
+                method,
+                url,
+                json=data,
+                headers=self.headers,
+                timeout=self.timeout,
+                params=params
+            )
+            return self._handle_response(response)
+        except Exception as err:
+            return self._handle_error(url, err)
 
-        except requests.exceptions.Timeout:
+    def _handle_response(self, response: httpx.Response):
+        self.response = response.json()
+        self.status_code = response.status_code
+        return self.response, self.status_code
+
+    def _handle_error(self, url: str, err: Exception):
+        if isinstance(err, httpx.TimeoutException):
             self.status_code = 408
             self.response = {"message": "request timeout"}
             logger.warning(f"Request to {url} timed out")
-            return None, self.status_code
-
-        except requests.exceptions.HTTPError as http_err:
-            self.status_code = response.status_code if response else 500
-            try:
-                self.response = response.json() if response else {}
-            except ValueError:
-                self.response = {"message": "non-json response"}
-            logger.error(f"HTTP error {self.status_code}: {http_err}")
-            return None, self.status_code
-
-        except requests.exceptions.RequestException as req_err:
+        elif isinstance(err, httpx.HTTPError):
             self.status_code = 500
-            self.response = {"message": str(req_err)}
-            logger.error(f"Request exception: {req_err}")
-            return None, self.status_code
-
-        except Exception as err:
+            self.response = {"message": str(err)}
+            logger.error(f"Request exception: {err}")
+        else:
             self.status_code = 500
             self.response = {"message": str(err)}
             logger.error(f"Unexpected error: {err}")
-            return None, self.status_code
+        return None, self.status_code
+
+
+os.register_at_fork(after_in_child=BaseClient.reset_clients)
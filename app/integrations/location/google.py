@@ -5,12 +5,16 @@ from django.conf import settings
 
 from integrations.base import BaseClient
 from integrations.location.dataclass import GoogleRouteRequest
+from integrations.location.routing import RoutingProvider
 
 logger = logging.getLogger(__name__)
 
 
-class GoogleRoutesService(BaseClient):
+class GoogleRoutesService(BaseClient, RoutingProvider):
     DEFAULT_TIMEOUT = 30
+    ClientName = "google_routes"
+    max_connections = settings.GOOGLE_MAPS_MAX_CONNECTIONS
+    max_keepalive_connections = settings.GOOGLE_MAPS_MAX_KEEPALIVE_CONNECTIONS
 
     def __init__(self, timeout: Optional[int] = None):
         super().__init__()
@@ -27,11 +31,9 @@ class GoogleRoutesService(BaseClient):
         if not self.api_key:
             raise Exception("Google Maps API key is missing")
 
-    def compute_route(self, data: GoogleRouteRequest):
-        """
-        Calls the Google Routes API to get route info between origin and destination
-        """
-        payload = {
+    @staticmethod
+    def route_payload(data: GoogleRouteRequest) -> dict:
+        return {
             "origin": {
                 "location": {
                     "latLng": {
@@ -51,9 +53,22 @@ class GoogleRoutesService(BaseClient):
             "travelMode": "DRIVE"
         }
 
+    @staticmethod
+    def log_route_request(data: GoogleRouteRequest):
         logger.info(
             f"Requesting route from {data.origin_latitude},"
             f"{data.origin_longitude} to {data.destination_latitude},"
             f"{data.destination_longitude},")
-        response, status_code = self._make_request("POST", f"{self.base_url}:computeRoutes", payload)
+
+    def compute_route(self, data: GoogleRouteRequest):
+        """
+        Calls the Google Routes API to get route info between origin and destination
+        """
+        self.log_route_request(data)
+        response, status_code = self._make_request("POST", f"{self.base_url}:computeRoutes", self.route_payload(data))
         return response, status_code
+
+    async def acompute_route(self, data: GoogleRouteRequest):
+        """Async version of ``compute_route``."""
+        self.log_route_request(data)
+        return await self._amake_request("POST", f"{self.base_url}:computeRoutes", self.route_payload(data))
@@ -0,0 +1,272 @@
+"""
+Offline routing over a prepared road graph, for ``TRIP_ROUTING_PROVIDER = "graph"``.
+
+The graph is held as compressed sparse rows: the edges leaving node ``i`` are
+``targets[offsets[i]:offsets[i + 1]]`` with lengths in meters in ``lengths``.
+Shortest paths are found with A* guided by landmark distances (ALT): for a few
+landmarks spread over the graph, the distances from and to every node are
+precomputed, and the triangle inequality turns them into a lower bound of the
+remaining distance to the target.
+
+Graph files are NumPy ``.npz`` archives written by ``RoadGraph.save``; see the
+``build_road_graph`` management command for building one from a road network
+extract.
+"""
+import heapq
+import logging
+import math
+import threading
+from operator import add
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import polyline
+from django.conf import settings
+
+from common.geo import EARTH_RADIUS_METERS, meters_to_degrees
+from common.spatial_index import PackedRTree
+from integrations.location.dataclass import GoogleRouteRequest
+from integrations.location.routing import RoutingProvider
+
+logger = logging.getLogger(__name__)
+
+# Stands in for infinite landmark distances, so that unreachable pairs cancel
+# out instead of producing nan; far above any road distance.
+UNREACHABLE = 1e30
+
+GRAPH_ARRAYS = ("coordinates", "offsets", "targets", "lengths", "landmarks", "from_landmarks", "to_landmarks")
+
+
+def haversine_array(coordinates_a: np.ndarray, coordinates_b: np.ndarray) -> np.ndarray:
+    """Great-circle distances in meters between rows of (longitude, latitude) pairs."""
+    longitude_a, latitude_a = np.radians(coordinates_a).T
+    longitude_b, latitude_b = np.radians(coordinates_b).T
+    a = (
+        np.sin((latitude_b - latitude_a) / 2) ** 2
+        + np.cos(latitude_a) * np.cos(latitude_b) * np.sin((longitude_b - longitude_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def compressed_rows(node_count: int, sources: np.ndarray, targets: np.ndarray, lengths: np.ndarray):
+    order = np.argsort(sources, kind="stable")
+    offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=offsets[1:])
+    return offsets, targets[order].astype(np.int32), lengths[order].astype(np.float32)
+
+
+def dijkstra(offsets: list, targets: list, lengths: list, source: int) -> np.ndarray:
+    """Distances in meters from ``source`` to every node, ``UNREACHABLE`` where unreachable."""
+    distances = [UNREACHABLE] * (len(offsets) - 1)
+    distances[source] = 0.0
+    queue = [(0.0, source)]
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if distance > distances[node]:
+            continue
+        for edge in range(offsets[node], offsets[node + 1]):
+            candidate = distance + lengths[edge]
+            target = targets[edge]
+            if candidate < distances[target]:
+                distances[target] = candidate
+                heapq.heappush(queue, (candidate, target))
+    return np.asarray(distances)
+
+
+@dataclass
+class RoadGraph:
+    coordinates: np.ndarray
+    offsets: np.ndarray
+    targets: np.ndarray
+    lengths: np.ndarray
+    landmarks: np.ndarray
+    # (nodes, landmarks) distances from each landmark to a node and from a node to each landmark
+    from_landmarks: np.ndarray
+    to_landmarks: np.ndarray
+
+    def __post_init__(self):
+        # Plain lists are much faster than NumPy scalars in the search loop.
+        self.adjacency = (self.offsets.tolist(), self.targets.tolist(), self.lengths.tolist())
+        self.nodes = PackedRTree(np.column_stack([self.coordinates, self.coordinates]))
+        # Row ``v`` holds (-d(landmark, v), d(v, landmark)); adding the target's
+        # (d(landmark, t), -d(t, landmark)) gives every landmark bound at once.
+        self.landmark_rows = np.hstack([-self.from_landmarks, self.to_landmarks])
+
+    @classmethod
+    def from_edges(cls, coordinates, sources, targets, lengths=None, landmark_count: int = 8) -> "RoadGraph":
+        """
+        Build a graph from directed edges between node positions. Edge lengths
+        default to the great-circle distance between their nodes; two-way roads
+        need one edge per direction.
+        """
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if lengths is None:
+            lengths = haversine_array(coordinates[sources], coordinates[targets])
+        lengths = np.asarray(lengths, dtype=float)
+
+        node_count = len(coordinates)
+        offsets, forward_targets, forward_lengths = compressed_rows(node_count, sources, targets, lengths)
+        reverse = compressed_rows(node_count, targets, sources, lengths)
+        forward = (offsets.tolist(), forward_targets.tolist(), forward_lengths.tolist())
+        reverse = tuple(array.tolist() for array in reverse)
+
+        landmarks, from_landmarks, to_landmarks = [], [], []
+        closest = np.full(node_count, np.inf)
+        landmark = 0
+        for _ in range(min(landmark_count, node_count)):
+            landmarks.append(landmark)
+            from_landmarks.append(dijkstra(*forward, landmark))
+            to_landmarks.append(dijkstra(*reverse, landmark))
+            # Next landmark: the reachable node farthest from the chosen ones
+            closest = np.minimum(closest, from_landmarks[-1] + to_landmarks[-1])
+            spread = np.where(closest < UNREACHABLE, closest, -1.0)
+            spread[landmarks] = -1.0
+            if spread.max() <= 0:
+                break
+            landmark = int(spread.argmax())
+
+        def stacked(rows):
+            if not rows:
+                return np.zeros((node_count, 0), dtype=np.float32)
+            return np.column_stack(rows).astype(np.float32)
+
+        return cls(
+            coordinates=coordinates,
+            offsets=offsets,
+            targets=forward_targets,
+            lengths=forward_lengths,
+            landmarks=np.asarray(landmarks, dtype=np.int64),
+            from_landmarks=stacked(from_landmarks),
+            to_landmarks=stacked(to_landmarks),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with np.load(path) as archive:
+            return cls(**{name: archive[name] for name in GRAPH_ARRAYS})
+
+    def save(self, path: str):
+        np.savez(path, **{name: getattr(self, name) for name in GRAPH_ARRAYS})
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def nearest_node(self, longitude: float, latitude: float, max_meters: float) -> Optional[int]:
+        """Closest node within ``max_meters`` of a point, searched in growing boxes."""
+        radius = min(100.0, max_meters)
+        while True:
+            delta_x, delta_y = meters_to_degrees(radius, latitude)
+            nodes = self.nodes.query(longitude - delta_x, latitude - delta_y, longitude + delta_x, latitude + delta_y)
+            if nodes.size:
+                distances = haversine_array(self.coordinates[nodes], np.array([[longitude, latitude]]))
+                nearest = int(distances.argmin())
+                # Only the circle inscribed in the box is sure to hold every closer node
+                if distances[nearest] <= radius:
+                    return int(nodes[nearest])
+            if radius >= max_meters:
+                return None
+            radius = min(radius * 4, max_meters)
+
+    def shortest_path(self, source: int, target: int) -> Optional[tuple[float, list[int]]]:
+        """Length in meters and nodes of the shortest path, None when ``target`` is unreachable."""
+        offsets, targets, lengths = self.adjacency
+        rows = self.landmark_rows
+        target_row = np.concatenate([self.from_landmarks[target], -self.to_landmarks[target]]).tolist()
+
+        def lower_bound(node: int) -> float:
+            # ALT bound: the triangle inequality over every landmark, both directions
+            return max(map(add, rows[node].tolist(), target_row), default=0.0)
+
+        if lower_bound(source) >= UNREACHABLE:
+            return None
+        distances = {source: 0.0}
+        previous = {}
+        bounds = {}
+        queue = [(0.0, source)]
+        settled = set()
+        while queue:
+            _, node = heapq.heappop(queue)
+            if node == target:
+                path = [node]
+                while node in previous:
+                    node = previous[node]
+                    path.append(node)
+                return distances[target], path[::-1]
+            if node in settled:
+                continue
+            settled.add(node)
+            distance = distances[node]
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                candidate = distance + lengths[edge]
+                if candidate < distances.get(neighbour, math.inf):
+                    distances[neighbour] = candidate
+                    previous[neighbour] = node
+                    bound = bounds.get(neighbour)
+                    if bound is None:
+                        bound = bounds[neighbour] = lower_bound(neighbour)
+                    if bound < UNREACHABLE:
+                        heapq.heappush(queue, (candidate + bound, neighbour))
+        return None
+
+
+class GraphRouter(RoutingProvider):
+    """
+    In-process routing provider over the ``RoadGraph`` at ``path``, loaded on
+    first use. Endpoints snap to the nearest graph node within
+    ``max_snap_meters``; durations assume a constant ``speed_mps``. Requests
+    the graph cannot answer, outside its coverage or between unconnected
+    nodes, get a 404.
+    """
+
+    def __init__(self, path: Optional[str], speed_mps: float, max_snap_meters: float):
+        self.path = path
+        self.speed_mps = speed_mps
+        self.max_snap_meters = max_snap_meters
+        self.graph: Optional[RoadGraph] = None
+        self.lock = threading.Lock()
+
+    def load(self) -> RoadGraph:
+        if self.graph is None:
+            with self.lock:
+                if self.graph is None:
+                    if not self.path:
+                        raise Exception("Road graph path is missing")
+                    self.graph = RoadGraph.load(self.path)
+                    logger.info(f"Loaded road graph with {len(self.graph)} nodes from {self.path}")
+        return self.graph
+
+    def compute_route(self, data: GoogleRouteRequest):
+        try:
+            graph = self.load()
+        except Exception as e:
+            logger.error(f"Road graph unavailable: {e}")
+            return None, 503
+
+        source = graph.nearest_node(data.origin_longitude, data.origin_latitude, self.max_snap_meters)
+        target = graph.nearest_node(data.destination_longitude, data.destination_latitude, self.max_snap_meters)
+        found = graph.shortest_path(source, target) if source is not None and target is not None else None
+        if found is None:
+            # Not covered by the graph: a non-200 status lets the fallback provider answer
+            logger.info("No road graph route between the requested points")
+            return None, 404
+
+        distance, path = found
+        points = graph.coordinates[path] if len(path) > 1 else graph.coordinates[[path[0], path[0]]]
+        return {
+            "routes": [{
+                "distanceMeters": round(distance),
+                "duration": f"{round(distance / self.speed_mps)}s",
+                "polyline": {"encodedPolyline": polyline.encode([(lat, lng) for lng, lat in points.tolist()])},
+            }]
+        }, 200
+
+
+graph_router = GraphRouter(
+    path=settings.ROAD_GRAPH_PATH,
+    speed_mps=settings.ROAD_GRAPH_SPEED_MPS,
+    max_snap_meters=settings.ROAD_GRAPH_MAX_SNAP_METERS,
+)
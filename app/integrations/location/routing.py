@@ -0,0 +1,68 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from integrations.location.dataclass import GoogleRouteRequest
+
+logger = logging.getLogger(__name__)
+
+GOOGLE = "google"
+GRAPH = "graph"
+ROUTING_PROVIDERS = (GOOGLE, GRAPH)
+
+
+class RoutingProvider:
+    """
+    Computes driving routes. Responses follow the shape of the Routes API
+    ``computeRoutes`` response (``routes[0].distanceMeters``, ``duration``,
+    ``polyline.encodedPolyline``) and are returned with an HTTP-like status
+    code, like ``BaseClient._make_request``.
+    """
+
+    def compute_route(self, data: GoogleRouteRequest):
+        raise NotImplementedError
+
+    async def acompute_route(self, data: GoogleRouteRequest):
+        # Providers without native asyncio support compute off the event loop
+        return await sync_to_async(self.compute_route, thread_sensitive=False)(data)
+
+
+def routing_provider(name: str) -> RoutingProvider:
+    if name == GRAPH:
+        from integrations.location.graph import graph_router
+
+        return graph_router
+    from integrations.location.google import GoogleRoutesService
+
+    return GoogleRoutesService()
+
+
+def fallback_provider(status_code):
+    """``TRIP_ROUTING_FALLBACK_PROVIDER`` when the primary provider failed, else None."""
+    fallback = settings.TRIP_ROUTING_FALLBACK_PROVIDER
+    if str(status_code) == "200" or not fallback or fallback == settings.TRIP_ROUTING_PROVIDER:
+        return None
+    logger.warning(f"Routing provider {settings.TRIP_ROUTING_PROVIDER} failed with {status_code}, using {fallback}")
+    return routing_provider(fallback)
+
+
+def compute_route(data: GoogleRouteRequest):
+    """Route response, status code and the name of the provider that answered."""
+    provider = settings.TRIP_ROUTING_PROVIDER
+    response, status_code = routing_provider(provider).compute_route(data)
+    fallback = fallback_provider(status_code)
+    if fallback is not None:
+        provider = settings.TRIP_ROUTING_FALLBACK_PROVIDER
+        response, status_code = fallback.compute_route(data)
+    return response, status_code, provider
+
+
+async def acompute_route(data: GoogleRouteRequest):
+    provider = settings.TRIP_ROUTING_PROVIDER
+    response, status_code = await routing_provider(provider).acompute_route(data)
+    fallback = fallback_provider(status_code)
+    if fallback is not None:
+        provider = settings.TRIP_ROUTING_FALLBACK_PROVIDER
+        response, status_code = await fallback.acompute_route(data)
+    return response, status_code, provider
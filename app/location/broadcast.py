@@ -0,0 +1,51 @@
+from django.conf import settings
+
+from common.kafka_producer import KafkaProducerService
+
+KAFKA = "kafka"
+DIRECT = "direct"
+BROADCAST_STRATEGIES = (KAFKA, DIRECT)
+
+
+def trip_room_name(trip_id) -> str:
+    return f"trip_{trip_id}"
+
+
+async def broadcast_location(channel_layer, trip_id, location_data, strategy=None):
+    """
+    Deliver a location update to the subscribers of a trip.
+
+    ``kafka``: publish to Kafka only; ``consume_trip_locations`` fans the update
+    out to the channel layer group.
+    ``direct``: send to the channel layer group right away and publish to Kafka
+    in the background for persistence and analytics only. The Kafka message is
+    flagged ``broadcast`` so the broadcaster does not deliver it twice.
+    """
+    strategy = strategy or settings.LOCATION_BROADCAST_STRATEGY
+    room_name = trip_room_name(trip_id)
+    message = {
+        "type": "trip.location.update",
+        "message": location_data,
+    }
+
+    if strategy == DIRECT:
+        await channel_layer.group_send(room_name, {
+            "type": "trip.location.update",
+            "message": message,
+        })
+
+    # Keyed by trip id so every update of a trip stays ordered on one partition.
+    producer_service = KafkaProducerService(topic=settings.KAFKA_TRIP_LOCATION_TOPIC)
+    await producer_service.send_nowait({
+        'room_name': room_name,
+        'message': message,
+        'broadcast': strategy == DIRECT,
+    }, key=trip_id)
+
+
+async def broadcast_route(channel_layer, trip_id, route_data):
+    """Tell the subscribers of a trip that its pending route was computed or failed."""
+    await channel_layer.group_send(trip_room_name(trip_id), {
+        "type": "trip.route.update",
+        "message": route_data,
+    })
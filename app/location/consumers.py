@@ -5,39 +5,61 @@ from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.contrib.gis.geos import Point
+from django.conf import settings
 from django.core.cache import cache
-from django.db import transaction
 from django.utils import timezone
 
-from common.kafka_producer import KafkaProducerService
+from location.broadcast import broadcast_location
+from location.current_location import set_current_location
+from location.downsampling import LocationDownsampler
+from location.frames import (
+    PUBLISH_LOCATION,
+    PUBLISH_LOCATION_BATCH,
+    FrameError,
+    decode_frame,
+)
+from trip.active_trips import active_trips
+from trip.progress import route_progress
 
 logger = logging.getLogger(__name__)
 CACHE_TIMEOUT = 60 * 60  # 1 hour
+ENCODINGS = ("json", "binary")
 
 
 class TripLocationConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time trip location tracking.
+
+    The ``encoding`` query parameter (``json`` or ``binary``) picks the frame
+    format used to publish locations on this connection; see ``location.frames``.
+    Subscription messages and server replies are always JSON text frames.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.client_trips = None
         self.session_id = None
+        self.encoding = "json"
         self.subscribed_trips = set()
+        self.downsampler = LocationDownsampler()
 
     async def connect(self):
         query_string = self.scope["query_string"].decode()
         params = parse_qs(query_string)
 
         self.session_id = params.get("session_id", [None])[0]
+        self.encoding = params.get("encoding", ["json"])[0]
 
         if not self.session_id:
             await self.close(code=4001)
             return
+
+        if self.encoding not in ENCODINGS:
+            await self.close(code=4002)
+            return
         # TODO validate session id in cache
         self.client_trips = await self.get_client_trips(self.session_id)
+        self.downsampler = LocationDownsampler.from_config(await self.get_trip_settings())
 
         cache_key = f"client_subscribed_{self.session_id}"
         subscribed = self.client_trips.subscribed_to or []
@@ -47,7 +69,7 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
         await self.accept()
         logger.info(
             f"WebSocket connected {self.channel_name} "
-            f"session={self.session_id} trips={self.subscribed_trips}"
+            f"session={self.session_id} encoding={self.encoding} trips={self.subscribed_trips}"
         )
 
     async def disconnect(self, code):
@@ -66,10 +88,15 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
 
         logger.info(
             f"WebSocket disconnected {self.channel_name} "
-            f"session={self.session_id}" f"trips={self.subscribed_trips}"
+            f"session={self.session_id}" f"trips={self.subscribed_trips} "
+            f"locations_accepted={self.downsampler.accepted} locations_dropped={self.downsampler.dropped}"
         )
 
     async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            await self.receive_binary(bytes_data)
+            return
+
         try:
             data = json.loads(text_data)
             msg_type = data.get("type")
@@ -79,6 +106,9 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
                 case "PUBLISH_LOCATION":
                     await self.handle_publish_location(payload)
 
+                case "PUBLISH_LOCATION_BATCH":
+                    await self.handle_publish_location_batch(payload.get("points") or [])
+
                 case "SUBSCRIBE_TO_TRIP_LOCATION":
                     await self.handle_subscribe(payload)
 
@@ -95,14 +125,32 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
             logger.exception("WebSocket error")
             await self.send_error(str(e))
 
+    async def receive_binary(self, bytes_data):
+        if self.encoding != "binary":
+            await self.send_error("Binary frames require encoding=binary")
+            return
+
+        try:
+            msg_type, points = decode_frame(bytes_data)
+            if msg_type == PUBLISH_LOCATION:
+                await self.handle_publish_location(points[0].to_payload())
+            elif msg_type == PUBLISH_LOCATION_BATCH:
+                await self.handle_publish_location_batch([point.to_payload() for point in points])
+
+        except FrameError as e:
+            await self.send_error(str(e))
+
+        except Exception as e:
+            logger.exception("WebSocket error")
+            await self.send_error(str(e))
+
     async def handle_subscribe(self, payload):
         trip_id = payload.get("trip_id")
         if not trip_id:
             await self.send_error("trip_id is required")
             return
 
-        trip = await self.get_trip(trip_id)
-        if not trip:
+        if not await self.trip_exists(trip_id):
             await self.send_error(f"Trip {trip_id} not found")
             return
 
@@ -132,8 +180,7 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
             await self.send_error("trip_id is required")
             return
 
-        trip = await self.get_trip(trip_id)
-        if not trip:
+        if not await self.trip_exists(trip_id):
             await self.send_error(f"Trip {trip_id} not found")
             return
         if trip_id not in self.subscribed_trips:
@@ -154,30 +201,66 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
         }))
 
     async def handle_publish_location(self, payload):
+        status, result = await self.publish_location(payload)
+        if status == "error":
+            await self.send_error(result)
+            return
+
+        await self.send(json.dumps({
+            "type": "LOCATION_PUBLISHED",
+            "status": status,
+            "data": result
+        }))
+
+    async def handle_publish_location_batch(self, points):
+        if not isinstance(points, list) or not points:
+            await self.send_error("points must be a non-empty list")
+            return
+
+        if len(points) > settings.LOCATION_MAX_BATCH_POINTS:
+            await self.send_error(f"A batch may carry at most {settings.LOCATION_MAX_BATCH_POINTS} points")
+            return
+
+        published = 0
+        dropped = 0
+        rejected = []
+        for index, payload in enumerate(points):
+            if not isinstance(payload, dict):
+                rejected.append({"index": index, "message": "Invalid point"})
+                continue
+            status, result = await self.publish_location(payload)
+            if status == "error":
+                rejected.append({"index": index, "message": result})
+            elif status == "dropped":
+                dropped += 1
+            else:
+                published += 1
+
+        await self.send(json.dumps({
+            "type": "LOCATION_BATCH_PUBLISHED",
+            "status": "success",
+            "data": {"published": published, "dropped": dropped, "rejected": rejected}
+        }))
+
+    async def publish_location(self, payload) -> tuple:
+        """
+        Validate, downsample, store and broadcast one location point.
+        Returns ("success", location data), ("dropped", location data) when the
+        point is redundant, or ("error", message).
+        """
         trip_id = payload.get("trip_id")
         latitude = payload.get("latitude")
         longitude = payload.get("longitude")
         timestamp = payload.get("timestamp") or timezone.now().isoformat()
 
         if not all([trip_id, latitude, longitude]):
-            await self.send_error("trip_id, latitude and longitude are required")
-            return
+            return "error", "trip_id, latitude and longitude are required"
 
         if not self.validate_coordinates(latitude, longitude):
-            await self.send_error("Invalid coordinates")
-            return
+            return "error", "Invalid coordinates"
 
-        trip = await self.get_trip(trip_id)
-        if not trip:
-            await self.send_error(f"Trip {trip_id} not found")
-            return
-
-        await self.update_trip_current_location(
-            trip_id=trip_id,
-            longitude=float(longitude),
-            latitude=float(latitude),
-            timestamp=timestamp
-        )
+        if not await self.trip_exists(trip_id):
+            return "error", f"Trip {trip_id} not found"
 
         location_data = {
             "trip_id": trip_id,
@@ -186,13 +269,18 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
             "timestamp": timestamp,
         }
 
-        await self.broadcast_location_update(trip_id, location_data)
+        if not self.downsampler.accept(trip_id, float(longitude), float(latitude), timestamp):
+            return "dropped", location_data
 
-        await self.send(json.dumps({
-            "type": "LOCATION_PUBLISHED",
-            "status": "success",
-            "data": location_data
-        }))
+        await self.update_trip_current_location(
+            trip_id=trip_id,
+            longitude=float(longitude),
+            latitude=float(latitude),
+            timestamp=timestamp
+        )
+
+        await self.broadcast_location_update(trip_id, location_data)
+        return "success", location_data
 
     @database_sync_to_async
     def get_client_trips(self, session_id):
@@ -201,6 +289,11 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
         print(client_trip.subscribed_to)
         return client_trip
 
+    @database_sync_to_async
+    def get_trip_settings(self):
+        from trip.utils import get_active_trip_settings
+        return get_active_trip_settings()
+
     @database_sync_to_async
     def add_trip_to_subscribed_trips(self, trip_id) -> Awaitable[None]:
         if trip_id not in self.client_trips.subscribed_to:
@@ -216,18 +309,20 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def update_trip_current_location(self, trip_id, longitude, latitude, timestamp) -> Awaitable[None]:
-        from trip.models import Trip
-        self.save_location_history(trip_id, longitude, latitude, timestamp)
-        with transaction.atomic():
-            Trip.objects.filter(id=trip_id).update(
-                current_location=Point(longitude, latitude)
-            )
+        # Written behind to the trip by location.tasks.flush_trip_current_locations
+        progress = route_progress.update(trip_id, longitude, latitude)
+        route_version = set_current_location(trip_id, longitude, latitude, timestamp, progress=progress)
+        if route_progress.discard_stale(trip_id, route_version):
+            # Rerouted since the route was cached: track the car on the new route
+            progress = route_progress.update(trip_id, longitude, latitude)
+            set_current_location(trip_id, longitude, latitude, timestamp, progress=progress)
         return trip_id
 
-    @database_sync_to_async
-    def get_trip(self, trip_id):
-        from trip.models import Trip
-        return Trip.objects.filter(id=trip_id).only("id").first()
+    async def trip_exists(self, trip_id) -> bool:
+        # Served from the in-process cache without a thread hop when possible.
+        if active_trips.is_cached(trip_id):
+            return True
+        return await database_sync_to_async(active_trips.exists)(trip_id, check_local=False)
 
     @database_sync_to_async
     def remove_trip_from_subscribed_trips(self, trip_id) -> Awaitable[None]:
@@ -242,15 +337,6 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
         )
         return self.client_trips
 
-    @database_sync_to_async
-    def save_location_history(self, trip_id, longitude, latitude, timestamp):
-        from trip.models import TripLocationHistory
-        return TripLocationHistory.objects.create(
-            trip_id=trip_id,
-            location=Point(longitude, latitude),
-            timestamp=timestamp,
-        )
-
     async def send_error(self, message):
         await self.send(json.dumps({
             "type": "ERROR",
@@ -267,18 +353,18 @@ class TripLocationConsumer(AsyncWebsocketConsumer):
             return False
 
     async def broadcast_location_update(self, trip_id, location_data):
-        room_name = f"trip_{trip_id}"
-        message = {
-            "type": "trip.location.update",
-            "message": location_data,
-        }
+        await broadcast_location(self.channel_layer, trip_id, location_data)
 
-        await self.send_location_update({
-            'room_name': room_name,
-            'message': message
-        })
+    async def trip_location_update(self, event):
+        """Forward a location update broadcast on a subscribed trip group."""
+        await self.send(json.dumps({
+            "type": "LOCATION_UPDATE",
+            "data": event["message"].get("message"),
+        }))
 
-    @staticmethod
-    async def send_location_update(message: dict):
-        producer_service = KafkaProducerService(topic="trip_location_updates")
-        await producer_service.send(message)
+    async def trip_route_update(self, event):
+        """Forward the outcome of a background route computation, see trip.pending_routes."""
+        await self.send(json.dumps({
+            "type": "ROUTE_UPDATE",
+            "data": event["message"],
+        }))
@@ -0,0 +1,141 @@
+import json
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CURRENT_LOCATION_KEY = "trip_current_location:{trip_id}"
+DIRTY_TRIPS_KEY = "trip_current_location_dirty"
+ROUTE_VERSION_KEY = "trip_route_version:{trip_id}"
+FLUSH_CHUNK_SIZE = 1000
+
+# Removes the progress from a current location entry, keeping its position and TTL
+DROP_PROGRESS_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+local location = cjson.decode(value)
+location['progress'] = nil
+redis.call('SET', KEYS[1], cjson.encode(location), 'KEEPTTL')
+return 1
+"""
+
+
+def set_current_location(trip_id, longitude: float, latitude: float, timestamp,
+                         progress: Optional[float] = None) -> int:
+    """
+    Record the latest position of a trip, and its progress along the route, in
+    Redis (last write wins) and mark the trip for the next batched flush to
+    ``Trip.current_location`` and ``Trip.route_progress_fraction``.
+
+    Returns the route version of the trip, see ``reset_route_progress``.
+    """
+    redis = get_redis_connection("default")
+    pipe = redis.pipeline(transaction=False)
+    pipe.set(
+        CURRENT_LOCATION_KEY.format(trip_id=trip_id),
+        json.dumps({
+            "longitude": longitude,
+            "latitude": latitude,
+            "timestamp": str(timestamp),
+            "progress": progress,
+        }),
+        ex=settings.TRIP_CURRENT_LOCATION_TTL,
+    )
+    pipe.sadd(DIRTY_TRIPS_KEY, trip_id)
+    pipe.get(ROUTE_VERSION_KEY.format(trip_id=trip_id))
+    return int(pipe.execute()[-1] or 0)
+
+
+def get_route_version(trip_id) -> int:
+    return int(get_redis_connection("default").get(ROUTE_VERSION_KEY.format(trip_id=trip_id)) or 0)
+
+
+def reset_route_progress(trip_id) -> None:
+    """
+    Forget the live progress of a rerouted trip, so that neither the next flush
+    nor the match engines apply progress along the previous route, and bump the
+    route version that tells location consumers to reload the route.
+    """
+    redis = get_redis_connection("default")
+    version_key = ROUTE_VERSION_KEY.format(trip_id=trip_id)
+    pipe = redis.pipeline(transaction=True)
+    pipe.incr(version_key)
+    pipe.expire(version_key, settings.TRIP_CURRENT_LOCATION_TTL)
+    pipe.eval(DROP_PROGRESS_SCRIPT, 1, CURRENT_LOCATION_KEY.format(trip_id=trip_id))
+    pipe.execute()
+
+
+def get_current_location(trip_id) -> Optional[Point]:
+    """Return the freshest known position of a trip, or None when Redis has none."""
+    value = get_redis_connection("default").get(CURRENT_LOCATION_KEY.format(trip_id=trip_id))
+    if not value:
+        return None
+    location = json.loads(value)
+    return Point(location["longitude"], location["latitude"], srid=4326)
+
+
+def get_route_progress(trip_ids) -> dict:
+    """Latest progress fraction of each trip that has one in Redis."""
+    trip_ids = list(trip_ids)
+    if not trip_ids:
+        return {}
+    keys = [CURRENT_LOCATION_KEY.format(trip_id=trip_id) for trip_id in trip_ids]
+    progress = {}
+    for trip_id, value in zip(trip_ids, get_redis_connection("default").mget(keys)):
+        location = json.loads(value) if value else {}
+        if location.get("progress") is not None:
+            progress[trip_id] = location["progress"]
+    return progress
+
+
+def flush_current_locations() -> int:
+    """
+    Write the latest Redis position and progress of every trip updated since
+    the previous flush to the trip with one ``UPDATE ... FROM (VALUES ...)``
+    per chunk. Returns the number of trips flushed.
+    """
+    from trip.models import Trip
+
+    redis = get_redis_connection("default")
+    pipe = redis.pipeline(transaction=True)
+    pipe.smembers(DIRTY_TRIPS_KEY)
+    pipe.delete(DIRTY_TRIPS_KEY)
+    trip_ids, _ = pipe.execute()
+    trip_ids = [trip_id.decode() for trip_id in trip_ids]
+    if not trip_ids:
+        return 0
+
+    values = redis.mget([CURRENT_LOCATION_KEY.format(trip_id=trip_id) for trip_id in trip_ids])
+    rows = []
+    for trip_id, value in zip(trip_ids, values):
+        if value:
+            location = json.loads(value)
+            rows.append((trip_id, location["longitude"], location["latitude"], location.get("progress")))
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), FLUSH_CHUNK_SIZE):
+                chunk = rows[start:start + FLUSH_CHUNK_SIZE]
+                placeholders = ", ".join(["(%s, %s::float8, %s::float8, %s::float8)"] * len(chunk))
+                cursor.execute(
+                    f"UPDATE {Trip._meta.db_table} AS t "
+                    f"SET current_location = ST_SetSRID(ST_MakePoint(v.lon, v.lat), 4326)::geography, "
+                    f"route_progress_fraction = COALESCE(v.progress, t.route_progress_fraction) "
+                    f"FROM (VALUES {placeholders}) AS v(id, lon, lat, progress) "
+                    f"WHERE t.id = v.id",
+                    [param for row in chunk for param in row],
+                )
+    except Exception:
+        # Re-queue the trips so the positions are retried on the next flush.
+        redis.sadd(DIRTY_TRIPS_KEY, *trip_ids)
+        raise
+
+    logger.info(f"Flushed current location of {len(rows)} trips")
+    return len(rows)
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from common.geo import haversine_meters
+
+
+@dataclass
+class AcceptedPoint:
+    longitude: float
+    latitude: float
+    timestamp: datetime
+
+
+class LocationDownsampler:
+    """
+    Per-trip filter dropping redundant location points before they are stored
+    and broadcast. A point is dropped when it arrives less than
+    ``min_interval_seconds`` after the last accepted point of the trip, or when
+    the car moved less than ``min_distance_meters`` -- unless
+    ``max_silence_seconds`` passed, so stationary cars still send a heartbeat.
+    A zero threshold disables that rule.
+    """
+
+    def __init__(self, min_distance_meters: float = 0, min_interval_seconds: float = 0,
+                 max_silence_seconds: float = 0):
+        self.min_distance_meters = min_distance_meters
+        self.min_interval_seconds = min_interval_seconds
+        self.max_silence_seconds = max_silence_seconds
+        self.last_points: dict[str, AcceptedPoint] = {}
+        self.accepted = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_config(cls, config) -> "LocationDownsampler":
+        if not config:
+            return cls()
+        return cls(
+            min_distance_meters=float(config.location_min_distance_meters or 0),
+            min_interval_seconds=float(config.location_min_interval_seconds or 0),
+            max_silence_seconds=float(config.location_max_silence_seconds or 0),
+        )
+
+    @staticmethod
+    def parse_timestamp(timestamp) -> datetime:
+        parsed = parse_datetime(str(timestamp)) if timestamp else None
+        if parsed is None:
+            return timezone.now()
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    def accept(self, trip_id, longitude: float, latitude: float, timestamp=None) -> bool:
+        point = AcceptedPoint(longitude, latitude, self.parse_timestamp(timestamp))
+        if not self.should_accept(self.last_points.get(trip_id), point):
+            self.dropped += 1
+            return False
+
+        self.last_points[trip_id] = point
+        self.accepted += 1
+        return True
+
+    def should_accept(self, last: Optional[AcceptedPoint], point: AcceptedPoint) -> bool:
+        if last is None:
+            return True
+
+        elapsed = (point.timestamp - last.timestamp).total_seconds()
+        if self.min_interval_seconds and elapsed < self.min_interval_seconds:
+            return False
+        if self.max_silence_seconds and elapsed >= self.max_silence_seconds:
+            return True
+        if self.min_distance_meters:
+            moved = haversine_meters(last.longitude, last.latitude, point.longitude, point.latitude)
+            return moved >= self.min_distance_meters
+        return True
@@ -0,0 +1,102 @@
+"""
+Binary frames for publishing trip locations over the WebSocket.
+
+Connections opened with ``?encoding=binary`` may send location messages as
+binary frames laid out in network byte order as::
+
+    header : version (uint8) | message type (uint8) | point count (uint16)
+    point  : trip id length (uint8) | trip id (utf-8)
+             | latitude (float64) | longitude (float64)
+             | timestamp (float64, unix seconds, 0 means "server time")
+
+``PUBLISH_LOCATION`` frames carry exactly one point, ``PUBLISH_LOCATION_BATCH``
+frames carry one or more points for one or more trips.
+"""
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+FRAME_VERSION = 1
+PUBLISH_LOCATION = "PUBLISH_LOCATION"
+PUBLISH_LOCATION_BATCH = "PUBLISH_LOCATION_BATCH"
+
+MESSAGE_TYPE_CODES = {
+    PUBLISH_LOCATION: 1,
+    PUBLISH_LOCATION_BATCH: 2,
+}
+MESSAGE_TYPES = {code: message_type for message_type, code in MESSAGE_TYPE_CODES.items()}
+
+HEADER = struct.Struct("!BBH")
+TRIP_ID_LENGTH = struct.Struct("!B")
+COORDINATES = struct.Struct("!ddd")
+
+
+class FrameError(ValueError):
+    pass
+
+
+@dataclass
+class LocationPoint:
+    trip_id: str
+    latitude: float
+    longitude: float
+    timestamp: Optional[str] = None
+
+    def to_payload(self) -> dict:
+        return {
+            "trip_id": self.trip_id,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "timestamp": self.timestamp,
+        }
+
+
+def decode_frame(data: bytes) -> tuple[str, list[LocationPoint]]:
+    """Decode a binary frame into its message type and location points."""
+    if len(data) < HEADER.size:
+        raise FrameError("Frame is shorter than its header")
+
+    version, type_code, count = HEADER.unpack_from(data, 0)
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version: {version}")
+    message_type = MESSAGE_TYPES.get(type_code)
+    if message_type is None:
+        raise FrameError(f"Unknown message type code: {type_code}")
+    if count == 0 or (message_type == PUBLISH_LOCATION and count != 1):
+        raise FrameError(f"Invalid point count for {message_type}: {count}")
+
+    points = []
+    offset = HEADER.size
+    try:
+        for _ in range(count):
+            (trip_id_length,) = TRIP_ID_LENGTH.unpack_from(data, offset)
+            offset += TRIP_ID_LENGTH.size
+            trip_id = data[offset:offset + trip_id_length].decode("utf-8")
+            offset += trip_id_length
+            latitude, longitude, timestamp = COORDINATES.unpack_from(data, offset)
+            offset += COORDINATES.size
+            points.append(LocationPoint(
+                trip_id=trip_id,
+                latitude=latitude,
+                longitude=longitude,
+                timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat() if timestamp else None,
+            ))
+    except (struct.error, UnicodeDecodeError, OverflowError, OSError, ValueError) as e:
+        raise FrameError(f"Malformed frame: {e}") from e
+
+    if offset != len(data):
+        raise FrameError("Frame has trailing bytes")
+    return message_type, points
+
+
+def encode_frame(message_type: str, points: list[LocationPoint]) -> bytes:
+    """Encode location points into a binary frame; the inverse of ``decode_frame``."""
+    chunks = [HEADER.pack(FRAME_VERSION, MESSAGE_TYPE_CODES[message_type], len(points))]
+    for point in points:
+        trip_id = point.trip_id.encode("utf-8")
+        timestamp = datetime.fromisoformat(point.timestamp).timestamp() if point.timestamp else 0.0
+        chunks.append(TRIP_ID_LENGTH.pack(len(trip_id)))
+        chunks.append(trip_id)
+        chunks.append(COORDINATES.pack(point.latitude, point.longitude, timestamp))
+    return b"".join(chunks)
@@ -0,0 +1,83 @@
+import asyncio
+import statistics
+import time
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from common.kafka_producer import KafkaProducerService
+from location.broadcast import BROADCAST_STRATEGIES, broadcast_location, trip_room_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure publish-to-subscriber latency of the location broadcast strategies. "
+        "The kafka strategy needs consume_trip_locations to be running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strategy", choices=BROADCAST_STRATEGIES + ("both",), default="both")
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--trip-id", default="broadcast-benchmark")
+        parser.add_argument("--timeout", type=float, default=10, help="Seconds to wait for each update")
+
+    def handle(self, *args, **options):
+        strategies = BROADCAST_STRATEGIES if options["strategy"] == "both" else (options["strategy"],)
+        asyncio.run(self.run(strategies, options["messages"], options["trip_id"], options["timeout"]))
+
+    async def run(self, strategies, messages, trip_id, timeout):
+        try:
+            for strategy in strategies:
+                latencies = await self.measure(strategy, messages, trip_id, timeout)
+                self.report(strategy, latencies)
+        finally:
+            await KafkaProducerService.shutdown()
+
+    async def measure(self, strategy, messages, trip_id, timeout):
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+        room_name = trip_room_name(trip_id)
+        await channel_layer.group_add(room_name, channel_name)
+
+        latencies = []
+        try:
+            for sequence in range(messages):
+                location_data = {
+                    "trip_id": trip_id,
+                    "latitude": 6.5244,
+                    "longitude": 3.3792,
+                    "sequence": sequence,
+                }
+                started = time.perf_counter()
+                await broadcast_location(channel_layer, trip_id, location_data, strategy=strategy)
+                await self.wait_for(channel_layer, channel_name, sequence, timeout, strategy)
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            await channel_layer.group_discard(room_name, channel_name)
+        return latencies
+
+    @staticmethod
+    async def wait_for(channel_layer, channel_name, sequence, timeout, strategy):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise CommandError(f"Timed out waiting for update {sequence} over {strategy}")
+            try:
+                event = await asyncio.wait_for(channel_layer.receive(channel_name), remaining)
+            except asyncio.TimeoutError:
+                continue
+            if event["message"]["message"].get("sequence") == sequence:
+                return
+
+    def report(self, strategy, latencies):
+        ordered = sorted(latencies)
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{strategy}: n={len(ordered)} mean={statistics.mean(ordered):.2f}ms "
+            f"p50={percentile(0.50):.2f}ms p95={percentile(0.95):.2f}ms "
+            f"p99={percentile(0.99):.2f}ms max={ordered[-1]:.2f}ms"
+        ))
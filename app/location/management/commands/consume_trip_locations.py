@@ -1,5 +1,8 @@
+import argparse
 import asyncio
 import json
+import multiprocessing
+import time
 
 from aiokafka import AIOKafkaConsumer
 from channels.layers import get_channel_layer
@@ -10,34 +13,127 @@ from django.core.management.base import BaseCommand
 class Command(BaseCommand):
     help = "Consume trip location updates from Kafka and broadcast via channels"
 
-    def handle(self, *args, **kwargs):
-        asyncio.run(self.consume())
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Consumer tasks per process, all joined to the same consumer group"
+        )
+        parser.add_argument(
+            "--processes", type=int, default=1,
+            help="Worker processes to fork, each running --workers consumer tasks"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.LOCATION_BROADCAST_BATCH_SIZE,
+            help="Maximum number of records fetched per getmany() call"
+        )
+        parser.add_argument(
+            "--coalesce", action=argparse.BooleanOptionalAction, default=bool(settings.LOCATION_BROADCAST_COALESCE),
+            help="Only broadcast the newest update per trip room within each fetched batch "
+                 "(defaults to LOCATION_BROADCAST_COALESCE)"
+        )
+        parser.add_argument(
+            "--stats-interval", type=int, default=60,
+            help="Seconds between broadcast/coalescing statistics lines"
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.coalesce = options["coalesce"]
+        self.stats_interval = options["stats_interval"]
+        if options["processes"] <= 1:
+            self.run(options["workers"], options["batch_size"])
+            return
+
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=self.run, args=(options["workers"], options["batch_size"]))
+            for _ in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    def run(self, workers, batch_size):
+        self.received = 0
+        self.skipped = 0
+        self.coalesced = 0
+        asyncio.run(self.consume_all(workers, batch_size))
+
+    async def consume_all(self, workers, batch_size):
+        await asyncio.gather(*(self.consume(worker, batch_size) for worker in range(workers)))
 
-    async def consume(self):
+    async def consume(self, worker, batch_size):
         consumer = AIOKafkaConsumer(
-            'trip_location_updates',
+            settings.KAFKA_TRIP_LOCATION_TOPIC,
             bootstrap_servers=settings.KAFKA_BROKER_URL,
             group_id="trip_location_group",
             auto_offset_reset="earliest"
         )
         await consumer.start()
-        self.stdout.write(self.style.SUCCESS("Kafka consumer started"))
+        self.stdout.write(self.style.SUCCESS(f"Kafka consumer {worker} started"))
         channel_layer = get_channel_layer()
+        last_stats_at = time.monotonic()
 
         try:
-            async for msg in consumer:
-                value = json.loads(msg.value)
-                room_name = value.get('room_name')
-                message = value.get('message')
-                self.stdout.write(self.style.WARNING(f"Broadcast received: {message}"))
-                # Send to channels group
-                await channel_layer.group_send(
-                    room_name,
-                    {
-                        "type": "trip.location.update",
-                        "message": message
-                    }
-                )
+            while True:
+                batches = await consumer.getmany(timeout_ms=1000, max_records=batch_size)
+                # Partitions are broadcast concurrently; records of one partition (and
+                # so of one trip, since messages are keyed by trip id) stay in order.
+                await asyncio.gather(*(
+                    self.broadcast_partition(channel_layer, records)
+                    for records in batches.values()
+                ))
+
+                # Counters are per process, so only the first worker reports them.
+                if worker == 0 and time.monotonic() - last_stats_at >= self.stats_interval:
+                    last_stats_at = time.monotonic()
+                    self.write_stats()
         finally:
             await consumer.stop()
-            self.stdout.write(self.style.WARNING("Kafka consumer stopped"))
+            self.stdout.write(self.style.WARNING(f"Kafka consumer {worker} stopped"))
+
+    async def broadcast_partition(self, channel_layer, records):
+        values = [json.loads(record.value) for record in records]
+        self.received += len(values)
+        # Updates already delivered by the "direct" broadcast strategy are only
+        # kept on Kafka for persistence and analytics.
+        values = [value for value in values if not value.get('broadcast')]
+        self.skipped += len(records) - len(values)
+        if self.coalesce:
+            pending = len(values)
+            values = self.latest_per_room(values)
+            self.coalesced += pending - len(values)
+
+        for value in values:
+            room_name = value.get('room_name')
+            message = value.get('message')
+            if self.verbosity > 1:
+                self.stdout.write(self.style.WARNING(f"Broadcast received: {message}"))
+            # Send to channels group
+            await channel_layer.group_send(
+                room_name,
+                {
+                    "type": "trip.location.update",
+                    "message": message
+                }
+            )
+
+    @staticmethod
+    def latest_per_room(values):
+        """
+        Keep only the newest update of each room. Records arrive in partition
+        (offset) order, so the last one seen for a room is the newest.
+        """
+        latest = {}
+        for value in values:
+            room_name = value.get('room_name')
+            latest.pop(room_name, None)
+            latest[room_name] = value
+        return list(latest.values())
+
+    def write_stats(self):
+        self.stdout.write(
+            f"Broadcast stats: received={self.received} already_broadcast={self.skipped} "
+            f"coalesced={self.coalesced} broadcast={self.received - self.skipped - self.coalesced}"
+        )
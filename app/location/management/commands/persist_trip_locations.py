@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from aiokafka import AIOKafkaConsumer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class Command(BaseCommand):
+    help = "Consume trip location updates from Kafka and bulk-persist them to TripLocationHistory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.LOCATION_HISTORY_BATCH_SIZE,
+            help="Maximum number of records fetched and inserted per batch"
+        )
+        parser.add_argument(
+            "--flush-interval-ms", type=int, default=settings.LOCATION_HISTORY_FLUSH_INTERVAL_MS,
+            help="Maximum time to wait for a batch to fill before flushing"
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.consume(options["batch_size"], options["flush_interval_ms"]))
+
+    async def consume(self, batch_size, flush_interval_ms):
+        consumer = AIOKafkaConsumer(
+            settings.KAFKA_TRIP_LOCATION_TOPIC,
+            bootstrap_servers=settings.KAFKA_BROKER_URL,
+            group_id="trip_location_history_group",
+            auto_offset_reset="earliest",
+            enable_auto_commit=False,
+        )
+        await consumer.start()
+        self.stdout.write(self.style.SUCCESS("Kafka location history consumer started"))
+        persist = sync_to_async(self.persist, thread_sensitive=True)
+
+        try:
+            while True:
+                batches = await consumer.getmany(timeout_ms=flush_interval_ms, max_records=batch_size)
+                records = [record for partition_records in batches.values() for record in partition_records]
+                if not records:
+                    continue
+
+                rows = [row for row in map(self.to_history_row, records) if row]
+                saved = await persist(rows, batch_size)
+                # Offsets are only committed once the batch is safely in the database.
+                await consumer.commit()
+                self.stdout.write(f"Persisted {saved}/{len(records)} location updates")
+        finally:
+            await consumer.stop()
+            self.stdout.write(self.style.WARNING("Kafka location history consumer stopped"))
+
+    @staticmethod
+    def to_history_row(record):
+        try:
+            value = json.loads(record.value)
+            location = value["message"]["message"]
+            timestamp = parse_datetime(str(location.get("timestamp") or "")) or timezone.now()
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            return {
+                "trip_id": location["trip_id"],
+                "location": Point(float(location["longitude"]), float(location["latitude"]), srid=4326),
+                "timestamp": timestamp,
+            }
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def persist(rows, batch_size):
+        from trip.models import Trip, TripLocationHistory
+
+        close_old_connections()
+        # Drop updates for trips deleted since they were published so one stale
+        # row cannot fail the whole multi-row insert.
+        existing_trip_ids = set(
+            Trip.objects.filter(id__in={row["trip_id"] for row in rows}).values_list("id", flat=True)
+        )
+        history = [
+            TripLocationHistory(**row)
+            for row in rows
+            if row["trip_id"] in existing_trip_ids
+        ]
+        TripLocationHistory.objects.bulk_create(history, batch_size=batch_size)
+        return len(history)
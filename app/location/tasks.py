@@ -0,0 +1,8 @@
+from core.celery import APP
+
+from .current_location import flush_current_locations
+
+
+@APP.task()
+def flush_trip_current_locations():
+    return flush_current_locations()
@@ -1,3 +1,170 @@
-from django.test import TestCase
+import json
+import struct
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.gis.geos import GEOSGeometry, LineString, Point
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django_redis import get_redis_connection
+
+from location.current_location import (
+    CURRENT_LOCATION_KEY,
+    DIRTY_TRIPS_KEY,
+    flush_current_locations,
+    set_current_location,
+)
+from location.downsampling import LocationDownsampler
+from location.frames import (
+    PUBLISH_LOCATION,
+    PUBLISH_LOCATION_BATCH,
+    FrameError,
+    LocationPoint,
+    decode_frame,
+    encode_frame,
+)
+from trip.models import Trip
+
+
+class LocationFrameTest(SimpleTestCase):
+    def test_batch_frame_round_trip(self):
+        points = [
+            LocationPoint("trip-a", 6.5244, 3.3792, "2025-12-15T10:00:00+00:00"),
+            LocationPoint("trip-b", 6.431, 3.421, None),
+        ]
+        message_type, decoded = decode_frame(encode_frame(PUBLISH_LOCATION_BATCH, points))
+        self.assertEqual(message_type, PUBLISH_LOCATION_BATCH)
+        self.assertEqual(decoded, points)
+
+    def test_single_point_frame_rejects_many_points(self):
+        frame = encode_frame(PUBLISH_LOCATION, [LocationPoint("trip-a", 1.0, 2.0)] * 2)
+        with self.assertRaises(FrameError):
+            decode_frame(frame)
+
+    def test_truncated_frame_is_rejected(self):
+        frame = encode_frame(PUBLISH_LOCATION, [LocationPoint("trip-a", 1.0, 2.0)])
+        with self.assertRaises(FrameError):
+            decode_frame(frame[:-4])
+
+    def test_unknown_version_is_rejected(self):
+        with self.assertRaises(FrameError):
+            decode_frame(struct.pack("!BBH", 9, 1, 1))
+
+
+class LocationDownsamplerTest(SimpleTestCase):
+    def setUp(self):
+        self.downsampler = LocationDownsampler(
+            min_distance_meters=10, min_interval_seconds=1, max_silence_seconds=30
+        )
+        self.downsampler.accept("trip", 3.3792, 6.5244, "2025-12-15T10:00:00+00:00")
+
+    def test_drops_points_sent_too_often(self):
+        self.assertFalse(self.downsampler.accept("trip", 3.3800, 6.5244, "2025-12-15T10:00:00.500000+00:00"))
+
+    def test_drops_points_without_movement(self):
+        self.assertFalse(self.downsampler.accept("trip", 3.37921, 6.5244, "2025-12-15T10:00:05+00:00"))
+
+    def test_accepts_moving_points(self):
+        self.assertTrue(self.downsampler.accept("trip", 3.3800, 6.5244, "2025-12-15T10:00:05+00:00"))
+
+    def test_accepts_heartbeat_of_stationary_car(self):
+        self.assertTrue(self.downsampler.accept("trip", 3.3792, 6.5244, "2025-12-15T10:00:30+00:00"))
+        self.assertEqual(self.downsampler.dropped, 0)
+
+
+class ConsumeTripLocationsTest(SimpleTestCase):
+    def consume(self, values, *args, **options):
+        records = [SimpleNamespace(value=json.dumps(value)) for value in values]
+        channel_layer = mock.AsyncMock()
+
+        async def consume_all(command, workers, batch_size):
+            await command.broadcast_partition(channel_layer, records)
+
+        with mock.patch(
+            "location.management.commands.consume_trip_locations.Command.consume_all", consume_all
+        ):
+            call_command("consume_trip_locations", *args, verbosity=2, stdout=StringIO(), **options)
+        return channel_layer.group_send.await_args_list
+
+    def test_batch_is_broadcast_to_trip_rooms(self):
+        sent = self.consume([
+            {"room_name": "trip_a", "message": {"latitude": 1}},
+            {"room_name": "trip_b", "message": {"latitude": 2}},
+            {"room_name": "trip_a", "message": {"latitude": 3}, "broadcast": True},
+        ])
+        self.assertEqual(
+            [call.args for call in sent],
+            [
+                ("trip_a", {"type": "trip.location.update", "message": {"latitude": 1}}),
+                ("trip_b", {"type": "trip.location.update", "message": {"latitude": 2}}),
+            ],
+        )
+
+    def test_coalesced_batch_keeps_newest_update_per_room(self):
+        sent = self.consume([
+            {"room_name": "trip_a", "message": {"latitude": 1}},
+            {"room_name": "trip_a", "message": {"latitude": 3}},
+        ], coalesce=True)
+        self.assertEqual([call.args[1]["message"] for call in sent], [{"latitude": 3}])
+
+    @override_settings(LOCATION_BROADCAST_COALESCE=1)
+    def test_coalescing_can_be_turned_off_per_run(self):
+        values = [
+            {"room_name": "trip_a", "message": {"latitude": 1}},
+            {"room_name": "trip_a", "message": {"latitude": 3}},
+        ]
+        self.assertEqual(len(self.consume(values)), 1)
+        self.assertEqual(len(self.consume(values, "--no-coalesce")), 2)
+
+
+class CurrentLocationTest(TestCase):
+    def setUp(self):
+        self.redis = get_redis_connection("default")
+        self.redis.delete(DIRTY_TRIPS_KEY)
+        self.trip = Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            route_geometry_decoded=LineString([(3.3792, 6.5244), (3.421, 6.431)], srid=4326),
+            available_seats=3,
+        )
+        self.key = CURRENT_LOCATION_KEY.format(trip_id=self.trip.id)
+
+    def tearDown(self):
+        self.redis.delete(DIRTY_TRIPS_KEY, self.key)
+
+    def test_flush_writes_location_and_progress(self):
+        set_current_location(self.trip.id, 3.40, 6.48, "2025-12-15T10:00:00+00:00", progress=0.4)
+        self.assertEqual(flush_current_locations(), 1)
+        self.trip.refresh_from_db()
+        self.assertAlmostEqual(self.trip.current_location.x, 3.40)
+        self.assertAlmostEqual(self.trip.current_location.y, 6.48)
+        self.assertAlmostEqual(self.trip.route_progress_fraction, 0.4)
+
+        # Nothing is dirty after a flush, and a position without progress keeps the stored one
+        self.assertEqual(flush_current_locations(), 0)
+        set_current_location(self.trip.id, 3.41, 6.47, "2025-12-15T10:00:05+00:00")
+        flush_current_locations()
+        self.trip.refresh_from_db()
+        self.assertAlmostEqual(self.trip.current_location.x, 3.41)
+        self.assertAlmostEqual(self.trip.route_progress_fraction, 0.4)
+
+    def test_failed_flush_requeues_the_trips(self):
+        self.redis.set(self.key, json.dumps({"longitude": "east", "latitude": 6.48, "progress": None}))
+        self.redis.sadd(DIRTY_TRIPS_KEY, self.trip.id)
+        with self.assertRaises(DatabaseError):
+            flush_current_locations()
+        self.assertEqual(self.redis.smembers(DIRTY_TRIPS_KEY), {self.trip.id.encode()})
+
+        set_current_location(self.trip.id, 3.40, 6.48, "2025-12-15T10:00:00+00:00")
+        self.assertEqual(flush_current_locations(), 1)
+
+    def test_retrieve_prefers_the_redis_location(self):
+        set_current_location(self.trip.id, 3.40, 6.48, "2025-12-15T10:00:00+00:00")
+        response = self.client.get(f"/api/trips/{self.trip.id}/")
+        self.assertEqual(response.status_code, 200)
+        location = GEOSGeometry(str(response.data["current_location"]))
+        self.assertEqual((location.x, location.y), (3.40, 6.48))
+        self.trip.refresh_from_db()
+        self.assertIsNone(self.trip.current_location)
@@ -0,0 +1,77 @@
+import logging
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from common.lru_cache import TTLLRUCache
+from trip.enums import ACTIVE_TRIP_STATUSES
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_TRIPS_KEY = "active_trip_ids"
+
+
+class ActiveTripCache:
+    """
+    Answers "does this trip exist?" for the location stream without a database
+    round-trip. Lookups go to a per-process TTL/LRU first, then to a Redis set
+    of active trip ids shared by all workers, and only then to the database.
+
+    The Redis set is kept in sync by the Trip save/delete signals; other
+    processes drop their local entries after ``ACTIVE_TRIP_CACHE_TTL``. Trips
+    that exist but are not active (e.g. completed, or waiting for their route)
+    are only cached locally, so their location updates do not hit the database
+    either. ``QuerySet.update`` of ``trip_status`` bypasses the signals and
+    leaves the trip in the Redis set, which still answers correctly as long as
+    the trip exists.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.local = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+        self.redis_hits = 0
+        self.database_lookups = 0
+
+    def is_cached(self, trip_id) -> bool:
+        return bool(self.local.get(trip_id))
+
+    def exists(self, trip_id, check_local: bool = True) -> bool:
+        from trip.models import Trip
+
+        if check_local and self.is_cached(trip_id):
+            return True
+
+        if get_redis_connection("default").sismember(ACTIVE_TRIPS_KEY, trip_id):
+            self.redis_hits += 1
+            self.local.set(trip_id, True)
+            return True
+
+        self.database_lookups += 1
+        trip = Trip.objects.filter(id=trip_id).only("id", "trip_status").first()
+        if not trip:
+            return False
+        if trip.trip_status in ACTIVE_TRIP_STATUSES:
+            self.add(trip.id)
+        else:
+            self.local.set(trip_id, True)
+        return True
+
+    def add(self, trip_id):
+        get_redis_connection("default").sadd(ACTIVE_TRIPS_KEY, trip_id)
+        self.local.set(trip_id, True)
+
+    def discard(self, trip_id):
+        get_redis_connection("default").srem(ACTIVE_TRIPS_KEY, trip_id)
+        self.local.delete(trip_id)
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "redis_hits": self.redis_hits,
+            "database_lookups": self.database_lookups,
+        }
+
+
+active_trips = ActiveTripCache(
+    maxsize=settings.ACTIVE_TRIP_CACHE_SIZE,
+    ttl=settings.ACTIVE_TRIP_CACHE_TTL,
+)
@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class TripConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trip'
+
+    def ready(self):
+        from trip.models import Trip
+        from trip.signals import (
+            evict_deleted_trip,
+            evict_memory_route,
+            invalidate_match_results,
+            prune_route_cells,
+            reset_route_progress,
+            sync_active_trip,
+            sync_memory_route,
+        )
+
+        post_save.connect(sync_active_trip, sender=Trip)
+        post_delete.connect(evict_deleted_trip, sender=Trip)
+        post_save.connect(invalidate_match_results, sender=Trip)
+        post_delete.connect(invalidate_match_results, sender=Trip)
+        post_save.connect(sync_memory_route, sender=Trip)
+        post_delete.connect(evict_memory_route, sender=Trip)
+        post_save.connect(prune_route_cells, sender=Trip)
+        post_save.connect(reset_route_progress, sender=Trip)
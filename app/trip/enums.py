@@ -6,6 +6,11 @@ class TripStatus(CustomEnum):
     Ongoing = 'Ongoing'
     Failed = 'Failed'
     Initiated = 'Initiated'
+    # Saved before its route; see trip.pending_routes
+    RoutePending = 'RoutePending'
+
+
+ACTIVE_TRIP_STATUSES = (TripStatus.Initiated.value, TripStatus.Ongoing.value)
 
 
 def default_state():
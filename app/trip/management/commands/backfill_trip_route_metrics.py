@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from trip.enums import ACTIVE_TRIP_STATUSES
+from trip.models import Trip
+from trip.route_metrics import ROUTE_METRIC_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill denormalized route metrics (length, bbox, simplified geometry) on existing trips "
+        "and the corridor cells of active trips"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Recompute metrics and cells for every trip instead of only the trips missing them"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        trips = Trip.objects.filter(route_geometry_decoded__isnull=False)
+        if not options["all"]:
+            trips = trips.filter(route_length_meters__isnull=True)
+
+        updated = 0
+        batch = []
+        for trip in trips.only("id", "route_geometry_decoded").iterator(chunk_size=batch_size):
+            trip.set_route_metrics()
+            batch.append(trip)
+            if len(batch) >= batch_size:
+                updated += self.flush(batch)
+                batch = []
+        if batch:
+            updated += self.flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled route metrics for {updated} trips"))
+
+        # Cells depend on TRIP_MATCH_MAX_RADIUS_METERS; rerun with --all after changing it.
+        active_trips = Trip.objects.filter(route_geometry_decoded__isnull=False, trip_status__in=ACTIVE_TRIP_STATUSES)
+        if not options["all"]:
+            active_trips = active_trips.filter(route_cells__isnull=True)
+        celled = 0
+        for trip in active_trips.only("id", "route_geometry_decoded").iterator(chunk_size=batch_size):
+            trip.set_route_cells()
+            celled += 1
+        self.stdout.write(self.style.SUCCESS(f"Backfilled route cells for {celled} active trips"))
+
+    @staticmethod
+    def flush(trips):
+        Trip.objects.bulk_update(trips, ROUTE_METRIC_FIELDS)
+        return len(trips)
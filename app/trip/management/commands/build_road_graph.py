@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from integrations.location.graph import RoadGraph
+
+ONEWAY_FORWARD = {"yes", "true", "1"}
+ONEWAY_BACKWARD = {"-1", "reverse"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the road graph of the offline router (TRIP_ROUTING_PROVIDER=graph) from a GeoJSON road network "
+        "extract, e.g. OSM highways exported with `osmium export` or `ogr2ogr`"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="GeoJSON FeatureCollection of LineString/MultiLineString roads")
+        parser.add_argument("output", help="Graph file to write (.npz), used as ROAD_GRAPH_PATH")
+        parser.add_argument("--landmarks", type=int, default=8, help="Number of ALT landmarks to precompute")
+        parser.add_argument(
+            "--precision", type=int, default=7,
+            help="Decimal places of the coordinates under which road vertices are joined into one node"
+        )
+
+    def handle(self, *args, **options):
+        with open(options["source"]) as source:
+            features = json.load(source).get("features", [])
+
+        nodes = {}
+        sources, targets = [], []
+
+        def node_id(coordinate):
+            key = (round(coordinate[0], options["precision"]), round(coordinate[1], options["precision"]))
+            return nodes.setdefault(key, len(nodes))
+
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "LineString":
+                lines = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiLineString":
+                lines = geometry["coordinates"]
+            else:
+                continue
+            oneway = str((feature.get("properties") or {}).get("oneway", "no")).lower()
+            for line in lines:
+                ids = [node_id(coordinate) for coordinate in line]
+                for start, end in zip(ids, ids[1:]):
+                    if start == end:
+                        continue
+                    if oneway not in ONEWAY_BACKWARD:
+                        sources.append(start)
+                        targets.append(end)
+                    if oneway not in ONEWAY_FORWARD:
+                        sources.append(end)
+                        targets.append(start)
+
+        if not sources:
+            raise CommandError("No road segments found in the source file")
+
+        graph = RoadGraph.from_edges(list(nodes), sources, targets, landmark_count=options["landmarks"])
+        graph.save(options["output"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Road graph with {len(graph)} nodes, {len(graph.targets)} edges and "
+            f"{len(graph.landmarks)} landmarks written to {options['output']}"
+        ))
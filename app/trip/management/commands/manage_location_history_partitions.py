@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from trip.partitions import maintain_partitions
+
+
+class Command(BaseCommand):
+    help = "Pre-create upcoming TripLocationHistory partitions and expire those past retention"
+
+    def handle(self, *args, **options):
+        result = maintain_partitions()
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(result['created'])} partitions, expired {len(result['expired'])} partitions"
+        ))
+        for name in result["created"]:
+            self.stdout.write(f"  + {name}")
+        for name in result["expired"]:
+            self.stdout.write(self.style.WARNING(f"  - {name}"))
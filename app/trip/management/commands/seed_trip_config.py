@@ -11,6 +11,13 @@ class Command(BaseCommand):
         radius_meters = 500
         speed_kmh = 30
         speed_mps = speed_kmh * 1000 / 3600
+        location_min_distance_meters = 10
+        location_min_interval_seconds = 1
+        location_max_silence_seconds = 30
+        match_pickup_distance_weight = 1
+        match_drop_off_distance_weight = 0
+        match_eta_weight = 0
+        match_seat_fit_weight = 0
 
         settings_obj, created = TripSettingsConfig.objects.get_or_create(
             is_active=True,
@@ -18,6 +25,13 @@ class Command(BaseCommand):
                 'radius': radius_meters,
                 'speed': speed_kmh,
                 'speed_mps': speed_mps,
+                'location_min_distance_meters': location_min_distance_meters,
+                'location_min_interval_seconds': location_min_interval_seconds,
+                'location_max_silence_seconds': location_max_silence_seconds,
+                'match_pickup_distance_weight': match_pickup_distance_weight,
+                'match_drop_off_distance_weight': match_drop_off_distance_weight,
+                'match_eta_weight': match_eta_weight,
+                'match_seat_fit_weight': match_seat_fit_weight,
                 'is_active': True
             }
         )
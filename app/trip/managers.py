@@ -0,0 +1,40 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from trip.enums import ACTIVE_TRIP_STATUSES
+
+# Predicate of the partial indexes on Trip; queries must imply it to use them.
+MATCHABLE_TRIP_CONDITION = Q(
+    trip_status__in=ACTIVE_TRIP_STATUSES,
+    is_ride_requests_allowed=True,
+    available_seats__gt=0,
+)
+
+
+def matchable_trip_window(at: datetime = None) -> tuple[datetime, datetime]:
+    """
+    Half-open ``[start, end)`` range covering the local day (``TIME_ZONE``) of
+    ``at``, as aware datetimes comparable directly against ``date_added``.
+    """
+    day = timezone.localtime(at).date()
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+class TripQuerySet(models.QuerySet):
+    def matchable(self, seats: int = 1, at: datetime = None):
+        """
+        Trips created today that riders can still join. Written as plain column
+        comparisons so it is served by the partial indexes on Trip.
+        """
+        start, end = matchable_trip_window(at)
+        return self.filter(
+            MATCHABLE_TRIP_CONDITION,
+            available_seats__gte=seats,
+            date_added__gte=start,
+            date_added__lt=end,
+        )
@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from common.geo import geohash_cell_size_meters, geohash_encode
+
+logger = logging.getLogger(__name__)
+
+MATCH_VERSION_KEY = "trip_match_version"
+MATCH_RESULT_KEY = "trip_match:{version}:{day}:{pickup}:{drop_off}:{seats}:{radius}"
+
+# Trip columns that can change the outcome of a match; saves limited to
+# other columns (e.g. route metrics) leave cached results valid.
+MATCH_FIELDS = frozenset({
+    "starting_location",
+    "destination_location",
+    "route_geometry_decoded",
+    "available_seats",
+    "is_ride_requests_allowed",
+    "trip_status",
+    "date_added",
+})
+
+
+class MatchResultCache:
+    """
+    Shares the candidate trip ids of a ``/matches`` query between riders asking
+    from the same geohash cells. Keys carry a version counter that is bumped on
+    every change to a trip that may affect matching, so a trip being created,
+    filled up or closed invalidates all cached results at once; ``ttl`` bounds
+    how long a result can be served otherwise.
+
+    Cached ids are the trips within the radius padded by the cell diagonal,
+    without the direction and progress filters, so they are a superset of the
+    matches of any point in the cell; exact distances and the final filtering
+    are recomputed for the requesting rider.
+    """
+
+    def __init__(self, ttl: int, precision: int):
+        self.ttl = ttl
+        self.precision = precision
+        self.padding_meters = geohash_cell_size_meters(precision)
+        self.hits = 0
+        self.misses = 0
+        self.hit_age_total = 0.0
+        self.hit_age_max = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def version(self) -> int:
+        return int(get_redis_connection("default").get(MATCH_VERSION_KEY) or 0)
+
+    def bump_version(self) -> int:
+        return get_redis_connection("default").incr(MATCH_VERSION_KEY)
+
+    def key(self, pickup, drop_off, seats: int, radius: int) -> str:
+        return MATCH_RESULT_KEY.format(
+            version=self.version(),
+            # Matchable trips are limited to the local day, see TripQuerySet.matchable
+            day=timezone.localdate().isoformat(),
+            pickup=geohash_encode(pickup.x, pickup.y, self.precision),
+            drop_off=geohash_encode(drop_off.x, drop_off.y, self.precision),
+            seats=seats,
+            radius=radius,
+        )
+
+    def get(self, key: str) -> Optional[list]:
+        value = get_redis_connection("default").get(key)
+        if not value:
+            self.misses += 1
+            return None
+
+        entry = json.loads(value)
+        age = time.time() - entry["cached_at"]
+        self.hits += 1
+        self.hit_age_total += age
+        self.hit_age_max = max(self.hit_age_max, age)
+        return entry["trip_ids"]
+
+    def set(self, key: str, trip_ids: list):
+        get_redis_connection("default").set(
+            key,
+            json.dumps({"trip_ids": [str(trip_id) for trip_id in trip_ids], "cached_at": time.time()}),
+            ex=self.ttl,
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "average_hit_age_seconds": self.hit_age_total / self.hits if self.hits else 0.0,
+            "max_hit_age_seconds": self.hit_age_max,
+            "version": self.version(),
+        }
+
+
+match_results = MatchResultCache(
+    ttl=settings.TRIP_MATCH_CACHE_TTL,
+    precision=settings.TRIP_MATCH_CACHE_GEOHASH_PRECISION,
+)
@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+
+
+@dataclass(frozen=True)
+class MatchScoreWeights:
+    """
+    Weights of the match score, lower is better:
+
+        pickup_distance * pickup distance (m) + drop_off_distance * drop-off distance (m)
+        + eta * eta_minutes + seat_fit * seats left over after the rider joins
+    """
+    pickup_distance: float = 1.0
+    drop_off_distance: float = 0.0
+    eta: float = 0.0
+    seat_fit: float = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> "MatchScoreWeights":
+        if not config:
+            return cls()
+        return cls(
+            pickup_distance=float(config.match_pickup_distance_weight or 0),
+            drop_off_distance=float(config.match_drop_off_distance_weight or 0),
+            eta=float(config.match_eta_weight or 0),
+            seat_fit=float(config.match_seat_fit_weight or 0),
+        )
+
+    def expression(self, seats: int) -> ExpressionWrapper:
+        """The score over the annotations of ``TripRouteMatch.match``."""
+        return ExpressionWrapper(
+            F("pickup_distance_meters") * Value(self.pickup_distance)
+            + F("drop_off_distance_meters") * Value(self.drop_off_distance)
+            + F("eta_minutes") * Value(self.eta)
+            + (F("available_seats") - Value(seats)) * Value(self.seat_fit),
+            output_field=FloatField(),
+        )
+
+    def score(self, pickup_distance: float, drop_off_distance: float, eta: float, spare_seats: int) -> float:
+        return (
+            pickup_distance * self.pickup_distance
+            + drop_off_distance * self.drop_off_distance
+            + eta * self.eta
+            + spare_seats * self.seat_fit
+        )
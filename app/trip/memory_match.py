@@ -0,0 +1,327 @@
+"""
+In-process matching backend for ``TRIP_MATCH_ENGINE = "memory"``.
+
+Every matchable route is held as a NumPy coordinate array, and the envelopes
+of all route segments are packed into one ``PackedRTree``. A match query reads
+candidate routes from the tree and computes the distances and line fractions of
+``TripRouteMatch.match`` in NumPy, without a database round-trip.
+
+The index is loaded at worker startup. Trip saves in the same process update it
+through signals. A background thread picks up changes from other processes
+whenever the match version of ``trip.match_cache`` moves.
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from common.geo import METERS_PER_DEGREE, line_length_meters, meters_to_degrees
+from common.spatial_index import PackedRTree
+from location.current_location import get_route_progress
+from trip.enums import ACTIVE_TRIP_STATUSES
+from trip.managers import matchable_trip_window
+from trip.match_cache import match_results
+from trip.match_score import MatchScoreWeights
+
+logger = logging.getLogger(__name__)
+
+POSTGIS = "postgis"
+MEMORY = "memory"
+MATCH_ENGINES = (POSTGIS, MEMORY)
+
+ROUTE_FIELDS = (
+    "id", "starting_location", "destination_location", "route_geometry_decoded",
+    "route_length_meters", "route_progress_fraction", "available_seats", "is_ride_requests_allowed",
+    "trip_status", "date_added",
+)
+
+
+@dataclass
+class MatchedTrip:
+    """A matched trip carrying the same attributes as a row of ``TripRouteMatch.match``."""
+    id: str
+    starting_location: Point
+    destination_location: Point
+    available_seats: int
+    pickup_distance_meters: float
+    drop_off_distance_meters: float
+    pickup_fraction: float
+    drop_off_fraction: float
+    rider_trip_distance_meters: float
+    eta_minutes: float
+    score: float
+
+
+@dataclass
+class IndexedRoute:
+    id: str
+    starting_location: Point
+    destination_location: Point
+    available_seats: int
+    date_added: datetime
+    coordinates: np.ndarray
+    length_meters: float
+    progress: float = 0.0
+
+    @classmethod
+    def from_trip(cls, trip) -> "IndexedRoute":
+        coordinates = np.asarray(trip.route_geometry_decoded.coords, dtype=float)
+        return cls(
+            id=trip.id,
+            starting_location=trip.starting_location,
+            destination_location=trip.destination_location,
+            available_seats=trip.available_seats,
+            date_added=trip.date_added,
+            coordinates=coordinates,
+            length_meters=trip.route_length_meters or line_length_meters(coordinates.tolist()),
+            progress=trip.route_progress_fraction or 0.0,
+        )
+
+    @property
+    def segment_boxes(self) -> np.ndarray:
+        start, end = self.coordinates[:-1], self.coordinates[1:]
+        return np.column_stack([np.minimum(start, end), np.maximum(start, end)])
+
+    @staticmethod
+    def closest_on_segments(points: np.ndarray, x: float, y: float, scale_x: float, scale_y: float):
+        """Per segment: distance from (x, y) to the segment and position of the closest point."""
+        start = (points[:-1] - (x, y)) * (scale_x, scale_y)
+        delta = (points[1:] - points[:-1]) * (scale_x, scale_y)
+        squared_length = np.einsum("ij,ij->i", delta, delta)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            position = np.clip(-np.einsum("ij,ij->i", start, delta) / squared_length, 0.0, 1.0)
+        position = np.nan_to_num(position)
+        closest = start + delta * position[:, None]
+        return np.hypot(closest[:, 0], closest[:, 1]), position, np.sqrt(squared_length)
+
+    def distance_meters(self, point: Point) -> float:
+        """Distance to the route in a local equirectangular projection around ``point``."""
+        distances, _, _ = self.closest_on_segments(
+            self.coordinates, point.x, point.y,
+            METERS_PER_DEGREE * math.cos(math.radians(point.y)), METERS_PER_DEGREE,
+        )
+        return float(distances.min())
+
+    def locate(self, point: Point) -> float:
+        """Fraction of the route closest to ``point``, measured like ``ST_LineLocatePoint``."""
+        distances, position, lengths = self.closest_on_segments(self.coordinates, point.x, point.y, 1.0, 1.0)
+        total = lengths.sum()
+        if not total:
+            return 0.0
+        segment = int(distances.argmin())
+        return float((lengths[:segment].sum() + position[segment] * lengths[segment]) / total)
+
+
+class MemoryRouteIndex:
+    """
+    Matchable routes of the current day held in process memory.
+
+    Routes added or changed since the tree was packed are kept in ``pending``
+    and scanned directly; the tree is repacked once ``rebuild_threshold`` routes
+    are pending or stale. Candidates are always checked against the current
+    ``routes`` entry, so stale tree entries never produce a match.
+    """
+
+    def __init__(self, rebuild_threshold: int, sync_seconds: int):
+        self.rebuild_threshold = rebuild_threshold
+        self.sync_seconds = sync_seconds
+        self.lock = threading.RLock()
+        self.routes: dict[str, IndexedRoute] = {}
+        self.tree = PackedRTree(np.empty((0, 4)))
+        self.tree_routes: list[IndexedRoute] = []
+        self.segment_routes = np.empty(0, dtype=int)
+        self.pending: set = set()
+        self.stale = 0
+        self.built = False
+        self.version = None
+        self.synced_at = None
+        self.sync_thread = None
+
+    @staticmethod
+    def is_matchable(trip) -> bool:
+        return (
+            trip.trip_status in ACTIVE_TRIP_STATUSES
+            and trip.is_ride_requests_allowed
+            and trip.available_seats > 0
+            and trip.route_geometry_decoded is not None
+            and len(trip.route_geometry_decoded) > 1
+        )
+
+    def build(self):
+        from trip.models import Trip
+
+        version = match_results.version()
+        started_at = timezone.now()
+        trips = Trip.objects.matchable(seats=1).only(*ROUTE_FIELDS)
+        routes = {trip.id: IndexedRoute.from_trip(trip) for trip in trips if self.is_matchable(trip)}
+        with self.lock:
+            self.routes = routes
+            self.repack()
+            self.built = True
+            self.version = version
+            self.synced_at = started_at
+        logger.info(f"Loaded {len(routes)} routes into the memory match index")
+
+    def repack(self):
+        self.tree_routes = list(self.routes.values())
+        boxes = [route.segment_boxes for route in self.tree_routes]
+        self.segment_routes = np.repeat(np.arange(len(boxes)), [len(box) for box in boxes])
+        self.tree = PackedRTree(np.concatenate(boxes) if boxes else np.empty((0, 4)))
+        self.pending = set()
+        self.stale = 0
+
+    def upsert(self, trip):
+        if not self.built:
+            return
+        if not self.is_matchable(trip):
+            self.remove(trip.id)
+            return
+        route = IndexedRoute.from_trip(trip)
+        with self.lock:
+            if trip.id in self.routes and trip.id not in self.pending:
+                self.stale += 1
+            self.routes[trip.id] = route
+            self.pending.add(trip.id)
+            self.repack_if_needed()
+
+    def remove(self, trip_id):
+        if not self.built:
+            return
+        with self.lock:
+            if self.routes.pop(trip_id, None) is not None and trip_id not in self.pending:
+                self.stale += 1
+            self.pending.discard(trip_id)
+            self.repack_if_needed()
+
+    def repack_if_needed(self):
+        if len(self.pending) + self.stale >= self.rebuild_threshold:
+            self.repack()
+
+    def sync(self):
+        """Reload routes changed by other processes since the previous sync."""
+        from trip.models import Trip
+
+        version = match_results.version()
+        if not self.built or version == self.version:
+            return
+
+        started_at = timezone.now()
+        trips = Trip.objects.matchable(seats=1)
+        matchable_ids = set(trips.values_list("id", flat=True))
+        with self.lock:
+            missing = matchable_ids - self.routes.keys()
+        # Overlap with the previous sync so saves racing it are not missed.
+        changed = trips.filter(
+            Q(id__in=missing) | Q(date_last_updated__gte=self.synced_at - timedelta(seconds=self.sync_seconds))
+        ).only(*ROUTE_FIELDS)
+
+        with self.lock:
+            for trip_id in self.routes.keys() - matchable_ids:
+                self.remove(trip_id)
+            for trip in changed:
+                self.upsert(trip)
+            self.version = version
+            self.synced_at = started_at
+
+    def run_sync(self):
+        while True:
+            time.sleep(self.sync_seconds)
+            try:
+                close_old_connections()
+                self.sync()
+            except Exception:
+                logger.exception("Memory match index sync failed")
+
+    def start(self):
+        """Load the index and keep it in sync from a daemon thread; safe to call repeatedly."""
+        with self.lock:
+            if self.built:
+                return
+            self.build()
+            self.sync_thread = threading.Thread(target=self.run_sync, name="memory-match-sync", daemon=True)
+            self.sync_thread.start()
+
+    async def startup(self):
+        if settings.TRIP_MATCH_ENGINE != MEMORY:
+            return
+        try:
+            await sync_to_async(self.start, thread_sensitive=False)()
+        except Exception as e:
+            # The index is retried lazily on the first match.
+            logger.exception(f"Unable to load the memory match index: {e}")
+
+    def candidates(self, point: Point, radius: float) -> set:
+        delta_x, delta_y = meters_to_degrees(radius, point.y)
+        box = (point.x - delta_x, point.y - delta_y, point.x + delta_x, point.y + delta_y)
+
+        found = {self.tree_routes[slot].id for slot in self.segment_routes[self.tree.query(*box)]}
+        for trip_id in self.pending:
+            if PackedRTree.intersecting(self.routes[trip_id].segment_boxes, *box).any():
+                found.add(trip_id)
+        return found
+
+    def match(self, pickup: Point, drop_off: Point, seats: int, radius: float, speed_mps: float,
+              weights: MatchScoreWeights, at: Optional[datetime] = None) -> list[MatchedTrip]:
+        """Same rows, in the same order, as the PostGIS path of ``MatchingTripsSerializer``."""
+        start, end = matchable_trip_window(at)
+        with self.lock:
+            trip_ids = self.candidates(pickup, radius) & self.candidates(drop_off, radius)
+            routes = [self.routes[trip_id] for trip_id in trip_ids if trip_id in self.routes]
+        # Live progress from the location stream, fresher than the flushed column
+        progress = get_route_progress(route.id for route in routes)
+
+        matches = []
+        for route in routes:
+            if route.available_seats < seats or not start <= route.date_added < end:
+                continue
+            pickup_distance = route.distance_meters(pickup)
+            drop_off_distance = route.distance_meters(drop_off)
+            if pickup_distance > radius or drop_off_distance > radius:
+                continue
+            pickup_fraction = route.locate(pickup)
+            drop_off_fraction = route.locate(drop_off)
+            route_progress = progress.get(route.id, route.progress)
+            if drop_off_fraction <= pickup_fraction or pickup_fraction < route_progress:
+                continue
+            eta = (pickup_fraction - route_progress) * route.length_meters / speed_mps / 60
+            matches.append(MatchedTrip(
+                id=route.id,
+                starting_location=route.starting_location,
+                destination_location=route.destination_location,
+                available_seats=route.available_seats,
+                pickup_distance_meters=pickup_distance,
+                drop_off_distance_meters=drop_off_distance,
+                pickup_fraction=pickup_fraction,
+                drop_off_fraction=drop_off_fraction,
+                rider_trip_distance_meters=(drop_off_fraction - pickup_fraction) * route.length_meters,
+                eta_minutes=eta,
+                score=weights.score(pickup_distance, drop_off_distance, eta, route.available_seats - seats),
+            ))
+        return sorted(matches, key=lambda match: (match.score, match.id))
+
+    def stats(self) -> dict:
+        return {
+            "built": self.built,
+            "routes": len(self.routes),
+            "segments": len(self.tree),
+            "pending": len(self.pending),
+            "stale": self.stale,
+            "version": self.version,
+        }
+
+
+memory_routes = MemoryRouteIndex(
+    rebuild_threshold=settings.TRIP_MATCH_MEMORY_REBUILD_THRESHOLD,
+    sync_seconds=settings.TRIP_MATCH_MEMORY_SYNC_SECONDS,
+)
@@ -0,0 +1,126 @@
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# TripLocationHistory becomes a PostgreSQL table range-partitioned by day on
+# "timestamp". Partitions are maintained by trip.partitions; the default
+# partition only catches rows outside the pre-created range. Partitions start
+# at the retention cutoff: older legacy rows are dropped, or kept in the
+# unattached trip_triplocationhistory_archive table when expired partitions
+# are not dropped either.
+CUTOFF_SQL = (
+    f"((now() AT TIME ZONE 'UTC')::date - {settings.LOCATION_HISTORY_RETENTION_DAYS})::timestamp AT TIME ZONE 'UTC'"
+)
+
+ARCHIVE_SQL = "" if settings.LOCATION_HISTORY_DROP_EXPIRED_PARTITIONS else f"""
+CREATE TABLE trip_triplocationhistory_archive AS
+SELECT id, location, "timestamp", trip_id FROM trip_triplocationhistory_legacy
+WHERE "timestamp" < {CUTOFF_SQL};
+"""
+
+PARTITION_SQL = f"""
+ALTER TABLE trip_triplocationhistory RENAME TO trip_triplocationhistory_legacy;
+
+CREATE SEQUENCE trip_triplocationhistory_part_id_seq AS bigint;
+
+CREATE TABLE trip_triplocationhistory (
+    id bigint NOT NULL DEFAULT nextval('trip_triplocationhistory_part_id_seq'),
+    location geography(POINT, 4326) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    trip_id varchar(50) NOT NULL REFERENCES trip_trip (id) DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+
+ALTER SEQUENCE trip_triplocationhistory_part_id_seq OWNED BY trip_triplocationhistory.id;
+
+CREATE TABLE trip_triplocationhistory_default PARTITION OF trip_triplocationhistory DEFAULT;
+
+DO $$
+DECLARE
+    day date := (now() AT TIME ZONE 'UTC')::date - {settings.LOCATION_HISTORY_RETENTION_DAYS};
+    last_day date := (now() AT TIME ZONE 'UTC')::date + {settings.LOCATION_HISTORY_PREMAKE_DAYS};
+BEGIN
+    WHILE day <= last_day LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF trip_triplocationhistory FOR VALUES FROM (%L) TO (%L)',
+            'trip_triplocationhistory_p' || to_char(day, 'YYYYMMDD'),
+            day::timestamp AT TIME ZONE 'UTC',
+            (day + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+        day := day + 1;
+    END LOOP;
+END $$;
+
+INSERT INTO trip_triplocationhistory (id, location, "timestamp", trip_id)
+SELECT id, location, "timestamp", trip_id FROM trip_triplocationhistory_legacy
+WHERE "timestamp" >= {CUTOFF_SQL};
+{ARCHIVE_SQL}
+SELECT setval(
+    'trip_triplocationhistory_part_id_seq',
+    COALESCE((SELECT MAX(id) FROM trip_triplocationhistory_legacy), 0) + 1,
+    false
+);
+
+DROP TABLE trip_triplocationhistory_legacy;
+"""
+
+UNPARTITION_SQL = """
+ALTER TABLE trip_triplocationhistory RENAME TO trip_triplocationhistory_partitioned;
+
+CREATE TABLE trip_triplocationhistory (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    location geography(POINT, 4326) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    trip_id varchar(50) NOT NULL REFERENCES trip_trip (id) DEFERRABLE INITIALLY DEFERRED
+);
+
+INSERT INTO trip_triplocationhistory (id, location, "timestamp", trip_id)
+SELECT id, location, "timestamp", trip_id FROM trip_triplocationhistory_partitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('trip_triplocationhistory', 'id'),
+    COALESCE((SELECT MAX(id) FROM trip_triplocationhistory), 0) + 1,
+    false
+);
+
+CREATE INDEX trip_triplocationhistory_trip_id_4cad885a ON trip_triplocationhistory (trip_id);
+CREATE INDEX trip_triplocationhistory_trip_id_4cad885a_like ON trip_triplocationhistory (trip_id varchar_pattern_ops);
+
+DROP TABLE trip_triplocationhistory_partitioned CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(sql=PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+            ],
+            state_operations=[
+                migrations.AlterModelOptions(
+                    name='triplocationhistory',
+                    options={},
+                ),
+                migrations.AlterField(
+                    model_name='triplocationhistory',
+                    name='trip',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                            related_name='location_history', to='trip.trip'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='triplocationhistory',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='trip_history_ts_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='triplocationhistory',
+            index=models.Index(fields=['trip', 'timestamp'], name='trip_history_trip_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0002_partition_triplocationhistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='location_max_silence_seconds',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text='Accept a location point after this long even if the car has not moved (0 disables)', max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='location_min_distance_meters',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text='Drop location points closer than this to the last accepted point (0 disables)', max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='location_min_interval_seconds',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text='Drop location points sooner than this after the last accepted point (0 disables)', max_digits=20),
+        ),
+    ]
@@ -0,0 +1,20 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0003_tripsettingsconfig_location_downsampling'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('trip_status__in', ('Initiated', 'Ongoing')), ('is_ride_requests_allowed', True), ('available_seats__gt', 0)), fields=['route_geometry_decoded'], name='trip_matchable_route_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('trip_status__in', ('Initiated', 'Ongoing')), ('is_ride_requests_allowed', True), ('available_seats__gt', 0)), fields=['date_added'], include=('available_seats',), name='trip_matchable_date_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0004_trip_matchable_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_bbox',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, help_text='Bounding box of the route', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_end_geohash',
+            field=models.CharField(blank=True, help_text='Geohash cell of the route end', max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_geometry_simplified',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, geography=True, help_text='Simplified route geometry', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_length_meters',
+            field=models.FloatField(blank=True, help_text='Geodesic length of the route in meters', null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_start_geohash',
+            field=models.CharField(blank=True, help_text='Geohash cell of the route start', max_length=12, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0005_trip_route_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripRouteCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=12)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_cells', to='trip.trip')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cell', 'trip'), name='trip_route_cell_unique')],
+            },
+        ),
+    ]
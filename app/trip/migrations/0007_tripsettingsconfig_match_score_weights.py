@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0006_triproutecell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='match_drop_off_distance_weight',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text="Match score weight per meter between the rider's drop-off and the route", max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='match_eta_weight',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text='Match score weight per unit of ETA to the pickup', max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='match_pickup_distance_weight',
+            field=models.DecimalField(decimal_places=5, default=1.0, help_text="Match score weight per meter between the rider's pickup and the route", max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='tripsettingsconfig',
+            name='match_seat_fit_weight',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text='Match score weight per seat left free after the rider joins', max_digits=20),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0007_tripsettingsconfig_match_score_weights'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_progress_fraction',
+            field=models.FloatField(default=0.0, help_text='Fraction of the route already driven, from the live location stream'),
+        ),
+        migrations.AlterField(
+            model_name='tripsettingsconfig',
+            name='match_eta_weight',
+            field=models.DecimalField(decimal_places=5, default=0.0, help_text='Match score weight per minute of ETA to the pickup', max_digits=20),
+        ),
+    ]
@@ -0,0 +1,22 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0008_trip_route_progress_fraction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trip',
+            name='route_geometry_decoded',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, geography=True, help_text='Route geometry as a LineString, empty while the route is pending', null=True, srid=4326),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='trip_status',
+            field=models.CharField(choices=[('Completed', 'Completed'), ('Ongoing', 'Ongoing'), ('Failed', 'Failed'), ('Initiated', 'Initiated'), ('RoutePending', 'RoutePending')], default='Initiated'),
+        ),
+    ]
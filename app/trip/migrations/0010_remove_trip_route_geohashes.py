@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0009_trip_route_pending'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='trip',
+            name='route_end_geohash',
+        ),
+        migrations.RemoveField(
+            model_name='trip',
+            name='route_start_geohash',
+        ),
+    ]
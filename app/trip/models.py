@@ -1,11 +1,16 @@
 from django.contrib.gis.db import models as gis_models
 from django.contrib.postgres.fields import ArrayField
-from django.contrib.postgres.indexes import GistIndex
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex, GistIndex
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import DEFERRED
 from django.utils import timezone
 
 from common.models import AuditableModel
-from trip.enums import TripStatus, default_state
+from trip.enums import ACTIVE_TRIP_STATUSES, TripStatus, default_state
+from trip.managers import MATCHABLE_TRIP_CONDITION, TripQuerySet
+from trip.route_cells import compute_route_cells
+from trip.route_metrics import ROUTE_METRIC_FIELDS, compute_route_metrics
 
 
 class ClientSubscribedTrip(AuditableModel):
@@ -41,7 +46,8 @@ class Trip(AuditableModel):
         null=True
     )
     route_geometry_decoded = gis_models.LineStringField(
-        geography=True, help_text="Route geometry as a LineString"
+        geography=True, null=True, blank=True,
+        help_text="Route geometry as a LineString, empty while the route is pending"
     )
 
     available_seats = models.PositiveSmallIntegerField(help_text="Number of seats available for riders")
@@ -56,16 +62,100 @@ class Trip(AuditableModel):
     distance = models.DecimalField(decimal_places=5, max_digits=20, default=0.0)
     duration = models.CharField(max_length=255, null=True, blank=True)
 
+    # Denormalized from route_geometry_decoded on save, see trip.route_metrics
+    route_length_meters = models.FloatField(
+        null=True, blank=True, help_text="Geodesic length of the route in meters"
+    )
+    route_bbox = gis_models.PolygonField(
+        null=True, blank=True, help_text="Bounding box of the route"
+    )
+    route_geometry_simplified = gis_models.LineStringField(
+        geography=True, null=True, blank=True, help_text="Simplified route geometry"
+    )
+    route_progress_fraction = models.FloatField(
+        default=0.0, help_text="Fraction of the route already driven, from the live location stream"
+    )
+
+    objects = TripQuerySet.as_manager()
+
     class Meta:
         indexes = [
             GistIndex(fields=["starting_location"]),
             GistIndex(fields=["destination_location"]),
             GistIndex(fields=["route_geometry_decoded"]),
+            # Only the small live subset of trips riders can join
+            GistIndex(
+                fields=["route_geometry_decoded"], name="trip_matchable_route_gist",
+                condition=MATCHABLE_TRIP_CONDITION,
+            ),
+            models.Index(
+                fields=["date_added"], include=["available_seats"], name="trip_matchable_date_idx",
+                condition=MATCHABLE_TRIP_CONDITION,
+            ),
         ]
 
     def __str__(self):
         return f"Trip {self.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save() tell a reroute or a reactivation apart from any other save
+        instance._loaded_route = instance.__dict__.get("route_geometry_decoded", DEFERRED)
+        instance._loaded_status = instance.__dict__.get("trip_status", DEFERRED)
+        return instance
+
+    def route_changed(self, update_fields=None) -> bool:
+        if not self.route_geometry_decoded:
+            return False
+        if update_fields is not None and "route_geometry_decoded" not in update_fields:
+            return False
+        loaded = getattr(self, "_loaded_route", None)
+        return loaded is None or loaded is DEFERRED or loaded != self.route_geometry_decoded
+
+    def status_activated(self, update_fields=None) -> bool:
+        if update_fields is not None and "trip_status" not in update_fields:
+            return False
+        loaded = getattr(self, "_loaded_status", None)
+        return (
+            loaded not in (None, DEFERRED)
+            and loaded not in ACTIVE_TRIP_STATUSES
+            and self.trip_status in ACTIVE_TRIP_STATUSES
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        route_changed = self.route_changed(update_fields)
+        # Read by the post_save signal that resets the live progress of a reroute
+        self._rerouted = route_changed and not self._state.adding
+        # Cells are pruned while a trip is inactive, e.g. waiting for its route
+        rebuild_cells = route_changed or (bool(self.route_geometry_decoded) and self.status_activated(update_fields))
+        if route_changed:
+            self.set_route_metrics()
+            # A new route starts from where the car is now
+            self.route_progress_fraction = 0.0
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | set(ROUTE_METRIC_FIELDS) | {"route_progress_fraction"}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if rebuild_cells and self.trip_status in ACTIVE_TRIP_STATUSES:
+                self.set_route_cells()
+        self._loaded_route = self.route_geometry_decoded
+        self._loaded_status = self.trip_status
+
+    def set_route_metrics(self):
+        for field, value in compute_route_metrics(self.route_geometry_decoded).items():
+            setattr(self, field, value)
+
+    def set_route_cells(self):
+        cells = compute_route_cells(
+            self.route_geometry_decoded.coords,
+            settings.TRIP_MATCH_MAX_RADIUS_METERS,
+            settings.TRIP_ROUTE_CELL_GEOHASH_PRECISION,
+        )
+        self.route_cells.all().delete()
+        TripRouteCell.objects.bulk_create([TripRouteCell(trip=self, cell=cell) for cell in cells])
+
 
 class TripSettingsConfig(AuditableModel):
     radius = models.DecimalField(
@@ -80,12 +170,63 @@ class TripSettingsConfig(AuditableModel):
         decimal_places=5, max_digits=20, default=0.0,
         help_text="Speed in meters per second"
     )
+    location_min_distance_meters = models.DecimalField(
+        decimal_places=5, max_digits=20, default=0.0,
+        help_text="Drop location points closer than this to the last accepted point (0 disables)"
+    )
+    location_min_interval_seconds = models.DecimalField(
+        decimal_places=5, max_digits=20, default=0.0,
+        help_text="Drop location points sooner than this after the last accepted point (0 disables)"
+    )
+    location_max_silence_seconds = models.DecimalField(
+        decimal_places=5, max_digits=20, default=0.0,
+        help_text="Accept a location point after this long even if the car has not moved (0 disables)"
+    )
+    match_pickup_distance_weight = models.DecimalField(
+        decimal_places=5, max_digits=20, default=1.0,
+        help_text="Match score weight per meter between the rider's pickup and the route"
+    )
+    match_drop_off_distance_weight = models.DecimalField(
+        decimal_places=5, max_digits=20, default=0.0,
+        help_text="Match score weight per meter between the rider's drop-off and the route"
+    )
+    match_eta_weight = models.DecimalField(
+        decimal_places=5, max_digits=20, default=0.0,
+        help_text="Match score weight per minute of ETA to the pickup"
+    )
+    match_seat_fit_weight = models.DecimalField(
+        decimal_places=5, max_digits=20, default=0.0,
+        help_text="Match score weight per seat left free after the rider joins"
+    )
     is_active = models.BooleanField(default=False)
 
 
+class TripRouteCell(models.Model):
+    """
+    Geohash cell within ``TRIP_MATCH_MAX_RADIUS_METERS`` of the route of an
+    active trip (see ``trip.route_cells``). Matching first looks up the trips
+    covering both the pickup and the drop-off cell.
+    """
+    trip = models.ForeignKey("Trip", on_delete=models.CASCADE, related_name="route_cells")
+    cell = models.CharField(max_length=12)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cell", "trip"], name="trip_route_cell_unique"),
+        ]
+
+    def __str__(self):
+        return f"Trip {self.trip_id} @ {self.cell}"
+
+
 class TripLocationHistory(models.Model):
+    """
+    Location trail of a trip. The table is range-partitioned by day on
+    ``timestamp`` (see ``trip.partitions``), so the primary key in the
+    database is ``(id, timestamp)``.
+    """
     trip = models.ForeignKey(
-        "Trip", on_delete=models.CASCADE, related_name="location_history"
+        "Trip", on_delete=models.CASCADE, related_name="location_history", db_index=False
     )
     location = gis_models.PointField(
         geography=True,
@@ -94,7 +235,10 @@ class TripLocationHistory(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        ordering = ["-timestamp"]
+        indexes = [
+            BrinIndex(fields=["timestamp"], name="trip_history_ts_brin"),
+            models.Index(fields=["trip", "timestamp"], name="trip_history_trip_ts_idx"),
+        ]
 
     def __str__(self):
         return f"Trip {self.trip_id} @ {self.timestamp}"
@@ -0,0 +1,38 @@
+from django.db.models import QuerySet
+from rest_framework.pagination import CursorPagination
+
+from common.pagination import WindowCountPagination
+
+# Deterministic rank of a match, see trip.match_score
+MATCH_ORDERING = ("score", "id")
+
+
+class MatchCursorPagination(CursorPagination):
+    ordering = MATCH_ORDERING
+    page_size = 12
+    max_page_size = 50
+    page_size_query_param = "page_size"
+
+
+class MatchPagination(WindowCountPagination):
+    """
+    Page-number pagination whose total is counted by the page query itself.
+    ``?pagination=cursor`` switches to keyset pagination on the match rank,
+    which skips the total and keeps deep pages as cheap as the first one.
+    Lists from the memory engine are always paginated by page number.
+    """
+    cursor_pagination_class = MatchCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if request.query_params.get("pagination") == "cursor" and isinstance(queryset, QuerySet):
+            self.cursor = self.cursor_pagination_class()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        response = super().get_paginated_response(data)
+        response.data["total_matches"] = self.page.paginator.count
+        return response
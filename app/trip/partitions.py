@@ -0,0 +1,144 @@
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from trip.models import TripLocationHistory
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{8})$")
+
+
+def partition_name(day: date) -> str:
+    return f"{TripLocationHistory._meta.db_table}_p{day:%Y%m%d}"
+
+
+def partition_bounds(day: date) -> tuple[datetime, datetime]:
+    """Daily partitions are aligned on UTC midnight."""
+    lower = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return lower, lower + timedelta(days=1)
+
+
+def list_partitions() -> dict[date, str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [TripLocationHistory._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return partitions
+
+
+def default_partition_name() -> str:
+    return f"{TripLocationHistory._meta.db_table}_default"
+
+
+def default_partition_days(before: date) -> list[date]:
+    """UTC days of the rows older than ``before`` that sit in the default partition."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT DISTINCT ("timestamp" AT TIME ZONE \'UTC\')::date FROM "{default_partition_name()}" '
+            f'WHERE "timestamp" < %s ORDER BY 1',
+            [partition_bounds(before)[0]],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(day: date):
+    """
+    Create the partition of ``day``. Rows of that day already caught by the
+    default partition would make a plain ``PARTITION OF`` fail, so they are
+    moved into the new table before it is attached.
+    """
+    table = TripLocationHistory._meta.db_table
+    default = default_partition_name()
+    name = partition_name(day)
+    lower, upper = partition_bounds(day)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [lower, upper],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper],
+            )
+            return
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [lower, upper],
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+
+
+def create_partitions(start: date, days: int) -> list[str]:
+    """Create the daily partitions in ``[start, start + days)`` that do not exist yet."""
+    existing = list_partitions()
+    created = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day in existing:
+            continue
+        name = partition_name(day)
+        try:
+            create_partition(day)
+        except DatabaseError as e:
+            logger.error(f"Unable to create partition {name}: {e}")
+            continue
+        created.append(name)
+    return created
+
+
+def expire_partitions(before: date, drop: bool = True) -> list[str]:
+    """
+    Detach (and optionally drop) every daily partition older than ``before``.
+    Expired rows caught by the default partition are split into their daily
+    partitions first, so they go the same way.
+    """
+    for day in default_partition_days(before):
+        try:
+            create_partition(day)
+        except DatabaseError as e:
+            logger.error(f"Unable to split expired rows of {day} out of the default partition: {e}")
+
+    table = TripLocationHistory._meta.db_table
+    expired = []
+    for day, name in sorted(list_partitions().items()):
+        if day >= before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+        expired.append(name)
+    return expired
+
+
+def maintain_partitions() -> dict:
+    """
+    Pre-create upcoming partitions and expire those past the retention window,
+    as configured by the ``LOCATION_HISTORY_*`` settings.
+    """
+    today = datetime.now(dt_timezone.utc).date()
+    created = create_partitions(today, settings.LOCATION_HISTORY_PREMAKE_DAYS + 1)
+    expired = expire_partitions(
+        today - timedelta(days=settings.LOCATION_HISTORY_RETENTION_DAYS),
+        drop=settings.LOCATION_HISTORY_DROP_EXPIRED_PARTITIONS,
+    )
+    logger.info(f"Location history partitions created={created} expired={expired}")
+    return {"created": created, "expired": expired}
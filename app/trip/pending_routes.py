@@ -0,0 +1,153 @@
+"""
+Background route computation for ``TRIP_ROUTE_COMPUTATION = "async"``.
+
+Trips are saved as ``RoutePending`` without calling the routing API, and
+``trip.tasks.compute_trip_route`` fills in the route once the request has
+returned. The outcome is pushed to the trip's channel layer group, which the
+driver joins by subscribing to the trip over the location WebSocket.
+"""
+import logging
+from typing import Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import transaction
+
+from location.broadcast import broadcast_route
+from trip.enums import TripStatus
+from trip.models import Trip
+from trip.utils import compute_route_polyline
+
+logger = logging.getLogger(__name__)
+
+SYNC = "sync"
+ASYNC = "async"
+ROUTE_COMPUTATION_MODES = (SYNC, ASYNC)
+
+# Trips whose route can be computed after they are saved; an ongoing trip keeps
+# being tracked on its current route, so it is rerouted synchronously.
+DEFERRABLE_TRIP_STATUSES = (TripStatus.Initiated.value, TripStatus.RoutePending.value)
+
+PREVIOUS_ROUTE_KEY = "trip_previous_route:{trip_id}"
+PREVIOUS_ROUTE_TIMEOUT = 24 * 60 * 60
+
+
+class RouteComputationFailed(Exception):
+    pass
+
+
+def defers_route(trip: Optional[Trip] = None) -> bool:
+    """Whether the route of a new trip, or a rerouted ``trip``, is left to the background task."""
+    if settings.TRIP_ROUTE_COMPUTATION != ASYNC:
+        return False
+    return trip is None or trip.trip_status in DEFERRABLE_TRIP_STATUSES
+
+
+def remember_route(trip: Trip):
+    """
+    Keep the endpoints and status of a routed trip about to be rerouted in the
+    background, so a failed reroute restores them like a failed synchronous
+    reroute leaves them untouched. A trip already pending keeps the state
+    remembered before its first reroute.
+    """
+    if trip.trip_status == TripStatus.RoutePending.value or not trip.route_geometry_decoded:
+        return
+    cache.set(
+        PREVIOUS_ROUTE_KEY.format(trip_id=trip.id),
+        {
+            "starting_location": trip.starting_location.coords,
+            "destination_location": trip.destination_location.coords,
+            "trip_status": trip.trip_status,
+        },
+        timeout=PREVIOUS_ROUTE_TIMEOUT,
+    )
+
+
+def compute_pending_route(trip_id, final_attempt: bool = True) -> Optional[str]:
+    """
+    Compute and save the route of a ``RoutePending`` trip; returns its new status.
+
+    Raises ``RouteComputationFailed`` on failure unless ``final_attempt``, in
+    which case the trip is resolved by ``fail_pending_route``. Does nothing when
+    the trip is no longer pending or its endpoints changed meanwhile, as the
+    task queued by that change computes the route instead.
+    """
+    trip = Trip.objects.filter(id=trip_id, trip_status=TripStatus.RoutePending.value).first()
+    if not trip:
+        return None
+    start, end = trip.starting_location, trip.destination_location
+    try:
+        route_response = compute_route_polyline(
+            origin_longitude=start.x,
+            origin_latitude=start.y,
+            destination_longitude=end.x,
+            destination_latitude=end.y,
+        )
+    except Exception:
+        logger.exception(f"Route computation of trip {trip_id} failed")
+        route_response = {"success": False, "message": "Unable to compute route"}
+    if not route_response.get("success", False):
+        if not final_attempt:
+            raise RouteComputationFailed(route_response["message"])
+        return fail_pending_route(trip_id, route_response["message"], endpoints=(start, end))
+
+    with transaction.atomic():
+        trip = Trip.objects.select_for_update().filter(id=trip_id, trip_status=TripStatus.RoutePending.value).first()
+        if not trip or trip.starting_location != start or trip.destination_location != end:
+            return None
+        trip.route_geometry_decoded = route_response["route_geometry_decoded"]
+        trip.route_geometry = route_response["polyline"]
+        trip.distance = route_response["distance_m"]
+        trip.duration = route_response["duration_s"]
+        trip.trip_status = TripStatus.Initiated.value
+        trip.save()
+
+    cache.delete(PREVIOUS_ROUTE_KEY.format(trip_id=trip_id))
+    notify_route(trip, route_response.get("message"))
+    return trip.trip_status
+
+
+def fail_pending_route(trip_id, message: str, endpoints: Optional[tuple] = None) -> Optional[str]:
+    """
+    Resolve a ``RoutePending`` trip whose route could not be computed; returns
+    its new status. A rerouted trip goes back to its previous route, endpoints
+    and status; only a trip that never had a route is marked ``Failed``.
+    ``endpoints`` skips trips whose endpoints changed since the attempt.
+    """
+    key = PREVIOUS_ROUTE_KEY.format(trip_id=trip_id)
+    with transaction.atomic():
+        trip = Trip.objects.select_for_update().filter(id=trip_id, trip_status=TripStatus.RoutePending.value).first()
+        if not trip or (endpoints and (trip.starting_location, trip.destination_location) != endpoints):
+            return None
+        previous = cache.get(key)
+        if not trip.route_geometry_decoded:
+            trip.trip_status = TripStatus.Failed.value
+        elif previous:
+            trip.starting_location = Point(*previous["starting_location"], srid=4326)
+            trip.destination_location = Point(*previous["destination_location"], srid=4326)
+            trip.trip_status = previous["trip_status"]
+        else:
+            trip.trip_status = TripStatus.Initiated.value
+        trip.save()
+
+    cache.delete(key)
+    notify_route(trip, message)
+    return trip.trip_status
+
+
+def notify_route(trip: Trip, message: str = None):
+    data = {
+        "trip_id": str(trip.id),
+        "trip_status": trip.trip_status,
+        "route_geometry": trip.route_geometry,
+        "distance": str(trip.distance),
+        "duration": trip.duration,
+        "message": message,
+    }
+    try:
+        async_to_sync(broadcast_route)(get_channel_layer(), trip.id, data)
+    except Exception:
+        logger.exception(f"Unable to push the route of trip {trip.id}")
@@ -0,0 +1,99 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from django.conf import settings
+
+from common.lru_cache import TTLLRUCache
+from location.current_location import get_route_version, reset_route_progress
+from trip.memory_match import IndexedRoute
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RouteProgress:
+    coordinates: np.ndarray
+    lengths: np.ndarray
+    offsets: np.ndarray
+    total: float
+    segment: int = 0
+    fraction: float = 0.0
+    version: int = 0
+
+
+class RouteProgressTracker:
+    """
+    Follows how far each car has driven along its ``route_geometry_decoded``
+    from its location updates, as a 0..1 fraction measured like
+    ``ST_LineLocatePoint``.
+
+    Routes are cached per process. Each update only searches the segments from
+    the last matched one onwards, and the fraction never decreases, so GPS
+    jitter cannot move a car back along its route. A reroute bumps the route
+    version of the trip in Redis; ``discard_stale`` drops cached routes loaded
+    under an older version, whichever process saved the new route.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.routes = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def load(trip_id) -> Optional[RouteProgress]:
+        from trip.models import Trip
+
+        # Read before the route, so a reroute committed in between shows as stale
+        version = get_route_version(trip_id)
+        trip = Trip.objects.filter(id=trip_id).only("route_geometry_decoded").first()
+        if not trip or not trip.route_geometry_decoded or len(trip.route_geometry_decoded) < 2:
+            return None
+        coordinates = np.asarray(trip.route_geometry_decoded.coords, dtype=float)
+        lengths = np.hypot(*(coordinates[1:] - coordinates[:-1]).T)
+        offsets = np.concatenate([[0.0], np.cumsum(lengths)])
+        # The first update searches the whole route, so a reloaded or rerouted
+        # trip starts from wherever the car actually is.
+        return RouteProgress(coordinates, lengths, offsets, float(offsets[-1]), version=version)
+
+    def update(self, trip_id, longitude: float, latitude: float) -> Optional[float]:
+        """Advance the progress of a trip to the location of its car; None when it has no route."""
+        progress = self.routes.get(trip_id)
+        if progress is None:
+            progress = self.load(trip_id)
+            if progress is None:
+                return None
+            self.routes.set(trip_id, progress)
+        if not progress.total:
+            return progress.fraction
+
+        start = progress.segment
+        distances, position, _ = IndexedRoute.closest_on_segments(
+            progress.coordinates[start:], longitude, latitude, 1.0, 1.0
+        )
+        segment = start + int(distances.argmin())
+        fraction = (progress.offsets[segment] + position[segment - start] * progress.lengths[segment]) / progress.total
+        if fraction > progress.fraction:
+            progress.segment = segment
+            progress.fraction = float(fraction)
+        return progress.fraction
+
+    def discard_stale(self, trip_id, version: int) -> bool:
+        """Drop the cached route of a trip rerouted since it was loaded; True when there was one."""
+        progress = self.routes.get(trip_id)
+        if progress is None or progress.version == version:
+            return False
+        self.discard(trip_id)
+        return True
+
+    def discard(self, trip_id):
+        self.routes.delete(trip_id)
+
+    def reroute(self, trip_id):
+        self.discard(trip_id)
+        reset_route_progress(trip_id)
+
+
+route_progress = RouteProgressTracker(
+    maxsize=settings.TRIP_PROGRESS_ROUTE_CACHE_SIZE,
+    ttl=settings.TRIP_PROGRESS_ROUTE_CACHE_TTL,
+)
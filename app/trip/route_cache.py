@@ -0,0 +1,135 @@
+import json
+import logging
+import time
+from typing import Optional
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from common.geo import geohash_encode
+from common.lru_cache import TTLLRUCache
+from common.single_flight import SingleFlight
+from integrations.location.dataclass import GoogleRouteRequest
+
+logger = logging.getLogger(__name__)
+
+ROUTE_KEY = "trip_route:{provider}:{travel_mode}:{origin}:{destination}"
+ROUTE_LOCK_PREFIX = "trip_route_lock"
+
+
+class RouteCache:
+    """
+    Routes computed by the routing provider, keyed by origin and destination snapped
+    to geohash cells of ``precision``, so repeated commutes reuse the route of
+    an earlier trip between the same cells.
+
+    Lookups go to a per-process TTL/LRU first and then to Redis, shared by all
+    workers. Only the encoded polyline, distance and duration are stored; the
+    geometry is decoded again on every hit. ``ttl`` of 0 disables the cache.
+
+    Keys name the configured routing provider. Routes served by the fallback
+    provider are stored under the same key for ``fallback_ttl`` only, so they
+    stand in while the primary provider fails without outliving the outage.
+    """
+
+    def __init__(self, maxsize: int, local_ttl: float, ttl: int, precision: int, fallback_ttl: int = 0):
+        self.local = TTLLRUCache(maxsize=maxsize, ttl=local_ttl)
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.precision = precision
+        self.redis_hits = 0
+        self.misses = 0
+        self.lookup_seconds_total = 0.0
+        self.upstream_calls = 0
+        self.upstream_seconds_total = 0.0
+        self.upstream_seconds_max = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def key(self, request: GoogleRouteRequest) -> str:
+        return ROUTE_KEY.format(
+            provider=settings.TRIP_ROUTING_PROVIDER,
+            travel_mode=request.travelMode,
+            origin=geohash_encode(request.origin_longitude, request.origin_latitude, self.precision),
+            destination=geohash_encode(request.destination_longitude, request.destination_latitude, self.precision),
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        started_at = time.perf_counter()
+        try:
+            route = self.local.get(key)
+            if route is not None:
+                return route
+            try:
+                value = get_redis_connection("default").get(key)
+            except Exception:
+                logger.exception("Route cache lookup failed")
+                value = None
+            if not value:
+                self.misses += 1
+                return None
+            route = json.loads(value)
+            self.redis_hits += 1
+            self.local.set(key, route)
+            return route
+        finally:
+            self.lookup_seconds_total += time.perf_counter() - started_at
+
+    def shared(self, key: str) -> Optional[dict]:
+        """Route stored in Redis by another process, without touching the counters."""
+        try:
+            value = get_redis_connection("default").get(key)
+        except Exception:
+            logger.exception("Route cache lookup failed")
+            return None
+        return json.loads(value) if value else None
+
+    def set(self, key: str, route: dict, fallback: bool = False):
+        ttl = self.fallback_ttl if fallback else self.ttl
+        if not ttl:
+            return
+        self.local.set(key, route, ttl=min(self.local.ttl, ttl))
+        try:
+            get_redis_connection("default").set(key, json.dumps(route), ex=ttl)
+        except Exception:
+            logger.exception("Route cache write failed")
+
+    def record_upstream(self, seconds: float):
+        self.upstream_calls += 1
+        self.upstream_seconds_total += seconds
+        self.upstream_seconds_max = max(self.upstream_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        local_hits = self.local.hits
+        lookups = local_hits + self.local.misses
+        return {
+            "local": self.local.stats(),
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round((local_hits + self.redis_hits) / lookups, 4) if lookups else None,
+            "average_lookup_seconds": self.lookup_seconds_total / lookups if lookups else 0.0,
+            "upstream_calls": self.upstream_calls,
+            "average_upstream_seconds": (
+                self.upstream_seconds_total / self.upstream_calls if self.upstream_calls else 0.0
+            ),
+            "max_upstream_seconds": self.upstream_seconds_max,
+        }
+
+
+route_cache = RouteCache(
+    maxsize=settings.TRIP_ROUTE_CACHE_SIZE,
+    local_ttl=settings.TRIP_ROUTE_CACHE_LOCAL_TTL,
+    ttl=settings.TRIP_ROUTE_CACHE_TTL,
+    precision=settings.TRIP_ROUTE_CACHE_GEOHASH_PRECISION,
+    fallback_ttl=settings.TRIP_ROUTE_FALLBACK_CACHE_TTL,
+)
+
+# Concurrent computations of the same route share one call to the routing API;
+# other workers pick the route up from ``route_cache``.
+route_flights = SingleFlight(
+    prefix=ROUTE_LOCK_PREFIX,
+    lock_ttl=settings.TRIP_ROUTE_SINGLE_FLIGHT_LOCK_TTL,
+    wait_timeout=settings.TRIP_ROUTE_SINGLE_FLIGHT_WAIT_TIMEOUT,
+)
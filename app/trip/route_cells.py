@@ -0,0 +1,47 @@
+import math
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from common.geo import geohash_cell_dimensions, geohash_cells_in_box, geohash_encode, meters_to_degrees
+
+
+def compute_route_cells(coordinates, radius_meters: float, precision: int) -> set[str]:
+    """
+    Geohash cells of the corridor within ``radius_meters`` of a route.
+
+    Segments are cut into pieces no longer than a cell; the cells intersecting
+    each piece's bounding box, padded by the radius, are collected. The result
+    is a superset of the cells any point within the radius falls in.
+    """
+    width, height = geohash_cell_dimensions(precision)
+    step = min(width, height)
+    points = list(coordinates)
+    segments = list(zip(points, points[1:])) or [(points[0], points[0])]
+
+    cells = set()
+    for (start_x, start_y), (end_x, end_y) in segments:
+        pieces = max(1, math.ceil(max(abs(end_x - start_x), abs(end_y - start_y)) / step))
+        for piece in range(pieces):
+            a_x = start_x + (end_x - start_x) * piece / pieces
+            a_y = start_y + (end_y - start_y) * piece / pieces
+            b_x = start_x + (end_x - start_x) * (piece + 1) / pieces
+            b_y = start_y + (end_y - start_y) * (piece + 1) / pieces
+            pad_x, pad_y = meters_to_degrees(radius_meters, max(abs(a_y), abs(b_y)) + step)
+            cells |= geohash_cells_in_box(
+                min(a_x, b_x) - pad_x, min(a_y, b_y) - pad_y,
+                max(a_x, b_x) + pad_x, max(a_y, b_y) + pad_y,
+                precision,
+            )
+    return cells
+
+
+def route_cell(point) -> str:
+    return geohash_encode(point.x, point.y, settings.TRIP_ROUTE_CELL_GEOHASH_PRECISION)
+
+
+def trips_covering(point) -> QuerySet:
+    """Ids of the trips whose route corridor covers the cell of ``point``."""
+    from trip.models import TripRouteCell
+
+    return TripRouteCell.objects.filter(cell=route_cell(point)).values("trip_id")
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.contrib.gis.geos import LineString, Polygon
+
+from common.geo import METERS_PER_DEGREE, line_length_meters
+
+ROUTE_METRIC_FIELDS = (
+    "route_length_meters",
+    "route_bbox",
+    "route_geometry_simplified",
+)
+
+
+def compute_route_metrics(route: LineString) -> dict:
+    """
+    Per-route values that matching would otherwise re-derive from the full
+    LineString on every query.
+    """
+    srid = route.srid or 4326
+    coordinates = route.coords
+    bbox = Polygon.from_bbox(route.extent)
+    bbox.srid = srid
+    simplified = route.simplify(settings.TRIP_ROUTE_SIMPLIFY_TOLERANCE, preserve_topology=True)
+    return {
+        "route_length_meters": line_length_meters(coordinates),
+        "route_bbox": bbox,
+        "route_geometry_simplified": LineString(simplified.coords, srid=srid),
+    }
+
+
+def simplified_route_padding_meters() -> float:
+    """How far, at most, the simplified geometry strays from the route it was simplified from."""
+    return settings.TRIP_ROUTE_SIMPLIFY_TOLERANCE * METERS_PER_DEGREE * 1.01
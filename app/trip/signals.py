@@ -0,0 +1,47 @@
+from functools import partial
+
+from django.db import transaction
+
+from trip.active_trips import active_trips
+from trip.enums import ACTIVE_TRIP_STATUSES
+from trip.match_cache import MATCH_FIELDS, match_results
+from trip.memory_match import memory_routes
+from trip.models import TripRouteCell
+from trip.progress import route_progress
+
+
+def sync_active_trip(sender, instance, **kwargs):
+    if instance.trip_status in ACTIVE_TRIP_STATUSES:
+        active_trips.add(instance.id)
+    else:
+        active_trips.discard(instance.id)
+
+
+def evict_deleted_trip(sender, instance, **kwargs):
+    active_trips.discard(instance.id)
+
+
+def invalidate_match_results(sender, instance, update_fields=None, **kwargs):
+    if update_fields and MATCH_FIELDS.isdisjoint(update_fields):
+        return
+    match_results.bump_version()
+
+
+def sync_memory_route(sender, instance, **kwargs):
+    memory_routes.upsert(instance)
+
+
+def evict_memory_route(sender, instance, **kwargs):
+    memory_routes.remove(instance.id)
+
+
+def prune_route_cells(sender, instance, update_fields=None, **kwargs):
+    if update_fields and "trip_status" not in update_fields:
+        return
+    if instance.trip_status not in ACTIVE_TRIP_STATUSES:
+        TripRouteCell.objects.filter(trip_id=instance.id).delete()
+
+
+def reset_route_progress(sender, instance, **kwargs):
+    if getattr(instance, "_rerouted", False):
+        transaction.on_commit(partial(route_progress.reroute, instance.id))
@@ -0,0 +1,28 @@
+import logging
+
+from django.conf import settings
+
+from core.celery import APP
+
+from .partitions import maintain_partitions
+from .pending_routes import compute_pending_route, fail_pending_route
+
+logger = logging.getLogger(__name__)
+
+
+@APP.task()
+def maintain_location_history_partitions():
+    return maintain_partitions()
+
+
+@APP.task(bind=True, max_retries=settings.TRIP_ROUTE_TASK_MAX_RETRIES)
+def compute_trip_route(self, trip_id):
+    final_attempt = self.request.retries >= self.max_retries
+    try:
+        return compute_pending_route(trip_id, final_attempt=final_attempt)
+    except Exception as e:
+        if not final_attempt:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+        # Never leave the trip pending, e.g. after a database error
+        logger.exception(f"Giving up on the route of trip {trip_id}")
+        return fail_pending_route(trip_id, "Unable to compute route")
@@ -1,10 +1,49 @@
-from unittest.mock import patch
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import AsyncMock, patch
 
+import polyline
+from asgiref.sync import async_to_sync
 from django.contrib.gis.geos import Point, LineString
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
-from trip.models import Trip
+from common.geo import line_length_meters
+from common.lru_cache import TTLLRUCache
+from common.single_flight import SingleFlight
+from integrations.location.google import GoogleRoutesService
+from integrations.location.graph import RoadGraph, graph_router
+from integrations.location.routing import compute_route
+from location.current_location import flush_current_locations, get_route_progress, set_current_location
+from trip.active_trips import ACTIVE_TRIPS_KEY, ActiveTripCache
+from trip.enums import TripStatus
+from trip.match_cache import match_results
+from trip.memory_match import MemoryRouteIndex
+from trip.models import Trip, TripLocationHistory, TripRouteCell, TripSettingsConfig
+from trip.partitions import (
+    create_partitions,
+    default_partition_name,
+    expire_partitions,
+    list_partitions,
+    maintain_partitions,
+    partition_name,
+)
+from trip.pending_routes import RouteComputationFailed, compute_pending_route
+from trip.progress import RouteProgressTracker
+from trip.route_cache import RouteCache
+from trip.route_cells import route_cell
+from trip.route_metrics import compute_route_metrics
+from trip.tasks import compute_trip_route
+from trip.trip_match import TripRouteMatch
+from trip.utils import acompute_route_polyline, compute_route_polyline, route_request
+from trip.v1.serializers import MatchingTripsSerializer
 
 
 class TripViewSetTest(APITestCase):
@@ -85,6 +124,69 @@ class TripViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["route_geometry"], self.encoded_polyline)
 
+    @override_settings(TRIP_ROUTE_COMPUTATION="async")
+    @patch("trip.pending_routes.notify_route")
+    @patch("trip.pending_routes.compute_route_polyline")
+    @patch("trip.v1.views.compute_trip_route")
+    def test_create_trip_with_pending_route(self, mock_task, mock_compute_route, mock_notify):
+        payload = {
+            "starting_latitude": 6.5244,
+            "starting_longitude": 3.3792,
+            "destination_latitude": 6.431,
+            "destination_longitude": 3.421,
+            "available_seats": 2,
+            "is_ride_requests_allowed": True
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/trips/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["trip_status"], TripStatus.RoutePending.value)
+        self.assertIsNone(response.data["route_geometry"])
+        mock_task.delay.assert_called_once_with(response.data["id"])
+
+        mock_compute_route.return_value = {
+            "success": True,
+            "polyline": self.encoded_polyline,
+            "route_geometry_decoded": LineString([(3.3792, 6.5244), (3.421, 6.431)], srid=4326),
+            "distance_m": 5000,
+            "duration_s": "600s",
+        }
+        self.assertEqual(compute_pending_route(response.data["id"]), TripStatus.Initiated.value)
+        trip = Trip.objects.get(id=response.data["id"])
+        self.assertEqual(trip.route_geometry, self.encoded_polyline)
+        self.assertTrue(trip.route_cells.exists())
+        mock_notify.assert_called_once()
+
+    @override_settings(TRIP_ROUTE_COMPUTATION="async")
+    @patch("trip.pending_routes.notify_route")
+    @patch("trip.pending_routes.compute_route_polyline")
+    @patch("trip.v1.views.compute_trip_route")
+    def test_failed_background_reroute_restores_the_route(self, mock_task, mock_compute_route, mock_notify):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/trips/{self.trip_id}/", {"starting_latitude": 6.60}, format="json")
+        self.assertEqual(response.data["trip_status"], TripStatus.RoutePending.value)
+        self.assertFalse(self.trip.route_cells.exists())
+
+        mock_compute_route.side_effect = Exception("API key is missing")
+        with self.assertRaises(RouteComputationFailed):
+            compute_pending_route(self.trip_id, final_attempt=False)
+        self.assertEqual(compute_pending_route(self.trip_id), TripStatus.Initiated.value)
+
+        trip = Trip.objects.get(id=self.trip_id)
+        self.assertEqual(trip.starting_location.coords, (3.3792, 6.5244))
+        self.assertEqual(trip.route_geometry, self.encoded_polyline)
+        self.assertTrue(trip.route_cells.exists())
+        mock_notify.assert_called_once()
+
+    @patch("trip.pending_routes.notify_route")
+    @patch("trip.tasks.compute_pending_route", side_effect=DatabaseError("connection lost"))
+    def test_route_task_resolves_the_trip_after_unexpected_errors(self, mock_compute_pending_route, mock_notify):
+        Trip.objects.filter(id=self.trip_id).update(
+            trip_status=TripStatus.RoutePending.value, route_geometry_decoded=None
+        )
+        compute_trip_route.apply(args=[self.trip_id], retries=compute_trip_route.max_retries)
+        self.assertEqual(Trip.objects.get(id=self.trip_id).trip_status, TripStatus.Failed.value)
+
     def test_retrieve_trip(self):
         url = f"/api/trips/{self.trip_id}/"
         response = self.client.get(url)
@@ -109,3 +211,700 @@ class TripViewSetTest(APITestCase):
         response = self.client.get(url, params)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("total_matches", response.data)
+
+    def test_matching_trips_pagination_modes(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        url = "/api/trips/matches/"
+        params = {
+            "starting_latitude": 6.5244,
+            "starting_longitude": 3.3792,
+            "destination_latitude": 6.431,
+            "destination_longitude": 3.421,
+            "number_of_seats": 1
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_matches"], 1)
+        self.assertEqual(response.data["total"], 1)
+
+        response = self.client.get(url, {**params, "pagination": "cursor"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("total_matches", response.data)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual([match["trip_id"] for match in response.data["results"]], [self.trip_id])
+
+    def test_batch_matching_trips(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        url = "/api/trips/matches/batch/"
+        matching = {
+            "starting_latitude": 6.5244,
+            "starting_longitude": 3.3792,
+            "destination_latitude": 6.431,
+            "destination_longitude": 3.421,
+            "number_of_seats": 1
+        }
+        # Opposite direction of the trip route
+        reversed_direction = {
+            "starting_latitude": 6.431,
+            "starting_longitude": 3.421,
+            "destination_latitude": 6.5244,
+            "destination_longitude": 3.3792,
+            "number_of_seats": 1
+        }
+        response = self.client.post(url, {"requests": [matching, reversed_direction], "limit": 3}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([result["index"] for result in results], [0, 1])
+        self.assertEqual([match["trip_id"] for match in results[0]["matches"]], [self.trip_id])
+        self.assertEqual(results[1]["matches"], [])
+
+        single = self.client.get("/api/trips/matches/", matching)
+        self.assertAlmostEqual(
+            results[0]["matches"][0]["rider_trip_distance_meters"],
+            single.data["results"][0]["rider_trip_distance_meters"],
+        )
+
+    def test_matching_radius_wider_than_the_route_corridors(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        # ~2 km west of the route start, outside every corridor cell of the trip
+        params = {
+            "starting_latitude": 6.5244,
+            "starting_longitude": 3.3612,
+            "destination_latitude": 6.431,
+            "destination_longitude": 3.421,
+            "number_of_seats": 1,
+            "intersection_radius_meters": 3000,
+        }
+        response = self.client.get("/api/trips/matches/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([match["trip_id"] for match in response.data["results"]], [self.trip_id])
+
+        response = self.client.post("/api/trips/matches/batch/", {"requests": [params]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([match["trip_id"] for match in response.data["results"][0]["matches"]], [self.trip_id])
+
+
+class TripRouteMatchQueryPlanTest(TestCase):
+    def setUp(self):
+        Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            route_geometry_decoded=LineString([(3.3792, 6.5244), (3.421, 6.431)], srid=4326),
+            available_seats=3,
+            is_ride_requests_allowed=True
+        )
+
+    def get_plan(self, trips):
+        service = TripRouteMatch(
+            pickup_point=Point(3.3792, 6.5244, srid=4326),
+            drop_off_point=Point(3.421, 6.431, srid=4326),
+            seats=1,
+            radius=500,
+        )
+        # Tiny test tables are cheaper to scan; make the planner show whether
+        # the predicate can be answered from an index at all.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        return service.match(trips).explain()
+
+    @override_settings(TRIP_MATCH_MAX_RADIUS_METERS=100)
+    def test_match_prefilters_with_route_gist_index(self):
+        plan = self.get_plan(Trip.objects.all())
+        self.assertIn("st_dwithin", plan.lower())
+        self.assertIn("trip_trip_route_g_024d22_gist", plan)
+
+    @override_settings(TRIP_MATCH_MAX_RADIUS_METERS=100)
+    def test_matchable_trips_use_partial_indexes(self):
+        plan = self.get_plan(Trip.objects.matchable(seats=1))
+        self.assertRegex(plan, r"trip_matchable_(route_gist|date_idx)")
+        self.assertNotIn("::date", plan)
+
+    def test_match_prefilters_with_route_cells(self):
+        plan = self.get_plan(Trip.objects.matchable(seats=1))
+        self.assertIn("trip_route_cell_unique", plan)
+
+
+class RouteMetricsTest(TestCase):
+    route = LineString([(3.3792, 6.5244), (3.38, 6.52), (3.40, 6.48), (3.421, 6.431)], srid=4326)
+
+    def setUp(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        self.trip = Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            route_geometry_decoded=self.route,
+            available_seats=3,
+            is_ride_requests_allowed=True
+        )
+
+    def match(self):
+        service = TripRouteMatch(
+            pickup_point=Point(3.3850, 6.5120, srid=4326),
+            drop_off_point=Point(3.4205, 6.4320, srid=4326),
+        )
+        return list(service.match(Trip.objects.matchable(seats=1)))
+
+    def test_compute_route_metrics(self):
+        metrics = compute_route_metrics(self.route)
+        self.assertAlmostEqual(metrics["route_length_meters"], line_length_meters(self.route.coords))
+        self.assertEqual(metrics["route_bbox"].extent, self.route.extent)
+        self.assertEqual(metrics["route_geometry_simplified"].coords[0], self.route.coords[0])
+        self.assertEqual(metrics["route_geometry_simplified"].coords[-1], self.route.coords[-1])
+        self.assertLessEqual(len(metrics["route_geometry_simplified"]), len(self.route))
+
+    def test_metrics_follow_the_route_on_save(self):
+        self.assertAlmostEqual(self.trip.route_length_meters, line_length_meters(self.route.coords))
+        with patch.object(Trip, "set_route_metrics") as set_route_metrics:
+            self.trip.available_seats = 2
+            self.trip.save()
+        set_route_metrics.assert_not_called()
+
+        self.trip.route_geometry_decoded = LineString([(3.50, 6.60), (3.55, 6.65)], srid=4326)
+        self.trip.save(update_fields=["route_geometry_decoded"])
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.route_bbox.extent, (3.50, 6.60, 3.55, 6.65))
+        self.assertAlmostEqual(self.trip.route_length_meters, line_length_meters(((3.50, 6.60), (3.55, 6.65))))
+
+    def test_backfill_fills_missing_metrics(self):
+        Trip.objects.filter(id=self.trip.id).update(
+            route_length_meters=None, route_bbox=None, route_geometry_simplified=None
+        )
+        # Trips without stored metrics still match through the full route
+        self.assertEqual([match.id for match in self.match()], [self.trip.id])
+
+        call_command("backfill_trip_route_metrics", stdout=StringIO())
+        self.trip.refresh_from_db()
+        self.assertAlmostEqual(self.trip.route_length_meters, line_length_meters(self.route.coords))
+        self.assertIsNotNone(self.trip.route_bbox)
+        self.assertIsNotNone(self.trip.route_geometry_simplified)
+        self.assertEqual([match.id for match in self.match()], [self.trip.id])
+
+    def test_stored_route_prefilter_rules_out_distant_routes(self):
+        service = TripRouteMatch(
+            pickup_point=Point(3.50, 6.60, srid=4326),
+            drop_off_point=Point(3.55, 6.65, srid=4326),
+        )
+        self.assertFalse(service.candidates(Trip.objects.filter(route_bbox__isnull=False)).exists())
+
+
+class TripRouteCellTest(TestCase):
+    def setUp(self):
+        self.trip = Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            route_geometry_decoded=LineString([(3.3792, 6.5244), (3.421, 6.431)], srid=4326),
+            available_seats=3,
+            is_ride_requests_allowed=True
+        )
+
+    def cells(self):
+        return set(self.trip.route_cells.values_list("cell", flat=True))
+
+    def test_corridor_covers_points_near_the_route(self):
+        cells = self.cells()
+        # ~900 m east of the route start, inside the default 1000 m corridor
+        self.assertIn(route_cell(Point(3.3873, 6.5244, srid=4326)), cells)
+        self.assertNotIn(route_cell(Point(3.50, 6.60, srid=4326)), cells)
+
+    def test_cells_follow_reroutes_and_status(self):
+        self.trip.route_geometry_decoded = LineString([(3.50, 6.60), (3.55, 6.65)], srid=4326)
+        self.trip.save(update_fields=["route_geometry_decoded"])
+        self.assertIn(route_cell(Point(3.50, 6.60, srid=4326)), self.cells())
+        self.assertNotIn(route_cell(Point(3.3792, 6.5244, srid=4326)), self.cells())
+
+        self.trip.trip_status = "Completed"
+        self.trip.save(update_fields=["trip_status"])
+        self.assertFalse(TripRouteCell.objects.filter(trip=self.trip).exists())
+
+    def test_saves_without_a_route_change_keep_the_cells(self):
+        with patch.object(Trip, "set_route_cells") as set_route_cells, \
+                patch.object(Trip, "set_route_metrics") as set_route_metrics:
+            self.trip.available_seats = 2
+            self.trip.save()
+            Trip.objects.get(id=self.trip.id).save()
+            response = APIClient().patch(
+                f"/api/trips/{self.trip.id}/", {"available_seats": 1}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        set_route_cells.assert_not_called()
+        set_route_metrics.assert_not_called()
+
+
+class TTLLRUCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = TTLLRUCache(maxsize=2, ttl=10)
+
+    def test_entries_expire_after_ttl(self):
+        with patch("common.lru_cache.time.monotonic", return_value=100.0):
+            self.cache.set("a", 1)
+            self.cache.set("b", 2, ttl=30)
+        with patch("common.lru_cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(self.cache.get("a"))
+            self.assertEqual(self.cache.get("b"), 2)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), 3)
+
+    def test_stats_count_hits_and_misses(self):
+        self.cache.set("a", 1)
+        self.cache.get("a")
+        self.cache.get("a")
+        self.cache.get("missing")
+        self.cache.delete("a")
+        self.cache.get("a")
+        self.assertEqual(
+            self.cache.stats(), {"size": 0, "maxsize": 2, "hits": 2, "misses": 2, "hit_ratio": 0.5}
+        )
+
+
+class ActiveTripCacheTest(TestCase):
+    def setUp(self):
+        self.redis = get_redis_connection("default")
+        self.trip = Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            route_geometry_decoded=LineString([(3.3792, 6.5244), (3.421, 6.431)], srid=4326),
+            available_seats=3,
+            is_ride_requests_allowed=True
+        )
+        self.cache = ActiveTripCache(maxsize=10, ttl=60)
+
+    def in_redis(self) -> bool:
+        return bool(self.redis.sismember(ACTIVE_TRIPS_KEY, self.trip.id))
+
+    def test_signals_keep_redis_set_in_sync(self):
+        self.assertTrue(self.in_redis())
+        self.trip.trip_status = TripStatus.Completed.value
+        self.trip.save(update_fields=["trip_status"])
+        self.assertFalse(self.in_redis())
+        self.trip.trip_status = TripStatus.Ongoing.value
+        self.trip.save(update_fields=["trip_status"])
+        self.assertTrue(self.in_redis())
+        self.trip.delete()
+        self.assertFalse(self.in_redis())
+
+    def test_lookups_go_local_then_redis_then_database(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.cache.exists(self.trip.id))
+            self.assertTrue(self.cache.exists(self.trip.id))
+        self.assertEqual(self.cache.redis_hits, 1)
+
+        self.redis.srem(ACTIVE_TRIPS_KEY, self.trip.id)
+        self.cache.local.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.cache.exists(self.trip.id))
+        self.assertTrue(self.in_redis())
+        self.assertEqual(self.cache.database_lookups, 1)
+
+    def test_inactive_trips_are_cached_locally(self):
+        self.trip.trip_status = TripStatus.Completed.value
+        self.trip.save(update_fields=["trip_status"])
+        with self.assertNumQueries(1):
+            self.assertTrue(self.cache.exists(self.trip.id))
+            self.assertTrue(self.cache.exists(self.trip.id))
+        self.assertFalse(self.in_redis())
+        self.assertFalse(self.cache.exists("missing"))
+
+
+class MatchResultCacheTest(TestCase):
+    pickup = Point(3.3792, 6.5244, srid=4326)
+    drop_off = Point(3.421, 6.431, srid=4326)
+
+    def create_trip(self):
+        return Trip.objects.create(
+            starting_location=self.pickup,
+            destination_location=self.drop_off,
+            route_geometry_decoded=LineString([(3.3792, 6.5244), (3.421, 6.431)], srid=4326),
+            available_seats=3,
+            is_ride_requests_allowed=True
+        )
+
+    def test_nearby_points_share_a_key(self):
+        nearby_pickup = Point(self.pickup.x + 0.00001, self.pickup.y, srid=4326)
+        self.assertEqual(
+            match_results.key(self.pickup, self.drop_off, 1, 500),
+            match_results.key(nearby_pickup, self.drop_off, 1, 500),
+        )
+
+    def test_trip_changes_invalidate_cached_matches(self):
+        trip = self.create_trip()
+        key = match_results.key(self.pickup, self.drop_off, 1, 500)
+        match_results.set(key, [trip.id])
+        self.assertEqual(match_results.get(key), [trip.id])
+
+        trip.available_seats = 0
+        trip.save(update_fields=["available_seats"])
+        self.assertNotEqual(match_results.key(self.pickup, self.drop_off, 1, 500), key)
+
+    @override_settings(TRIP_MATCH_ENGINE="postgis")
+    def test_cached_candidates_leave_progress_to_the_rematch(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        trip = self.create_trip()
+        serializer = MatchingTripsSerializer(data={
+            "starting_longitude": 3.3850, "starting_latitude": 6.5120,
+            "destination_longitude": 3.4205, "destination_latitude": 6.4320,
+            "number_of_seats": 1,
+        })
+        serializer.is_valid(raise_exception=True)
+
+        # Progress comes from the location stream and does not invalidate cached matches
+        Trip.objects.filter(id=trip.id).update(route_progress_fraction=0.5)
+        self.assertEqual(list(serializer.get_matching_trips()), [])
+        Trip.objects.filter(id=trip.id).update(route_progress_fraction=0.0)
+        self.assertEqual([match.id for match in serializer.get_matching_trips()], [trip.id])
+
+
+class MemoryRouteIndexTest(TestCase):
+    routes = [
+        [(3.3792, 6.5244), (3.40, 6.48), (3.421, 6.431)],
+        [(3.3800, 6.5250), (3.39, 6.50), (3.41, 6.46), (3.425, 6.430)],
+        # Same corridor in the opposite direction, never a match
+        [(3.421, 6.431), (3.40, 6.48), (3.3792, 6.5244)],
+        [(3.50, 6.60), (3.55, 6.65)],
+    ]
+
+    def setUp(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        for seats, route in enumerate(self.routes, start=1):
+            Trip.objects.create(
+                starting_location=Point(*route[0], srid=4326),
+                destination_location=Point(*route[-1], srid=4326),
+                route_geometry_decoded=LineString(route, srid=4326),
+                available_seats=seats,
+                is_ride_requests_allowed=True
+            )
+        self.index = MemoryRouteIndex(rebuild_threshold=2, sync_seconds=5)
+        self.index.build()
+
+    def assertSameMatches(self, pickup, drop_off, seats=1, radius=500):
+        service = TripRouteMatch(pickup_point=pickup, drop_off_point=drop_off, seats=seats, radius=radius)
+        expected = list(service.match(Trip.objects.matchable(seats=seats)).order_by("score", "id"))
+        matches = self.index.match(
+            pickup, drop_off, seats, radius, float(service.speed_mps()), service.score_weights()
+        )
+
+        self.assertEqual([match.id for match in matches], [trip.id for trip in expected])
+        for match, trip in zip(matches, expected):
+            for field in ("pickup_distance_meters", "drop_off_distance_meters", "rider_trip_distance_meters", "score"):
+                self.assertAlmostEqual(getattr(match, field), getattr(trip, field), delta=5)
+            self.assertAlmostEqual(match.pickup_fraction, trip.pickup_fraction, delta=0.01)
+            self.assertAlmostEqual(match.drop_off_fraction, trip.drop_off_fraction, delta=0.01)
+        return matches
+
+    def test_matches_agree_with_postgis(self):
+        matches = self.assertSameMatches(Point(3.3795, 6.5240, srid=4326), Point(3.4205, 6.4320, srid=4326))
+        self.assertEqual(len(matches), 2)
+        self.assertSameMatches(Point(3.3795, 6.5240, srid=4326), Point(3.4205, 6.4320, srid=4326), seats=2)
+        self.assertSameMatches(Point(3.4205, 6.4320, srid=4326), Point(3.3795, 6.5240, srid=4326), radius=100)
+
+    def test_score_weights_rank_matches(self):
+        pickup, drop_off = Point(3.3795, 6.5240, srid=4326), Point(3.4205, 6.4320, srid=4326)
+        self.assertEqual(
+            [match.available_seats for match in self.assertSameMatches(pickup, drop_off)], [1, 2]
+        )
+
+        TripSettingsConfig.objects.update(match_pickup_distance_weight=0, match_seat_fit_weight=-1)
+        cache.delete("active_trip_settings")
+        # Prefer the trip with the most free seats
+        self.assertEqual(
+            [match.available_seats for match in self.assertSameMatches(pickup, drop_off)], [2, 1]
+        )
+
+    def test_trip_changes_update_the_index(self):
+        trip = Trip.objects.get(available_seats=1)
+        self.index.upsert(trip)
+        self.assertIn(trip.id, self.index.pending)
+        trip.available_seats = 0
+        trip.save(update_fields=["available_seats"])
+        self.index.upsert(trip)
+        self.assertNotIn(trip.id, self.index.routes)
+        self.assertSameMatches(Point(3.3795, 6.5240, srid=4326), Point(3.4205, 6.4320, srid=4326))
+
+
+class LocationHistoryPartitionTest(TestCase):
+    def setUp(self):
+        self.trip = Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            available_seats=3,
+        )
+
+    def record(self, timestamp):
+        TripLocationHistory.objects.create(
+            trip=self.trip, location=Point(3.3792, 6.5244, srid=4326), timestamp=timestamp
+        )
+        # Fire the deferred trip FK check now, pending trigger events block ALTER TABLE
+        connection.check_constraints()
+
+    @staticmethod
+    def rows(table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+            return cursor.fetchone()[0]
+
+    def test_create_partitions_moves_rows_out_of_the_default_partition(self):
+        day = date(2100, 1, 1)
+        self.record(datetime(2100, 1, 1, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.rows(default_partition_name()), 1)
+
+        self.assertEqual(create_partitions(day, 2), [partition_name(day), partition_name(day + timedelta(days=1))])
+        self.assertEqual(self.rows(partition_name(day)), 1)
+        self.assertEqual(self.rows(default_partition_name()), 0)
+        self.assertEqual(create_partitions(day, 2), [])
+        self.assertEqual(TripLocationHistory.objects.filter(trip=self.trip).count(), 1)
+
+    def test_expire_partitions_prunes_the_default_partition(self):
+        day = date(2000, 1, 1)
+        create_partitions(day, 1)
+        self.record(datetime(2000, 1, 1, 12, tzinfo=dt_timezone.utc))
+        self.record(datetime(2000, 1, 2, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.rows(default_partition_name()), 1)
+
+        expired = expire_partitions(date(2000, 1, 3))
+        self.assertEqual(expired, [partition_name(day), partition_name(day + timedelta(days=1))])
+        self.assertFalse(TripLocationHistory.objects.filter(trip=self.trip).exists())
+        self.assertEqual(self.rows(default_partition_name()), 0)
+        self.assertNotIn(partition_name(day), connection.introspection.table_names())
+
+    def test_expire_partitions_keeps_detached_tables_without_drop(self):
+        day = date(2000, 1, 1)
+        create_partitions(day, 1)
+        self.record(datetime(2000, 1, 1, 12, tzinfo=dt_timezone.utc))
+
+        self.assertEqual(expire_partitions(date(2000, 1, 2), drop=False), [partition_name(day)])
+        self.assertNotIn(day, list_partitions())
+        self.assertEqual(self.rows(partition_name(day)), 1)
+
+    @override_settings(
+        LOCATION_HISTORY_PREMAKE_DAYS=2,
+        LOCATION_HISTORY_RETENTION_DAYS=3,
+        LOCATION_HISTORY_DROP_EXPIRED_PARTITIONS=1,
+    )
+    def test_maintain_partitions(self):
+        today = datetime.now(dt_timezone.utc).date()
+        expired_day = today - timedelta(days=10)
+        create_partitions(expired_day, 1)
+
+        result = maintain_partitions()
+        partitions = list_partitions()
+        self.assertIn(partition_name(expired_day), result["expired"])
+        for offset in range(3):
+            self.assertIn(today + timedelta(days=offset), partitions)
+        self.assertGreaterEqual(min(partitions), today - timedelta(days=3))
+
+
+class RouteProgressTest(TestCase):
+    def setUp(self):
+        cache.delete("active_trip_settings")
+        TripSettingsConfig.objects.create(speed_mps=10, is_active=True)
+        self.trip = Trip.objects.create(
+            starting_location=Point(3.3792, 6.5244, srid=4326),
+            destination_location=Point(3.421, 6.431, srid=4326),
+            route_geometry_decoded=LineString([(3.3792, 6.5244), (3.40, 6.48), (3.421, 6.431)], srid=4326),
+            available_seats=3,
+            is_ride_requests_allowed=True
+        )
+        self.tracker = RouteProgressTracker(maxsize=10, ttl=60)
+
+    def match(self):
+        service = TripRouteMatch(
+            pickup_point=Point(3.3850, 6.5120, srid=4326),
+            drop_off_point=Point(3.4205, 6.4320, srid=4326),
+        )
+        return list(service.match(Trip.objects.matchable(seats=1)))
+
+    def test_progress_only_moves_forward(self):
+        self.assertAlmostEqual(self.tracker.update(self.trip.id, 3.40, 6.48), 0.5, delta=0.05)
+        self.assertAlmostEqual(self.tracker.update(self.trip.id, 3.3792, 6.5244), 0.5, delta=0.05)
+        self.assertAlmostEqual(self.tracker.update(self.trip.id, 3.421, 6.431), 1.0, delta=0.01)
+        self.assertIsNone(self.tracker.update("missing", 3.40, 6.48))
+
+    def test_matching_uses_remaining_distance_and_skips_passed_pickups(self):
+        [before] = self.match()
+        Trip.objects.filter(id=self.trip.id).update(route_progress_fraction=before.pickup_fraction / 2)
+        [halfway] = self.match()
+        self.assertAlmostEqual(halfway.eta_minutes, before.eta_minutes / 2, delta=0.01)
+
+        Trip.objects.filter(id=self.trip.id).update(route_progress_fraction=0.5)
+        self.assertEqual(self.match(), [])
+
+    def test_reroute_resets_progress_of_tracked_trip(self):
+        progress = self.tracker.update(self.trip.id, 3.40, 6.48)
+        version = set_current_location(self.trip.id, 3.40, 6.48, "2025-12-15T10:00:00+00:00", progress=progress)
+        self.assertFalse(self.tracker.discard_stale(self.trip.id, version))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.route_geometry_decoded = LineString([(3.40, 6.48), (3.43, 6.46), (3.421, 6.431)], srid=4326)
+            self.trip.save()
+        self.assertEqual(get_route_progress([self.trip.id]), {})
+        flush_current_locations()
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.route_progress_fraction, 0.0)
+
+        # The tracker of another process notices the reroute on its next update
+        self.tracker.update(self.trip.id, 3.40, 6.48)
+        version = set_current_location(self.trip.id, 3.40, 6.48, "2025-12-15T10:00:05+00:00")
+        self.assertTrue(self.tracker.discard_stale(self.trip.id, version))
+        self.assertAlmostEqual(self.tracker.update(self.trip.id, 3.40, 6.48), 0.0, delta=0.01)
+        self.assertFalse(self.tracker.discard_stale(self.trip.id, version))
+
+
+@override_settings(GOOGLE_MAPS_API_KEY="test-key")
+class GoogleRoutesClientTest(TestCase):
+    def test_services_share_one_connection_pool(self):
+        self.assertIs(GoogleRoutesService().client(), GoogleRoutesService().client())
+
+    @patch.object(GoogleRoutesService, "acompute_route", new_callable=AsyncMock)
+    def test_async_route_polyline(self, mock_compute_route):
+        route = {"distanceMeters": 5000, "duration": "600s", "polyline": {"encodedPolyline": "_p~iF~ps|U_ulLnnqC"}}
+        mock_compute_route.return_value = ({"routes": [route]}, 200)
+        result = async_to_sync(acompute_route_polyline)(3.3792, 6.5244, 3.421, 6.431)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["distance_m"], 5000)
+        self.assertEqual(len(result["route_geometry_decoded"]), 2)
+
+        mock_compute_route.return_value = (None, 408)
+        self.assertFalse(async_to_sync(acompute_route_polyline)(3.3792, 6.5244, 3.421, 6.431)["success"])
+
+
+@override_settings(GOOGLE_MAPS_API_KEY="test-key")
+class RouteCacheTest(TestCase):
+    route = {"distanceMeters": 5000, "duration": "600s", "polyline": {"encodedPolyline": "_p~iF~ps|U_ulLnnqC"}}
+
+    def setUp(self):
+        self.cache = RouteCache(maxsize=10, local_ttl=60, ttl=60, precision=8)
+        get_redis_connection("default").delete(self.cache.key(route_request(3.3792, 6.5244, 3.421, 6.431)))
+        self.flights = SingleFlight(prefix="test_route_lock", lock_ttl=5, wait_timeout=5)
+        for target, value in (("trip.utils.route_cache", self.cache), ("trip.utils.route_flights", self.flights)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch.object(GoogleRoutesService, "compute_route")
+    def test_nearby_requests_reuse_the_route(self, mock_compute_route):
+        mock_compute_route.return_value = ({"routes": [self.route]}, 200)
+        first = compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)
+        second = compute_route_polyline(3.37921, 6.52441, 3.421, 6.431)
+
+        self.assertEqual(mock_compute_route.call_count, 1)
+        self.assertEqual(second["polyline"], first["polyline"])
+        self.assertEqual(second["route_geometry_decoded"], first["route_geometry_decoded"])
+        self.assertEqual(self.cache.stats()["upstream_calls"], 1)
+
+        self.cache.local.clear()
+        compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)
+        self.assertEqual(self.cache.redis_hits, 1)
+
+    @patch.object(GoogleRoutesService, "compute_route")
+    def test_failures_are_not_cached(self, mock_compute_route):
+        mock_compute_route.return_value = (None, 500)
+        compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)
+        compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)
+        self.assertEqual(mock_compute_route.call_count, 2)
+
+    @override_settings(TRIP_ROUTING_PROVIDER="google", TRIP_ROUTING_FALLBACK_PROVIDER="graph")
+    @patch.object(GoogleRoutesService, "compute_route", return_value=(None, 500))
+    def test_fallback_routes_are_cached_briefly(self, mock_compute_route):
+        self.cache.fallback_ttl = 30
+        with patch.object(graph_router, "compute_route", return_value=({"routes": [self.route]}, 200)):
+            self.assertTrue(compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)["success"])
+        key = self.cache.key(route_request(3.3792, 6.5244, 3.421, 6.431))
+        self.assertLessEqual(get_redis_connection("default").ttl(key), 30)
+
+        self.cache.fallback_ttl = 0
+        self.cache.local.clear()
+        get_redis_connection("default").delete(key)
+        with patch.object(graph_router, "compute_route", return_value=({"routes": [self.route]}, 200)):
+            compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)
+        self.assertIsNone(self.cache.get(key))
+
+    @patch.object(GoogleRoutesService, "compute_route")
+    def test_concurrent_requests_share_one_call(self, mock_compute_route):
+        def slow_route(payload):
+            time.sleep(0.2)
+            return {"routes": [self.route]}, 200
+        mock_compute_route.side_effect = slow_route
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(compute_route_polyline(3.3792, 6.5244, 3.421, 6.431)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_compute_route.call_count, 1)
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual(self.flights.stats()["leaders"], 1)
+
+
+class RoadGraphRouterTest(TestCase):
+    # A square of streets, one-way from (0) to (1) along the bottom:
+    #   3 -- 2
+    #   |    |
+    #   0 -> 1
+    coordinates = [(3.38, 6.52), (3.39, 6.52), (3.39, 6.53), (3.38, 6.53)]
+    sources = [0, 1, 2, 2, 3, 3, 0]
+    targets = [1, 2, 1, 3, 2, 0, 3]
+
+    def setUp(self):
+        self.graph = RoadGraph.from_edges(self.coordinates, self.sources, self.targets, landmark_count=2)
+
+    def test_shortest_path_respects_one_way_streets(self):
+        distance, path = self.graph.shortest_path(0, 1)
+        self.assertEqual(path, [0, 1])
+        self.assertAlmostEqual(distance, 1105, delta=5)
+        self.assertEqual(self.graph.shortest_path(1, 0)[1], [1, 2, 3, 0])
+
+    @override_settings(
+        TRIP_ROUTING_PROVIDER="google", TRIP_ROUTING_FALLBACK_PROVIDER="graph", GOOGLE_MAPS_API_KEY="key"
+    )
+    @patch.object(GoogleRoutesService, "compute_route", return_value=(None, 500))
+    def test_graph_router_serves_as_fallback(self, mock_compute_route):
+        with patch.object(graph_router, "graph", self.graph):
+            response, status_code, provider = compute_route(route_request(3.3801, 6.5201, 3.3899, 6.5299))
+        self.assertEqual((status_code, provider), (200, "graph"))
+        route = response["routes"][0]
+        self.assertEqual(len(polyline.decode(route["polyline"]["encodedPolyline"])), 3)
+        self.assertAlmostEqual(route["distanceMeters"], 2217, delta=10)
+
+    @override_settings(
+        TRIP_ROUTING_PROVIDER="graph", TRIP_ROUTING_FALLBACK_PROVIDER="google", GOOGLE_MAPS_API_KEY="key"
+    )
+    @patch.object(GoogleRoutesService, "compute_route", return_value=({"routes": []}, 200))
+    def test_requests_outside_the_graph_fall_back(self, mock_compute_route):
+        with patch.object(graph_router, "graph", self.graph):
+            _, status_code, provider = compute_route(route_request(3.3801, 6.5201, 3.50, 6.60))
+            self.assertEqual((status_code, provider), (200, "google"))
+            self.assertEqual(graph_router.compute_route(route_request(3.3801, 6.5201, 3.50, 6.60)), (None, 404))
+        mock_compute_route.assert_called_once()
+
+    def test_async_routing_runs_off_the_event_loop(self):
+        threads = {}
+
+        def route(data):
+            threads["router"] = threading.get_ident()
+            return None, 404
+
+        async def acompute():
+            threads["loop"] = threading.get_ident()
+            return await graph_router.acompute_route(route_request(3.3801, 6.5201, 3.3899, 6.5299))
+
+        with patch.object(graph_router, "compute_route", side_effect=route):
+            self.assertEqual(async_to_sync(acompute)(), (None, 404))
+        self.assertNotEqual(threads["router"], threads["loop"])
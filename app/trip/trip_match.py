@@ -1,9 +1,23 @@
+from typing import Optional
+
+from django.conf import settings
 from django.contrib.gis.db.models import GeometryField
 from django.contrib.gis.db.models.functions import Distance, Length
-from django.db.models import F, ExpressionWrapper, FloatField, Func
+from django.contrib.gis.measure import D
+from django.contrib.gis.geos import Point, Polygon
+from django.db import connection
+from django.db.models import F, ExpressionWrapper, FloatField, Func, Q
+from django.db.models.functions import Coalesce
 from django.db.models import Value
 
-from trip.models import TripSettingsConfig
+from common.geo import meters_to_degrees
+from trip.enums import ACTIVE_TRIP_STATUSES
+from trip.managers import matchable_trip_window
+from trip.match_score import MatchScoreWeights
+from trip.memory_match import MatchedTrip
+from trip.models import Trip, TripRouteCell, TripSettingsConfig
+from trip.route_cells import route_cell, trips_covering
+from trip.route_metrics import simplified_route_padding_meters
 from trip.utils import get_active_trip_settings
 
 
@@ -21,17 +35,72 @@ class TripRouteMatch:
         self.seats = seats
         self.radius = radius
 
-    def match(self, trips):
+    @staticmethod
+    def route_length():
+        """Stored route length; only trips not yet backfilled pay for ST_Length."""
+        return Coalesce(
+            F("route_length_meters"),
+            Length("route_geometry_decoded"),
+            output_field=FloatField(),
+        )
+
+    @staticmethod
+    def speed_mps() -> float:
         config: TripSettingsConfig = get_active_trip_settings()
-        speed_mps = config.speed_mps or float((config.speed or 30) * 1000 / 3600)
+        return config.speed_mps or float((config.speed or 30) * 1000 / 3600)
+
+    @staticmethod
+    def score_weights() -> MatchScoreWeights:
+        return MatchScoreWeights.from_config(get_active_trip_settings())
 
+    def search_box(self, point) -> Polygon:
+        """Planar box around ``point`` that holds every point within ``radius`` of it."""
+        delta_x, delta_y = meters_to_degrees(self.radius, point.y)
+        return Polygon.from_bbox((point.x - delta_x, point.y - delta_y, point.x + delta_x, point.y + delta_y))
+
+    def near_stored_route(self, point) -> Q:
+        """
+        Planar bbox and simplified route checks against the stored route
+        metrics, which rule most routes out before the geodesic ST_DWithin on
+        the full route. Trips without stored metrics are left to ST_DWithin.
+        """
+        radius = D(m=self.radius + simplified_route_padding_meters())
+        return (
+            (Q(route_bbox__isnull=True) | Q(route_bbox__bboverlaps=self.search_box(point)))
+            & (Q(route_geometry_simplified__isnull=True) | Q(route_geometry_simplified__dwithin=(point, radius)))
+        )
+
+    def candidates(self, trips):
+        """
+        Trips whose route passes within ``radius`` of both points, before the
+        direction and progress filters of ``match``.
+        """
         qs = trips.filter(
+            self.near_stored_route(self.pickup),
+            self.near_stored_route(self.drop_off),
             is_ride_requests_allowed=True,
             available_seats__gte=self.seats,
             route_geometry_decoded__isnull=False,
+        ).filter(
+            # ST_DWithin on both points is answered from the route GiST index, so the
+            # distance and line projection work of ``match`` only runs on nearby routes.
+            Q(route_geometry_decoded__dwithin=(self.pickup, D(m=self.radius))),
+            Q(route_geometry_decoded__dwithin=(self.drop_off, D(m=self.radius))),
         )
+        if self.radius <= settings.TRIP_MATCH_MAX_RADIUS_METERS:
+            # Corridor cells narrow the candidates to two index lookups first.
+            qs = qs.filter(id__in=trips_covering(self.pickup)).filter(id__in=trips_covering(self.drop_off))
+        return qs
 
-        qs = qs.annotate(
+    def corridor_cell(self, point) -> Optional[str]:
+        """Route cell of ``point``, None when ``radius`` is wider than the corridors the cells cover."""
+        if self.radius > settings.TRIP_MATCH_MAX_RADIUS_METERS:
+            return None
+        return route_cell(point)
+
+    def match(self, trips):
+        speed_mps = self.speed_mps()
+        qs = self.candidates(trips).annotate(
             pickup_distance_meters=ExpressionWrapper(
                 Distance("route_geometry_decoded", self.pickup, geography=True),
                 output_field=FloatField(),
@@ -49,19 +118,174 @@ class TripRouteMatch:
                 F("route_geometry_decoded"),
                 Value(self.drop_off, output_field=GeometryField())
             ),
-            route_length_meters=Length("route_geometry_decoded")
         ).filter(
-            pickup_distance_meters__lte=self.radius,
-            drop_off_distance_meters__lte=self.radius,
             drop_off_fraction__gt=F("pickup_fraction"),
+            # The car has not passed the pickup yet
+            pickup_fraction__gte=F("route_progress_fraction"),
         ).annotate(
             rider_trip_distance_meters=ExpressionWrapper(
-                (F("drop_off_fraction") - F("pickup_fraction")) * F("route_length_meters"),
+                (F("drop_off_fraction") - F("pickup_fraction")) * self.route_length(),
                 output_field=FloatField(),
             ),
             eta_minutes=ExpressionWrapper(
-                (F("pickup_fraction") * F("route_length_meters")) / speed_mps, output_field=FloatField()
+                (F("pickup_fraction") - F("route_progress_fraction")) * self.route_length() / speed_mps / 60,
+                output_field=FloatField(),
             ),
+        ).annotate(
+            score=self.score_weights().expression(self.seats),
         )
 
         return qs
+
+
+class BatchTripRouteMatch:
+    """
+    Matches many rider requests in one statement: the requests are unnested
+    into rows and each row is joined LATERAL against the matchable trips,
+    returning the ``limit`` best scored trips per request in the order and with the
+    values of ``TripRouteMatch.match``.
+    """
+
+    def __init__(self, requests: list[TripRouteMatch], limit: int = 5):
+        self.requests = requests
+        self.limit = limit
+
+    def sql(self) -> str:
+        trip_table = Trip._meta.db_table
+        cell_table = TripRouteCell._meta.db_table
+        return f"""
+            WITH requests AS (
+                SELECT idx, seats, radius, pickup_cell, drop_off_cell,
+                       pickup_dx, pickup_dy, drop_off_dx, drop_off_dy,
+                       ST_SetSRID(ST_MakePoint(pickup_lon, pickup_lat), 4326)::geography AS pickup,
+                       ST_SetSRID(ST_MakePoint(drop_off_lon, drop_off_lat), 4326)::geography AS drop_off
+                FROM unnest(
+                    %(idx)s::int[], %(seats)s::int[], %(radius)s::float8[],
+                    %(pickup_cell)s::text[], %(drop_off_cell)s::text[],
+                    %(pickup_lon)s::float8[], %(pickup_lat)s::float8[],
+                    %(drop_off_lon)s::float8[], %(drop_off_lat)s::float8[],
+                    %(pickup_dx)s::float8[], %(pickup_dy)s::float8[],
+                    %(drop_off_dx)s::float8[], %(drop_off_dy)s::float8[]
+                ) AS r(idx, seats, radius, pickup_cell, drop_off_cell,
+                       pickup_lon, pickup_lat, drop_off_lon, drop_off_lat,
+                       pickup_dx, pickup_dy, drop_off_dx, drop_off_dy)
+            )
+            SELECT r.idx, m.*
+            FROM requests r
+            CROSS JOIN LATERAL (
+                SELECT e.*,
+                       e.pickup_distance_meters * %(pickup_distance_weight)s
+                       + e.drop_off_distance_meters * %(drop_off_distance_weight)s
+                       + e.eta_minutes * %(eta_weight)s
+                       + (e.available_seats - r.seats) * %(seat_fit_weight)s AS score
+                FROM (
+                    SELECT c.id, c.starting_longitude, c.starting_latitude,
+                           c.destination_longitude, c.destination_latitude, c.available_seats,
+                           c.pickup_distance_meters, c.drop_off_distance_meters,
+                           c.pickup_fraction, c.drop_off_fraction,
+                           (c.drop_off_fraction - c.pickup_fraction) * c.route_length AS rider_trip_distance_meters,
+                           (c.pickup_fraction - c.progress) * c.route_length / %(speed_mps)s / 60 AS eta_minutes
+                    FROM (
+                        SELECT t.id, t.available_seats,
+                               ST_X(t.starting_location::geometry) AS starting_longitude,
+                               ST_Y(t.starting_location::geometry) AS starting_latitude,
+                               ST_X(t.destination_location::geometry) AS destination_longitude,
+                               ST_Y(t.destination_location::geometry) AS destination_latitude,
+                               ST_Distance(t.route_geometry_decoded, r.pickup) AS pickup_distance_meters,
+                               ST_Distance(t.route_geometry_decoded, r.drop_off) AS drop_off_distance_meters,
+                               ST_LineLocatePoint(t.route_geometry_decoded, r.pickup) AS pickup_fraction,
+                               ST_LineLocatePoint(t.route_geometry_decoded, r.drop_off) AS drop_off_fraction,
+                               COALESCE(t.route_length_meters, ST_Length(t.route_geometry_decoded)) AS route_length,
+                               t.route_progress_fraction AS progress
+                        FROM {trip_table} t
+                        WHERE t.trip_status IN %(statuses)s
+                          AND t.is_ride_requests_allowed
+                          AND t.available_seats > 0
+                          AND t.available_seats >= r.seats
+                          AND t.date_added >= %(start)s AND t.date_added < %(end)s
+                          -- No cells for radii wider than the corridors; ST_DWithin prefilters those
+                          AND (r.pickup_cell IS NULL OR t.id IN (
+                              SELECT trip_id FROM {cell_table} WHERE cell = r.pickup_cell
+                          ))
+                          AND (r.drop_off_cell IS NULL OR t.id IN (
+                              SELECT trip_id FROM {cell_table} WHERE cell = r.drop_off_cell
+                          ))
+                          -- Stored route metrics first, see TripRouteMatch.near_stored_route
+                          AND (t.route_bbox IS NULL OR (
+                              t.route_bbox && ST_Expand(r.pickup::geometry, r.pickup_dx, r.pickup_dy)
+                              AND t.route_bbox && ST_Expand(r.drop_off::geometry, r.drop_off_dx, r.drop_off_dy)
+                          ))
+                          AND (t.route_geometry_simplified IS NULL OR (
+                              ST_DWithin(t.route_geometry_simplified, r.pickup, r.radius + %(simplified_padding)s)
+                              AND ST_DWithin(t.route_geometry_simplified, r.drop_off, r.radius + %(simplified_padding)s)
+                          ))
+                          AND ST_DWithin(t.route_geometry_decoded, r.pickup, r.radius)
+                          AND ST_DWithin(t.route_geometry_decoded, r.drop_off, r.radius)
+                    ) c
+                    WHERE c.drop_off_fraction > c.pickup_fraction
+                      AND c.pickup_fraction >= c.progress
+                ) e
+                ORDER BY score, e.id
+                LIMIT %(limit)s
+            ) m
+            ORDER BY r.idx, m.score, m.id
+        """
+
+    def params(self) -> dict:
+        requests = self.requests
+        start, end = matchable_trip_window()
+        weights = TripRouteMatch.score_weights()
+        pickup_spans = [meters_to_degrees(request.radius, request.pickup.y) for request in requests]
+        drop_off_spans = [meters_to_degrees(request.radius, request.drop_off.y) for request in requests]
+        return {
+            "idx": list(range(len(requests))),
+            "seats": [request.seats for request in requests],
+            "radius": [float(request.radius) for request in requests],
+            "pickup_cell": [request.corridor_cell(request.pickup) for request in requests],
+            "drop_off_cell": [request.corridor_cell(request.drop_off) for request in requests],
+            "pickup_lon": [request.pickup.x for request in requests],
+            "pickup_lat": [request.pickup.y for request in requests],
+            "drop_off_lon": [request.drop_off.x for request in requests],
+            "drop_off_lat": [request.drop_off.y for request in requests],
+            "pickup_dx": [span[0] for span in pickup_spans],
+            "pickup_dy": [span[1] for span in pickup_spans],
+            "drop_off_dx": [span[0] for span in drop_off_spans],
+            "drop_off_dy": [span[1] for span in drop_off_spans],
+            "simplified_padding": simplified_route_padding_meters(),
+            "speed_mps": float(TripRouteMatch.speed_mps()),
+            "pickup_distance_weight": weights.pickup_distance,
+            "drop_off_distance_weight": weights.drop_off_distance,
+            "eta_weight": weights.eta,
+            "seat_fit_weight": weights.seat_fit,
+            "statuses": tuple(ACTIVE_TRIP_STATUSES),
+            "start": start,
+            "end": end,
+            "limit": self.limit,
+        }
+
+    def match(self) -> list[list[MatchedTrip]]:
+        """Matches of every request, in the order of ``requests``."""
+        results = [[] for _ in self.requests]
+        with connection.cursor() as cursor:
+            cursor.execute(self.sql(), self.params())
+            for row in cursor.fetchall():
+                (
+                    index, trip_id, starting_longitude, starting_latitude,
+                    destination_longitude, destination_latitude, available_seats,
+                    pickup_distance, drop_off_distance, pickup_fraction, drop_off_fraction,
+                    rider_trip_distance, eta, score,
+                ) = row
+                results[index].append(MatchedTrip(
+                    id=trip_id,
+                    starting_location=Point(starting_longitude, starting_latitude, srid=4326),
+                    destination_location=Point(destination_longitude, destination_latitude, srid=4326),
+                    available_seats=available_seats,
+                    pickup_distance_meters=pickup_distance,
+                    drop_off_distance_meters=drop_off_distance,
+                    pickup_fraction=pickup_fraction,
+                    drop_off_fraction=drop_off_fraction,
+                    rider_trip_distance_meters=rider_trip_distance,
+                    eta_minutes=eta,
+                    score=score,
+                ))
+        return results
@@ -1,10 +1,15 @@
+import time
+
 import polyline
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.gis.geos import LineString
 from django.core.cache import cache
 
 from integrations.location.dataclass import GoogleRouteRequest
-from integrations.location.google import GoogleRoutesService
+from integrations.location import routing
 from trip.models import TripSettingsConfig
+from trip.route_cache import route_cache, route_flights
 
 
 def convert_polyline_to_linestring(encoded_polyline: str) -> LineString:
@@ -24,22 +29,21 @@ def get_active_trip_settings() -> TripSettingsConfig:
     return settings_obj
 
 
-def compute_route_polyline(
+def route_request(
         origin_longitude: float,
         origin_latitude: float,
         destination_longitude: float,
         destination_latitude: float,
-) -> dict:
-    """Compute route using Google Routes API and return polyline, LineString, distance, and duration."""
-    service = GoogleRoutesService()
-    print("service")
-    payload = GoogleRouteRequest(
+) -> GoogleRouteRequest:
+    return GoogleRouteRequest(
         origin_longitude=origin_longitude,
         origin_latitude=origin_latitude,
         destination_longitude=destination_longitude,
         destination_latitude=destination_latitude,
     )
-    response, status_code = service.compute_route(payload)
+
+
+def parse_route_response(response, status_code) -> dict:
     if not response or str(status_code) != "200":
         return {"success": False, "message": "Unable to compute route"}
 
@@ -52,11 +56,85 @@ def compute_route_polyline(
     if not encoded_poly:
         return {"success": False, "message": "Something went wrong while creating the trip"}
 
-    return {
-        "success": True,
-        "message": "Route computed successfully",
+    return route_result({
         "distance_m": route.get("distanceMeters"),
         "duration_s": route.get("duration"),
         "polyline": encoded_poly,
-        "route_geometry_decoded": convert_polyline_to_linestring(encoded_poly),
+    })
+
+
+def route_result(route: dict) -> dict:
+    """Successful ``compute_route_polyline`` result from the cacheable part of a route."""
+    return {
+        "success": True,
+        "message": "Route computed successfully",
+        **route,
+        "route_geometry_decoded": convert_polyline_to_linestring(route["polyline"]),
     }
+
+
+def cache_route(key: str, result: dict, started_at: float, provider: str) -> dict:
+    route_cache.record_upstream(time.perf_counter() - started_at)
+    if result["success"] and route_cache.enabled:
+        route_cache.set(
+            key,
+            {name: result[name] for name in ("distance_m", "duration_s", "polyline")},
+            fallback=provider != settings.TRIP_ROUTING_PROVIDER,
+        )
+    return result
+
+
+def shared_route_lookup(key: str):
+    """Reads the route computed by the single-flight leader in another process."""
+    if not route_cache.enabled:
+        return None
+
+    def lookup():
+        route = route_cache.shared(key)
+        return route_result(route) if route is not None else None
+    return lookup
+
+
+def compute_route_polyline(
+        origin_longitude: float,
+        origin_latitude: float,
+        destination_longitude: float,
+        destination_latitude: float,
+) -> dict:
+    """
+    Compute route with ``TRIP_ROUTING_PROVIDER`` and return polyline, LineString, distance, and duration.
+    Routes between the same origin and destination cells are served from ``route_cache``, and
+    concurrent requests for the same cells share one API call through ``route_flights``.
+    """
+    payload = route_request(origin_longitude, origin_latitude, destination_longitude, destination_latitude)
+    key = route_cache.key(payload)
+    route = route_cache.get(key) if route_cache.enabled else None
+    if route is not None:
+        return route_result(route)
+
+    def compute():
+        started_at = time.perf_counter()
+        response, status_code, provider = routing.compute_route(payload)
+        return cache_route(key, parse_route_response(response, status_code), started_at, provider)
+    return route_flights.do(key, compute, shared_route_lookup(key))
+
+
+async def acompute_route_polyline(
+        origin_longitude: float,
+        origin_latitude: float,
+        destination_longitude: float,
+        destination_latitude: float,
+) -> dict:
+    """Async version of ``compute_route_polyline`` for async views and consumers."""
+    payload = route_request(origin_longitude, origin_latitude, destination_longitude, destination_latitude)
+    key = route_cache.key(payload)
+    route = await sync_to_async(route_cache.get)(key) if route_cache.enabled else None
+    if route is not None:
+        return route_result(route)
+
+    async def compute():
+        started_at = time.perf_counter()
+        response, status_code, provider = await routing.acompute_route(payload)
+        result = parse_route_response(response, status_code)
+        return await sync_to_async(cache_route)(key, result, started_at, provider)
+    return await route_flights.ado(key, compute, shared_route_lookup(key))
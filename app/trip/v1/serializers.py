@@ -1,10 +1,14 @@
 from django.contrib.gis.geos import Point
-from django.utils import timezone
+from django.conf import settings
 from rest_framework import serializers
 
 from trip.enums import TripStatus
+from trip.match_cache import match_results
+from trip.memory_match import MEMORY, memory_routes
 from trip.models import Trip
-from trip.trip_match import TripRouteMatch
+from trip.pagination import MATCH_ORDERING
+from trip.pending_routes import defers_route
+from trip.trip_match import BatchTripRouteMatch, TripRouteMatch
 from trip.utils import compute_route_polyline
 
 
@@ -38,7 +42,9 @@ class CreateTripSerializer(serializers.ModelSerializer, AbstractTripSerializer):
         read_only_fields = ("created_at", "updated_at", "route_geometry",
                             "current_location", "route_geometry_decoded", "trip_status",
                             "date_added", "date_last_updated", "distance", "duration",
-                            "starting_location", "destination_location", "created_by"
+                            "starting_location", "destination_location", "created_by",
+                            "route_length_meters", "route_bbox", "route_geometry_simplified",
+                            "route_progress_fraction"
                             )
 
     def validate(self, attrs):
@@ -53,6 +59,10 @@ class CreateTripSerializer(serializers.ModelSerializer, AbstractTripSerializer):
             destination_longitude, destination_latitude
         )
 
+        if defers_route():
+            attrs["trip_status"] = TripStatus.RoutePending.value
+            return attrs
+
         route_response = compute_route_polyline(
             origin_longitude=starting_longitude,
             origin_latitude=starting_latitude,
@@ -83,7 +93,9 @@ class UpdateTripSerializer(serializers.ModelSerializer, AbstractTripSerializer):
         read_only_fields = ("created_at", "updated_at", "route_geometry",
                             "current_location", "route_geometry_decoded", "trip_status",
                             "date_added", "date_last_updated", "distance", "duration",
-                            "starting_location", "destination_location", "created_by"
+                            "starting_location", "destination_location", "created_by",
+                            "route_length_meters", "route_bbox", "route_geometry_simplified",
+                            "route_progress_fraction"
                             )
 
     def validate(self, attrs):
@@ -107,6 +119,10 @@ class UpdateTripSerializer(serializers.ModelSerializer, AbstractTripSerializer):
             attrs['starting_location'] = self.validate_location(starting_longitude, starting_latitude)
             attrs['destination_location'] = self.validate_location(destination_longitude, destination_latitude)
 
+            if defers_route(instance):
+                attrs["trip_status"] = TripStatus.RoutePending.value
+                return attrs
+
             route_response = compute_route_polyline(
                 destination_longitude=destination_longitude,
                 destination_latitude=destination_latitude,
@@ -143,6 +159,7 @@ class TripMatchResponseSerializer(serializers.Serializer):
     rider_trip_distance_meters = serializers.FloatField()
     available_seats = serializers.IntegerField()
     eta_minutes = serializers.FloatField()
+    score = serializers.FloatField()
 
 
 class MatchingTripsSerializer(AbstractTripSerializer):
@@ -150,12 +167,12 @@ class MatchingTripsSerializer(AbstractTripSerializer):
     starting_longitude = serializers.FloatField(write_only=True, required=True)
     destination_latitude = serializers.FloatField(write_only=True, required=True)
     destination_longitude = serializers.FloatField(write_only=True, required=True)
-    number_of_seats = serializers.IntegerField(write_only=True, required=True)
+    number_of_seats = serializers.IntegerField(write_only=True, required=True, min_value=1)
     intersection_radius_meters = serializers.IntegerField(
         write_only=True,
         required=False,
         default=500,
-        min_value=1
+        min_value=1,
     )
 
     def validate(self, attrs):
@@ -167,15 +184,68 @@ class MatchingTripsSerializer(AbstractTripSerializer):
         )
         return attrs
 
-    def get_matching_trips(self):
-        qs = Trip.objects.filter(
-            trip_status__in=[TripStatus.Ongoing.value, TripStatus.Initiated.value],
-            date_added__date=timezone.now().date()
-        )
-        service = TripRouteMatch(
-            pickup_point=self.validated_data['starting_location'],
-            drop_off_point=self.validated_data['destination_location'],
-            seats=self.validated_data['number_of_seats'],
-            radius=int(self.validated_data['intersection_radius_meters']),
+    @staticmethod
+    def get_route_match(data) -> TripRouteMatch:
+        return TripRouteMatch(
+            pickup_point=data['starting_location'],
+            drop_off_point=data['destination_location'],
+            seats=data['number_of_seats'],
+            radius=int(data['intersection_radius_meters']),
         )
-        return service.match(qs)
+
+    def get_matching_trips(self):
+        pickup = self.validated_data['starting_location']
+        drop_off = self.validated_data['destination_location']
+        seats = self.validated_data['number_of_seats']
+        radius = int(self.validated_data['intersection_radius_meters'])
+        qs = Trip.objects.matchable(seats=seats)
+        service = self.get_route_match(self.validated_data)
+        if settings.TRIP_MATCH_ENGINE == MEMORY:
+            memory_routes.start()
+            return memory_routes.match(
+                pickup, drop_off, seats, radius, float(service.speed_mps()), service.score_weights()
+            )
+        if not match_results.enabled:
+            return self.rank(service.match(qs))
+
+        key = match_results.key(pickup, drop_off, seats, radius)
+        trip_ids = match_results.get(key)
+        if trip_ids is None:
+            # Padded to cover every rider whose points fall in the same cells. The
+            # direction and progress filters depend on where exactly the points
+            # project onto a route, so they only run in the re-match below.
+            candidates = TripRouteMatch(
+                pickup_point=pickup,
+                drop_off_point=drop_off,
+                seats=seats,
+                radius=radius + match_results.padding_meters,
+            ).candidates(qs)
+            trip_ids = list(candidates.values_list("id", flat=True))
+            match_results.set(key, trip_ids)
+        return self.rank(service.match(qs.filter(id__in=trip_ids)))
+
+    @staticmethod
+    def rank(matches):
+        return matches.order_by(*MATCH_ORDERING)
+
+
+class BatchMatchingTripsSerializer(serializers.Serializer):
+    requests = MatchingTripsSerializer(
+        many=True, allow_empty=False, max_length=settings.TRIP_BATCH_MATCH_MAX_REQUESTS
+    )
+    limit = serializers.IntegerField(required=False, default=5, min_value=1, max_value=50)
+
+    def get_matching_trips(self) -> list:
+        services = [MatchingTripsSerializer.get_route_match(data) for data in self.validated_data['requests']]
+        limit = self.validated_data['limit']
+        if settings.TRIP_MATCH_ENGINE == MEMORY:
+            memory_routes.start()
+            speed_mps = float(TripRouteMatch.speed_mps())
+            weights = TripRouteMatch.score_weights()
+            return [
+                memory_routes.match(
+                    service.pickup, service.drop_off, service.seats, service.radius, speed_mps, weights
+                )[:limit]
+                for service in services
+            ]
+        return BatchTripRouteMatch(services, limit=limit).match()
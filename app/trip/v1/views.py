@@ -1,13 +1,24 @@
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import filters, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 
+from location.current_location import get_current_location
+from trip.active_trips import active_trips
+from trip.enums import TripStatus
 from trip.filters import TripFilter
+from trip.match_cache import match_results
+from trip.memory_match import memory_routes
 from trip.models import Trip
+from trip.pagination import MatchPagination
+from trip.pending_routes import remember_route
+from trip.route_cache import route_cache, route_flights
+from trip.tasks import compute_trip_route
 from trip.v1.serializers import (
+    BatchMatchingTripsSerializer,
     GetTripsSerializer,
     CreateTripSerializer,
     UpdateTripSerializer,
@@ -32,6 +43,29 @@ class TripViewSet(viewsets.ModelViewSet):
             return UpdateTripSerializer
         return super().get_serializer_class()
 
+    @staticmethod
+    def save_trip(serializer):
+        """Saves the trip and queues its route when the serializer left it pending."""
+        pending = serializer.validated_data.get("trip_status") == TripStatus.RoutePending.value
+        if pending and serializer.instance is not None:
+            remember_route(serializer.instance)
+        trip = serializer.save()
+        if pending:
+            transaction.on_commit(lambda: compute_trip_route.delay(trip.id))
+
+    def perform_create(self, serializer):
+        self.save_trip(serializer)
+
+    def perform_update(self, serializer):
+        self.save_trip(serializer)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        # Trip.current_location lags behind Redis by up to one flush interval.
+        instance.current_location = get_current_location(instance.id) or instance.current_location
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
     def paginate_results(self, queryset):
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -49,6 +83,9 @@ class TripViewSet(viewsets.ModelViewSet):
             OpenApiParameter("number_of_seats", description="Number of seats", required=True, type=int),
             OpenApiParameter("intersection_radius_meters", description="Intersection radius in meters", required=False,
                              type=int, default=500),
+            OpenApiParameter("pagination", description="Set to 'cursor' for keyset pagination without a total",
+                             required=False, type=str),
+            OpenApiParameter("cursor", description="Keyset pagination cursor", required=False, type=str),
         ],
         methods=["GET"],
     )
@@ -58,6 +95,7 @@ class TripViewSet(viewsets.ModelViewSet):
         serializer_class=TripMatchResponseSerializer,
         url_path=r"matches",
         permission_classes=[AllowAny],
+        pagination_class=MatchPagination,
     )
     def list_matching_route_trips(self, request, pk=None):
         serializer = MatchingTripsSerializer(data=request.query_params)
@@ -66,12 +104,45 @@ class TripViewSet(viewsets.ModelViewSet):
         page = self.paginate_queryset(matched_qs)
         if page is not None:
             serializer = TripMatchResponseSerializer(page, many=True)
-            response_data = self.get_paginated_response(serializer.data)
-            response_data.data['total_matches'] = matched_qs.count()
-            return response_data
+            return self.get_paginated_response(serializer.data)
 
         serializer = TripMatchResponseSerializer(matched_qs, many=True)
         return Response({
             'results': serializer.data,
-            'total_matches': matched_qs.count()
+            'total_matches': len(serializer.data)
+        })
+
+    @extend_schema(request=BatchMatchingTripsSerializer, methods=["POST"])
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path=r"matches/batch",
+        permission_classes=[AllowAny],
+    )
+    def batch_matching_route_trips(self, request):
+        """Top ``limit`` trips for each of many rider requests, matched in one query."""
+        serializer = BatchMatchingTripsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.get_matching_trips()
+        return Response({
+            'results': [
+                {'index': index, 'matches': TripMatchResponseSerializer(matches, many=True).data}
+                for index, matches in enumerate(results)
+            ]
+        })
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path=r"cache-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def cache_stats(self, request):
+        """Hit/miss counters of the caches serving this worker process."""
+        return Response({
+            "active_trips": active_trips.stats(),
+            "match_results": match_results.stats(),
+            "memory_routes": memory_routes.stats(),
+            "routes": route_cache.stats(),
+            "route_flights": route_flights.stats(),
         })